@@ -0,0 +1,41 @@
+"""add_sync_ledger_sp_item_index
+
+Revision ID: b7e4d2a91f3c
+Revises: 43c8c5615c06
+Create Date: 2026-10-17 09:12:31.804512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e4d2a91f3c'
+down_revision: Union[str, None] = '43c8c5615c06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Reverse lookup used by ingress: SharePoint item -> ledger entry.
+    # Built concurrently so large ledgers stay writable during the migration.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_sync_ledger_sp_item',
+            'sync_ledger',
+            ['sync_def_id', 'sp_list_id', 'sp_item_id'],
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_sync_ledger_sp_item',
+            table_name='sync_ledger',
+            postgresql_concurrently=True,
+            if_exists=True
+        )
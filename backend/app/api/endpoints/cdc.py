@@ -0,0 +1,50 @@
+import os
+from typing import Optional
+import redis
+from fastapi import APIRouter, HTTPException, Query
+from app.schemas.cdc import DeadLetterList, DeadLetterIdsRequest, BacklogResponse
+from app.services.cdc_dead_letter import DeadLetterService
+from app.services.cdc_partitions import all_stream_keys, group_backlog, producer_stats_key
+
+router = APIRouter()
+
+@router.get("/dead-letters", response_model=DeadLetterList)
+def list_dead_letters(
+    count: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = None
+):
+    service = DeadLetterService()
+    try:
+        return {"total": service.count(), "entries": service.list_entries(count, after or "-")}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/dead-letters/replay")
+def replay_dead_letters(request: DeadLetterIdsRequest):
+    service = DeadLetterService()
+    try:
+        return {"replayed": service.replay(request.ids)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/dead-letters/discard")
+def discard_dead_letters(request: DeadLetterIdsRequest):
+    service = DeadLetterService()
+    try:
+        return {"discarded": service.discard(request.ids)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/backlog", response_model=BacklogResponse)
+def get_backlog():
+    """Consumer-group backlog per partition, and each producer's backpressure stall time."""
+    client = redis.Redis.from_url(os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
+    try:
+        prefix = producer_stats_key("")
+        producers = {}
+        for key in client.scan_iter(match=f"{prefix}*"):
+            stats = client.hgetall(key)
+            producers[key.decode()[len(prefix):]] = {k.decode(): float(v) for k, v in stats.items()}
+        return {"partitions": group_backlog(client, all_stream_keys()), "producers": producers}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
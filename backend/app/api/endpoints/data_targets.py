@@ -15,7 +15,7 @@ from app.schemas.catalog import (
     SharePointListRead,
     SharePointColumnRead,
 )
-from app.services.graph import GraphClient
+from app.services.graph import GraphClient, shared_graph_client
 from app.services.sharepoint_discovery import SharePointDiscoveryService
 
 router = APIRouter()
@@ -27,7 +27,7 @@ def _get_graph_client(connection: SharePointConnection) -> GraphClient:
         secret = os.environ.get("AZURE_CLIENT_SECRET", "")
     if not secret:
         raise HTTPException(status_code=400, detail="SharePoint connection secret is missing")
-    return GraphClient(
+    return shared_graph_client(
         tenant_id=connection.tenant_id,
         client_id=connection.client_id,
         client_secret=secret,
@@ -2,35 +2,24 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 from app.api.endpoints.database_instances import get_db
-from app.schemas.move import MoveItemRequest, MoveItemResponse
+from app.schemas.move import MoveItemRequest, MoveItemResponse, MoveItemsRequest, MoveItemsResponse
 from app.models.core import SyncDefinition, SyncLedgerEntry, SharePointConnection, SyncTarget
 from app.services.mover import MoveManager
 from app.services.sharepoint_content import SharePointContentService
 from app.services.state import LedgerService
-from app.services.graph import GraphClient
+from app.services.graph import shared_graph_client
 import os
+from typing import Tuple
+from uuid import UUID
 
 router = APIRouter()
 
-@router.post("/item", response_model=MoveItemResponse)
-def move_sharepoint_item(
-    request: MoveItemRequest,
-    db: Session = Depends(get_db)
-):
-    # 1. Fetch Sync Definition
-    sync_def = db.get(SyncDefinition, request.sync_def_id)
-    if not sync_def:
-        raise HTTPException(status_code=404, detail="Sync definition not found")
-        
-    # 2. Find the Ledger Entry using composite key
-    entry = db.get(SyncLedgerEntry, (request.sync_def_id, request.source_identity_hash))
-    if not entry:
-        raise HTTPException(status_code=404, detail="Item not found in ledger")
-
-    # 3. Resolve Target Context (Destination)
+def _move_manager(db: Session, sync_def_id: UUID, target_list_id: UUID) -> Tuple[MoveManager, str]:
+    """MoveManager and site for moves of sync_def_id items to target_list_id."""
+    # Resolve Target Context (Destination)
     target = db.execute(select(SyncTarget).where(
-        SyncTarget.sync_def_id == request.sync_def_id,
-        SyncTarget.target_list_id == request.target_list_id
+        SyncTarget.sync_def_id == sync_def_id,
+        SyncTarget.target_list_id == target_list_id
     )).scalars().first()
     
     # If target not found by ID (maybe dynamic sharding to a new list not yet in targets?), fail for now.
@@ -57,11 +46,11 @@ def move_sharepoint_item(
     if not site_id:
          raise HTTPException(status_code=400, detail="Site ID could not be resolved")
 
-    # 4. Initialize Services
+    # Initialize Services
     try:
         client_secret = os.environ.get("AZURE_CLIENT_SECRET", "")
         
-        graph_client = GraphClient(
+        graph_client = shared_graph_client(
             tenant_id=conn.tenant_id,
             client_id=conn.client_id,
             client_secret=client_secret,
@@ -69,12 +58,30 @@ def move_sharepoint_item(
         )
         content_service = SharePointContentService(graph_client)
         ledger_service = LedgerService(db)
-        move_manager = MoveManager(content_service, ledger_service)
-        
+        return MoveManager(content_service, ledger_service), site_id
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Service initialization failed: {str(e)}")
 
-    # 5. Execute Move
+
+@router.post("/item", response_model=MoveItemResponse)
+def move_sharepoint_item(
+    request: MoveItemRequest,
+    db: Session = Depends(get_db)
+):
+    # 1. Fetch Sync Definition
+    sync_def = db.get(SyncDefinition, request.sync_def_id)
+    if not sync_def:
+        raise HTTPException(status_code=404, detail="Sync definition not found")
+        
+    # 2. Find the Ledger Entry using composite key
+    entry = db.get(SyncLedgerEntry, (request.sync_def_id, request.source_identity_hash))
+    if not entry:
+        raise HTTPException(status_code=404, detail="Item not found in ledger")
+
+    move_manager, site_id = _move_manager(db, request.sync_def_id, request.target_list_id)
+
+    # 3. Execute Move
     success = move_manager.move_item(
         site_id=site_id,
         entry=entry,
@@ -90,3 +97,39 @@ def move_sharepoint_item(
         )
     else:
         raise HTTPException(status_code=500, detail="Move operation failed")
+
+
+@router.post("/items", response_model=MoveItemsResponse)
+def move_sharepoint_items(
+    request: MoveItemsRequest,
+    db: Session = Depends(get_db)
+):
+    """Moves many ledger items of one sync definition to the same target list, in Graph batches."""
+    sync_def = db.get(SyncDefinition, request.sync_def_id)
+    if not sync_def:
+        raise HTTPException(status_code=404, detail="Sync definition not found")
+
+    moves = []
+    for item in request.items:
+        entry = db.get(SyncLedgerEntry, (request.sync_def_id, item.source_identity_hash))
+        if not entry:
+            raise HTTPException(status_code=404, detail=f"Item {item.source_identity_hash} not found in ledger")
+        moves.append((entry, item.item_data))
+
+    move_manager, site_id = _move_manager(db, request.sync_def_id, request.target_list_id)
+
+    outcomes = move_manager.move_items(
+        site_id=site_id,
+        moves=moves,
+        new_list_id=str(request.target_list_id)
+    )
+
+    results = [
+        MoveItemResponse(
+            success=success,
+            message="Item moved successfully" if success else "Move operation failed",
+            new_item_id=entry.sp_item_id if success else None
+        )
+        for (entry, _), success in zip(moves, outcomes)
+    ]
+    return MoveItemsResponse(moved=sum(outcomes), failed=len(outcomes) - sum(outcomes), results=results)
@@ -4,7 +4,7 @@ from uuid import UUID
 from app.api.endpoints.database_instances import get_db
 from app.models.core import SharePointConnection
 from app.schemas.provisioning import ProvisionRequest, ProvisionResponse
-from app.services.graph import GraphClient
+from app.services.graph import shared_graph_client
 from app.services.provisioner import SharePointProvisioner
 import jwt
 import os
@@ -34,7 +34,7 @@ def provision_sharepoint_list(
         raise HTTPException(status_code=400, detail="SharePoint connection secret is missing")
 
     try:
-        graph = GraphClient(
+        graph = shared_graph_client(
             tenant_id=conn.tenant_id,
             client_id=conn.client_id,
             client_secret=secret,
@@ -147,7 +147,7 @@ def debug_token(connection_id: UUID, db: Session = Depends(get_db)):
         secret = os.environ.get("AZURE_CLIENT_SECRET", "")
 
     try:
-        graph = GraphClient(
+        graph = shared_graph_client(
             tenant_id=conn.tenant_id,
             client_id=conn.client_id,
             client_secret=secret,
@@ -11,6 +11,7 @@ from app.schemas.sharepoint_connection import (
     SharePointConnectionUpdate
 )
 from app.api.endpoints.database_instances import get_db # Reusing dependency for now
+from app.services.graph import clear_graph_clients
 
 router = APIRouter()
 
@@ -59,6 +60,7 @@ def update_connection(
     if not db_conn:
         raise HTTPException(status_code=404, detail="Connection not found")
     
+    previous = (db_conn.tenant_id, db_conn.client_id)
     update_data = connection_update.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_conn, key, value)
@@ -66,6 +68,8 @@ def update_connection(
     try:
         db.commit()
         db.refresh(db_conn)
+        # Credentials may have changed: rebuild the Graph client on next use
+        clear_graph_clients(*previous)
         return db_conn
     except Exception as e:
         db.rollback()
@@ -80,6 +84,8 @@ def delete_connection(
     if not db_conn:
         raise HTTPException(status_code=404, detail="Connection not found")
     
+    tenant_id, client_id = db_conn.tenant_id, db_conn.client_id
     db.delete(db_conn)
     db.commit()
+    clear_graph_clients(tenant_id, client_id)
     return None
@@ -6,7 +6,7 @@ from sqlalchemy import select
 from app.api.endpoints.database_instances import get_db
 from app.models.core import SharePointConnection
 from app.models.inventory import SharePointSite, SharePointList
-from app.services.graph import GraphClient
+from app.services.graph import GraphClient, shared_graph_client
 from app.services.provisioner import SharePointProvisioner
 from app.services.sharepoint_discovery import SharePointDiscoveryService
 
@@ -24,7 +24,7 @@ def get_graph_client(connection_id: UUID, db: Session) -> GraphClient:
          secret = os.environ.get("AZURE_CLIENT_SECRET", "")
     
     try:
-        return GraphClient(
+        return shared_graph_client(
             tenant_id=conn.tenant_id,
             client_id=conn.client_id,
             client_secret=secret,
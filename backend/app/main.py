@@ -6,7 +6,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
 from sqladmin import Admin
 
-from app.api.endpoints import database_instances, sharepoint_connections, provisioning, sharepoint_discovery, sync_definitions, moves, ops, replication, runs, applications, databases, data_sources, data_targets, field_mappings
+from app.api.endpoints import database_instances, sharepoint_connections, provisioning, sharepoint_discovery, sync_definitions, moves, ops, replication, cdc, runs, applications, databases, data_sources, data_targets, field_mappings
 from app.db.session import engine
 from app.admin import (
     DatabaseInstanceAdmin,
@@ -81,6 +81,7 @@ app.include_router(field_mappings.router, prefix="/api/v1/field-mappings", tags=
 app.include_router(moves.router, prefix="/api/v1/moves", tags=["moves"])
 app.include_router(ops.router, prefix="/api/v1/ops", tags=["ops"])
 app.include_router(replication.router, prefix="/api/v1/replication", tags=["replication"])
+app.include_router(cdc.router, prefix="/api/v1/cdc", tags=["cdc"])
 app.include_router(runs.router, prefix="/api/v1/runs", tags=["runs"])
 
 @app.get("/health")
@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 from typing import Optional, List
-from sqlalchemy import String, Integer, Boolean, ForeignKey, DateTime, JSON
+from sqlalchemy import String, Integer, Boolean, ForeignKey, DateTime, JSON, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.sql import func
@@ -245,6 +245,11 @@ class SyncLedgerEntry(Base):
     last_sync_ts: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     provenance: Mapped[str] = mapped_column(String) # PUSH, PULL
 
+    __table_args__ = (
+        # Ingress resolves SharePoint items back to ledger entries
+        Index("ix_sync_ledger_sp_item", "sync_def_id", "sp_list_id", "sp_item_id"),
+    )
+
 
 class MoveAuditLog(Base):
     __tablename__ = "move_audit_log"
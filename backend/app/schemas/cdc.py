@@ -0,0 +1,38 @@
+from typing import Dict, List, Optional
+from pydantic import BaseModel
+
+class DeadLetterEntry(BaseModel):
+    id: str
+    stream: Optional[str] = None
+    message_id: Optional[str] = None # Original stream entry id
+    instance_id: Optional[str] = None
+    message_type: str # TRANSACTION, or INSERT, UPDATE, DELETE, ... for single-message entries
+    message_count: int
+    payload_hex: str
+    deliveries: int
+    error: Optional[str] = None
+    failed_at: int # Unix timestamp
+
+class DeadLetterList(BaseModel):
+    total: int
+    entries: List[DeadLetterEntry]
+
+class DeadLetterIdsRequest(BaseModel):
+    ids: List[str]
+
+class PartitionBacklog(BaseModel):
+    stream: str
+    length: int
+    lag: int # Entries not yet delivered to the consumer group
+    pending: int # Delivered but not acknowledged
+    last_delivered_id: Optional[str] = None
+
+class ProducerStats(BaseModel):
+    backlog: int
+    stalled_since: float # Unix timestamp, 0 when not stalled
+    stall_seconds_total: float
+    updated_at: float
+
+class BacklogResponse(BaseModel):
+    partitions: List[PartitionBacklog]
+    producers: Dict[str, ProducerStats] # Keyed by database instance id
@@ -1,6 +1,6 @@
 from uuid import UUID
 from pydantic import BaseModel, Field
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 
 class MoveItemRequest(BaseModel):
     sync_def_id: UUID
@@ -12,3 +12,17 @@ class MoveItemResponse(BaseModel):
     success: bool
     message: str
     new_item_id: Optional[int] = None
+
+class MoveBatchItem(BaseModel):
+    source_identity_hash: str
+    item_data: Dict[str, Any]
+
+class MoveItemsRequest(BaseModel):
+    sync_def_id: UUID
+    target_list_id: UUID
+    items: List[MoveBatchItem]
+
+class MoveItemsResponse(BaseModel):
+    moved: int
+    failed: int
+    results: List[MoveItemResponse]
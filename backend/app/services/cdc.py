@@ -1,8 +1,10 @@
 import logging
 import os
+import select
+import struct
 import threading
 import time
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
 from uuid import UUID
 
 import psycopg2
@@ -12,12 +14,47 @@ from sqlalchemy.orm import Session
 
 from app.models.core import DatabaseInstance
 from app.services.database import DatabaseClient
+from app.services.pgoutput import PgOutputDecoder, strip_stream_xid
+from app.services.cdc_partitions import (
+    CDC_STREAM_PARTITIONS, all_stream_keys, group_backlog, pack_messages, partition_for, partition_stream_key,
+    producer_stats_key, relations_key, stream_staging_key, trim_acknowledged,
+)
 
 logger = logging.getLogger(__name__)
 
+# WAL messages buffered before they are written to Redis in one pipeline
+CDC_PRODUCER_BATCH_SIZE = int(os.environ.get("CDC_PRODUCER_BATCH_SIZE", "500"))
+# Longest a message waits in the buffer while the replication stream stays busy
+CDC_PRODUCER_FLUSH_MS = int(os.environ.get("CDC_PRODUCER_FLUSH_MS", "100"))
+# Minimum time between LSN checkpoints (metadata commit + slot feedback)
+CDC_CHECKPOINT_INTERVAL_MS = int(os.environ.get("CDC_CHECKPOINT_INTERVAL_MS", "1000"))
+# Ingestion pauses while any partition has more undelivered + unacknowledged entries than this
+CDC_MAX_BACKLOG = int(os.environ.get("CDC_MAX_BACKLOG", "10000"))
+# Minimum time between backlog checks while under CDC_MAX_BACKLOG (every flush once over it)
+CDC_BACKLOG_CHECK_INTERVAL_MS = int(os.environ.get("CDC_BACKLOG_CHECK_INTERVAL_MS", "1000"))
+# Seconds between MINID trims of acknowledged entries
+CDC_TRIM_INTERVAL = float(os.environ.get("CDC_TRIM_INTERVAL", "10"))
+# Row messages per stream entry. A transaction with more rows on one partition is
+# split into several entries, so one huge statement cannot exhaust memory.
+CDC_TX_CHUNK_SIZE = int(os.environ.get("CDC_TX_CHUNK_SIZE", "5000"))
+# "on": protocol v2 streaming (PostgreSQL 14+). Large transactions arrive while still in
+# progress and are staged in Redis until they commit. "off" (default): protocol v1, where
+# the server decodes (and spills) a whole transaction before sending any of it.
+CDC_STREAMING = os.environ.get("CDC_STREAMING", "off")
+# "on": columns are sent in binary format (PostgreSQL 14+) and decoded without text parsing.
+# Values of types pgoutput.BINARY_CONVERTERS does not cover reach consumers as \x<hex> text.
+CDC_BINARY = os.environ.get("CDC_BINARY", "off")
+# Staged chunks of a streamed transaction expire if it is never committed or aborted
+# (e.g. it rolled back while the producer was down)
+CDC_STAGING_TTL = int(os.environ.get("CDC_STAGING_TTL", "86400"))
+# Staged chunks read back per round trip when a streamed transaction commits
+_STAGING_PAGE = 100
+# Staged chunk header: Int32(partition), Int32(subtransaction xid), Int32(message count)
+_STAGED_CHUNK = struct.Struct('>iii')
+
 
 class CDCService:
-    def __init__(self, db_session: Session, instance_id: UUID, stop_event: Optional[threading.Event] = None):
+    def __init__(self, db_session: Session, instance_id: UUID, stop_event: Optional[threading.Event] = None, redis_client: Optional[redis.Redis] = None):
         self.db = db_session
         self.instance_id = instance_id
         self.instance = self.db.get(DatabaseInstance, instance_id)
@@ -28,9 +65,36 @@ class CDCService:
 
         # Redis Connection
         self.redis_url = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
-        self.redis = redis.Redis.from_url(self.redis_url)
-        self.stream_key = "arcore:cdc:events"
-        self.max_stream_len = 10000 # Backpressure limit
+        # A supervisor running many instances passes one shared (thread-safe) client
+        self.redis = redis_client or redis.Redis.from_url(self.redis_url)
+        self.partitions = CDC_STREAM_PARTITIONS
+        self.stream_keys = all_stream_keys(self.partitions)
+        self.max_backlog = CDC_MAX_BACKLOG # Backpressure limit (per partition)
+        self._last_trim = 0.0
+        # Last measured backlog and when it was measured
+        self._backlog = 0
+        self._last_backlog_check = 0.0
+        # Total seconds ingestion has been paused by backpressure (published to producer_stats_key)
+        self.stall_seconds_total = 0.0
+        # Decodes just enough of each message to route it to its partition
+        self.decoder = PgOutputDecoder()
+
+        # Redis commands for buffered messages, written on the next flush
+        self._pending: List[Tuple[str, tuple]] = []
+        self._pending_lsn: Optional[int] = None
+        self._pending_since = 0.0
+        # Row messages of the open source transaction, per partition
+        self._tx_xid: Optional[int] = None
+        self._tx_messages: Dict[int, List[bytes]] = {}
+        # Streamed transactions: row messages of the open stream block per (subxid, partition),
+        # and the aborted subtransactions of each transaction with staged chunks
+        self._stream_xid: Optional[int] = None
+        self._stream_messages: Dict[Tuple[int, int], List[bytes]] = {}
+        self._stream_aborted: Dict[int, set] = {}
+        # Highest LSN written to Redis, and the last one checkpointed
+        self._flushed_lsn: Optional[int] = None
+        self._checkpointed_lsn: Optional[int] = None
+        self._last_checkpoint = 0.0
 
         # Use existing client logic to resolve credentials/dsn
         self.client = DatabaseClient(self.instance)
@@ -59,6 +123,10 @@ class CDCService:
                     "proto_version": "1",
                     "publication_names": "arcore_cdc_pub"
                 }
+                if CDC_STREAMING == "on":
+                    options.update({"proto_version": "2", "streaming": "on"})
+                if CDC_BINARY == "on":
+                    options["binary"] = "true"
                 
                 # Start
                 cur.start_replication(
@@ -68,28 +136,7 @@ class CDCService:
                     options=options
                 )
                 
-                def consume_stream(msg):
-                    if self.stop_event.is_set():
-                        raise StopIteration # Graceful exit from consume_stream
-
-                    # Check Backpressure
-                    while self.redis.xlen(self.stream_key) > self.max_stream_len:
-                        logger.warning("Backpressure: Stream full. Pausing ingestion.")
-                        time.sleep(1)
-                        if self.stop_event.is_set():
-                            raise StopIteration
-
-                    # Process Message
-                    if msg.payload:
-                        self._handle_message(msg)
-                    
-                    # Send Feedback
-                    msg.cursor.send_feedback(flush_lsn=msg.data_start)
-                    
-                    # Persist LSN
-                    self._checkpoint(msg.data_start)
-
-                cur.consume_stream(consume_stream)
+                self._stream_loop(cur)
 
         except StopIteration:
             logger.info("CDC Service stopped gracefully.")
@@ -97,15 +144,255 @@ class CDCService:
             logger.error(f"CDC Worker Failed: {e}")
             raise
 
+    def _stream_loop(self, cur) -> None:
+        """
+        Buffers WAL messages and writes them to Redis in one pipeline when the
+        buffer is full, has waited CDC_PRODUCER_FLUSH_MS, or the replication stream
+        has nothing more to read. The LSN is checkpointed only after a flush.
+        """
+        while not self.stop_event.is_set():
+            msg = cur.read_message()
+            if msg is not None:
+                self._handle_message(msg)
+                if len(self._pending) >= CDC_PRODUCER_BATCH_SIZE or self._flush_due():
+                    self._flush(cur)
+                continue
+
+            # Caught up: write what is buffered, then wait for more WAL
+            self._flush(cur)
+            select.select([cur], [], [], CDC_CHECKPOINT_INTERVAL_MS / 1000)
+
+        self._flush(cur, force_checkpoint=True)
+        raise StopIteration # Graceful exit
+
+    def _has_pending(self) -> bool:
+        return bool(self._pending) or self._pending_lsn is not None
+
+    def _flush_due(self) -> bool:
+        return self._has_pending() and (time.time() - self._pending_since) * 1000 >= CDC_PRODUCER_FLUSH_MS
+
+    def _flush(self, cur, force_checkpoint: bool = False) -> None:
+        """
+        Writes buffered messages with one pipelined round trip, then checkpoints
+        if CDC_CHECKPOINT_INTERVAL_MS has passed. A failed write raises before the
+        LSN moves, so the messages are sent again after a restart.
+        """
+        if self._has_pending():
+            if not self._wait_for_capacity(cur):
+                # Not written and not checkpointed: replayed from the slot on restart
+                return
+
+            self._write_pending()
+
+        checkpoint_due = force_checkpoint or (time.time() - self._last_checkpoint) * 1000 >= CDC_CHECKPOINT_INTERVAL_MS
+        if self._flushed_lsn != self._checkpointed_lsn and checkpoint_due:
+            cur.send_feedback(flush_lsn=self._flushed_lsn)
+            self._checkpoint(self._flushed_lsn)
+            self._checkpointed_lsn = self._flushed_lsn
+            self._last_checkpoint = time.time()
+
+    def _write_pending(self) -> None:
+        if self._pending:
+            pipe = self.redis.pipeline(transaction=False)
+            for command, args in self._pending:
+                getattr(pipe, command)(*args)
+            pipe.execute()
+            logger.debug(f"Flushed {len(self._pending)} Redis commands up to LSN {self._pending_lsn}")
+
+        if self._pending_lsn is not None:
+            self._flushed_lsn = self._pending_lsn
+        self._pending = []
+        self._pending_lsn = None
+
+    def _wait_for_capacity(self, cur) -> bool:
+        """
+        Blocks while the consumers are more than max_backlog entries behind on any
+        partition. Returns False if the service is stopped while waiting. The backlog
+        is measured at most every CDC_BACKLOG_CHECK_INTERVAL_MS while it was last
+        found under the limit.
+        """
+        if self._backlog <= self.max_backlog and (time.time() - self._last_backlog_check) * 1000 < CDC_BACKLOG_CHECK_INTERVAL_MS:
+            return True
+        backlog = self._backlog = self._stream_backlog()
+        self._last_backlog_check = time.time()
+        if backlog <= self.max_backlog:
+            return True
+
+        logger.warning(f"Backpressure: consumer backlog {backlog} over {self.max_backlog}. Pausing ingestion.")
+        stall_started = time.time()
+        self._publish_stats(backlog, stalled_since=stall_started)
+        try:
+            while backlog > self.max_backlog:
+                if self.stop_event.wait(1):
+                    return False
+                # Keepalive, so the server does not drop the replication connection while it is not read
+                cur.send_feedback()
+                backlog = self._backlog = self._stream_backlog()
+                self._last_backlog_check = time.time()
+        finally:
+            stalled = time.time() - stall_started
+            self.stall_seconds_total += stalled
+            self._publish_stats(backlog)
+        logger.info(f"Backpressure released after {stalled:.1f}s (backlog {backlog})")
+        return True
+
+    def _stream_backlog(self) -> int:
+        """Largest consumer-group backlog (lag + pending) across partitions. Trims acknowledged entries periodically."""
+        backlog = group_backlog(self.redis, self.stream_keys)
+        if time.time() - self._last_trim >= CDC_TRIM_INTERVAL:
+            trim_acknowledged(self.redis, backlog)
+            self._last_trim = time.time()
+        return max(b["lag"] + b["pending"] for b in backlog)
+
+    def _publish_stats(self, backlog: int, stalled_since: Optional[float] = None) -> None:
+        self.redis.hset(producer_stats_key(self.instance_id), mapping={
+            "backlog": backlog,
+            "stalled_since": stalled_since or 0,
+            "stall_seconds_total": round(self.stall_seconds_total, 3),
+            "updated_at": time.time(),
+        })
+
     def _handle_message(self, msg):
-        event_data = {
-            "lsn": msg.data_start,
-            "payload": msg.payload, # Bytes
-            "instance_id": str(self.instance_id)
-        }
-        
-        self.redis.xadd(self.stream_key, event_data)
-        logger.debug(f"Queued WAL message: {len(msg.payload)} bytes")
+        """
+        Buffers one WAL message. Row changes are grouped per source transaction:
+        at COMMIT each partition the transaction touched gets one stream entry
+        holding its row messages and the commit LSN. Streamed transactions are
+        staged block by block and emitted the same way at STREAM COMMIT.
+        """
+        if not msg.payload:
+            return
+
+        streamed = self.decoder.in_stream
+        decoded = self.decoder.decode(msg.payload)
+        msg_type = decoded["type"] if decoded else "UNKNOWN"
+        # Consumers decode without stream state, so streamed messages are stored without their xid
+        payload = strip_stream_xid(msg.payload) if streamed and "xid" in decoded else msg.payload
+
+        if msg_type == "BEGIN":
+            self._tx_xid = decoded["xid"]
+            self._tx_messages = {}
+        elif msg_type == "COMMIT":
+            for partition, payloads in self._tx_messages.items():
+                self._queue_entry(partition, payloads, decoded["commit_lsn"])
+            self._tx_xid = None
+            self._tx_messages = {}
+            # Only whole transactions are checkpointed; the slot resends an open one after a restart
+            self._mark_lsn(msg.data_start)
+        elif msg_type == "RELATION":
+            # Keep the latest definition for consumers that start mid-stream,
+            # and send it down every partition so schema changes apply in order
+            self._queue("hset", relations_key(self.instance_id), decoded["id"], payload)
+            for partition in range(self.partitions):
+                self._queue_entry(partition, [payload], msg.data_start)
+        elif msg_type in ("INSERT", "UPDATE", "DELETE"):
+            partition = self._partition(decoded)
+            if streamed:
+                self._stage_message(decoded["xid"], partition, payload)
+                return
+            if self._tx_xid is None:
+                self._queue_entry(partition, [payload], msg.data_start)
+                self._mark_lsn(msg.data_start)
+                return
+            payloads = self._tx_messages.setdefault(partition, [])
+            payloads.append(payload)
+            if len(payloads) >= CDC_TX_CHUNK_SIZE:
+                self._queue_entry(partition, payloads, msg.data_start)
+                self._tx_messages[partition] = []
+        elif msg_type == "STREAM_START":
+            self._stream_xid = decoded["xid"]
+            if decoded["first_segment"]:
+                # Drop chunks left from an earlier attempt: the slot streams the transaction again from the start
+                self._queue("delete", stream_staging_key(self.instance_id, self._stream_xid))
+                self._stream_aborted[self._stream_xid] = set()
+        elif msg_type == "STREAM_STOP":
+            for key in list(self._stream_messages):
+                self._stage_chunk(*key)
+            self._stream_xid = None
+        elif msg_type == "STREAM_ABORT":
+            if decoded["subxid"] == decoded["xid"]:
+                self._queue("delete", stream_staging_key(self.instance_id, decoded["xid"]))
+                self._stream_aborted.pop(decoded["xid"], None)
+            else:
+                # Only a subtransaction rolled back: its staged chunks are skipped at commit
+                self._stream_aborted.setdefault(decoded["xid"], set()).add(decoded["subxid"])
+        elif msg_type == "STREAM_COMMIT":
+            self._commit_staged(decoded["xid"], decoded["commit_lsn"])
+            self._mark_lsn(msg.data_start)
+
+    def _stage_message(self, subxid: int, partition: int, payload: bytes) -> None:
+        payloads = self._stream_messages.setdefault((subxid, partition), [])
+        payloads.append(payload)
+        if len(payloads) >= CDC_TX_CHUNK_SIZE:
+            self._stage_chunk(subxid, partition)
+
+    def _stage_chunk(self, subxid: int, partition: int) -> None:
+        """Appends the buffered messages of a stream block to the transaction's staging list."""
+        payloads = self._stream_messages.pop((subxid, partition), None)
+        if not payloads:
+            return
+        key = stream_staging_key(self.instance_id, self._stream_xid)
+        self._queue("rpush", key, _STAGED_CHUNK.pack(partition, subxid, len(payloads)) + pack_messages(payloads))
+        self._queue("expire", key, CDC_STAGING_TTL)
+
+    def _commit_staged(self, xid: int, commit_lsn: int) -> None:
+        """
+        Moves the staged chunks of a committed streamed transaction onto their
+        partition streams, one entry per chunk, in the order they were streamed.
+        """
+        key = stream_staging_key(self.instance_id, xid)
+        aborted = self._stream_aborted.pop(xid, set())
+        # The staging list must hold every chunk before it is read back
+        self._write_pending()
+        start = 0
+        while True:
+            chunks = self.redis.lrange(key, start, start + _STAGING_PAGE - 1)
+            for chunk in chunks:
+                partition, subxid, count = _STAGED_CHUNK.unpack_from(chunk)
+                if subxid in aborted:
+                    continue
+                self._queue("xadd", partition_stream_key(partition), {
+                    "lsn": commit_lsn,
+                    "xid": xid,
+                    "count": count,
+                    "payload": chunk[_STAGED_CHUNK.size:],
+                    "instance_id": str(self.instance_id),
+                })
+            if len(chunks) < _STAGING_PAGE:
+                break
+            start += _STAGING_PAGE
+            # Bound memory on very large transactions
+            self._write_pending()
+        self._queue("delete", key)
+
+    def _queue_entry(self, partition: int, payloads: List[bytes], lsn: int) -> None:
+        if not payloads:
+            return
+        self._queue("xadd", partition_stream_key(partition), {
+            "lsn": lsn,
+            "xid": self._tx_xid if self._tx_xid is not None else "",
+            "count": len(payloads),
+            "payload": pack_messages(payloads),
+            "instance_id": str(self.instance_id),
+        })
+
+    def _queue(self, command: str, *args) -> None:
+        if not self._has_pending():
+            self._pending_since = time.time()
+        self._pending.append((command, args))
+
+    def _mark_lsn(self, lsn: int) -> None:
+        if not self._has_pending():
+            self._pending_since = time.time()
+        self._pending_lsn = lsn
+
+    def _partition(self, decoded: dict) -> int:
+        relation = self.decoder.relations.get(decoded.get("relation_id"), {})
+        key_columns = [col["name"] for col in relation.get("columns", []) if col["key"]]
+        if not key_columns:
+            # No replica identity key: keep the relation on one partition so its order holds
+            return partition_for(decoded.get("schema"), decoded.get("table"), [], self.partitions)
+        row = decoded.get("data") or {}
+        return partition_for(decoded.get("schema"), decoded.get("table"), [row.get(col) for col in key_columns], self.partitions)
 
     def _checkpoint(self, lsn: int):
         # Convert int to PG format X/Y (High 32bit / Low 32bit)
@@ -5,103 +5,641 @@ import os
 import json
 import uuid
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Set, Tuple
 from uuid import UUID
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 from app.models.core import SyncDefinition, SyncSource, SyncLedgerEntry, SyncTarget
-from app.services.pgoutput import PgOutputDecoder
+from app.services.pgoutput import PgOutputDecoder, UNCHANGED_TOAST
 from app.services.sharepoint_content import SharePointContentService
-from app.services.graph import GraphClient
-from app.models.core import SharePointConnection
+from app.services.graph import shared_graph_client
+from app.models.core import SharePointConnection, DatabaseInstance
 from app.services.sharding import ShardingEvaluator
+from app.services.state import LedgerService
+from app.services.pusher import serialize_value_for_sharepoint, compute_content_hash
+from app.services.cdc_partitions import PartitionLeases, LeaseLostError, CDC_CONSUMER_GROUP, CDC_STREAM_PARTITIONS, all_stream_keys, partition_stream_key, stream_partition, relations_key, unpack_messages
+from app.services.cdc_dead_letter import DeadLetterService, CDC_ERRORS_KEY
+from app.services.cdc_toast import ToastCache, toastable_columns
+from app.services.database import DatabaseClient
 import hashlib
+import socket
+import struct
 
 logger = logging.getLogger(__name__)
 
+# Stream entries read (and acknowledged) per XREADGROUP call
+CDC_BATCH_SIZE = int(os.environ.get("CDC_BATCH_SIZE", "500"))
+# How long XREADGROUP blocks waiting for new entries
+CDC_BLOCK_MS = int(os.environ.get("CDC_BLOCK_MS", "5000"))
+# Pending entries idle this long (their consumer crashed, or applying them failed) are reclaimed
+CDC_CLAIM_IDLE_MS = int(os.environ.get("CDC_CLAIM_IDLE_MS", "60000"))
+# Seconds between sweeps of the pending entries list
+CDC_RECLAIM_INTERVAL = float(os.environ.get("CDC_RECLAIM_INTERVAL", "30"))
+# Deliveries after which an entry is moved to the dead-letter stream
+CDC_MAX_DELIVERIES = int(os.environ.get("CDC_MAX_DELIVERIES", "5"))
+
+# Keys (sync_def:id_hash) with a change that failed and is pending retry -> position
+# ("lsn:entry id") of the newest change to the key applied since, "0:0-0" if none
+CDC_RETRY_KEYS_KEY = "arcore:cdc:retry_keys"
+_NO_POSITION = "0:0-0"
+
+
+class CDCWriteError(Exception):
+    """
+    Raised by process_batch after committing the changes that were written when
+    some SharePoint writes failed. errors maps the id of every entry behind a
+    failed change to its error; those entries must stay pending.
+    """
+    def __init__(self, errors: Dict[Any, str]):
+        super().__init__(f"{len(errors)} CDC entries not applied")
+        self.errors = errors
+
+
 class CDCConsumer:
-    def __init__(self, db: Session, content_service_factory=None):
+    def __init__(self, db: Session, content_service_factory=None, batch_size: int = CDC_BATCH_SIZE):
         self.db = db
+        self.batch_size = batch_size
         self.redis_url = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
         self.redis = redis.Redis.from_url(self.redis_url)
-        self.stream_key = "arcore:cdc:events"
-        self.group_name = "arcore_cdc_group"
-        self.consumer_name = f"consumer_{os.getpid()}"
+        self.group_name = CDC_CONSUMER_GROUP
+        # Unique across nodes: partition leases and pending entries are tracked per consumer name
+        self.consumer_name = f"consumer_{socket.gethostname()}_{os.getpid()}"
+        self.leases = PartitionLeases(self.redis, self.consumer_name)
         self.decoder = PgOutputDecoder()
         self.content_service_factory = content_service_factory
+        self.ledger = LedgerService(db)
+        self.dead_letters = DeadLetterService(self.redis)
+        # Last-known large column values, for UPDATEs that leave them unchanged
+        self.toast_cache = ToastCache()
+        self._toastable: Dict[int, Tuple[Dict[str, Any], List[str]]] = {} # rel_id -> (relation, columns)
+        self._source_clients: Dict[str, DatabaseClient] = {}
+        self._last_reclaim = 0.0
+        # Partitions leased as of the last refresh
+        self._partitions: Set[int] = set()
         
         # Cache for SyncDefs
         self._sync_def_cache = {} # (instance_id, schema, table) -> SyncDefinition
+        self._evaluators: Dict[Any, ShardingEvaluator] = {} # SyncDefinition.id -> evaluator of its sharding policy
         self._last_cache_update = 0
         
         self._setup_group()
 
     def _setup_group(self):
-        try:
-            self.redis.xgroup_create(self.stream_key, self.group_name, id="0", mkstream=True)
-        except redis.exceptions.ResponseError as e:
-            if "BUSYGROUP" not in str(e):
-                raise
+        for stream_key in all_stream_keys(CDC_STREAM_PARTITIONS):
+            try:
+                self.redis.xgroup_create(stream_key, self.group_name, id="0", mkstream=True)
+            except redis.exceptions.ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
 
     def run(self):
         logger.info(f"Starting CDC Consumer {self.consumer_name}")
-        while True:
-            try:
-                # Read new messages
-                streams = self.redis.xreadgroup(
-                    self.group_name, 
-                    self.consumer_name, 
-                    {self.stream_key: ">"}, 
-                    count=10, 
-                    block=5000
-                )
-                
-                if not streams:
-                    continue
+        try:
+            while True:
+                try:
+                    # Renew/claim partition leases between batches
+                    partitions = self.leases.refresh()
+                    # Lost or released meanwhile: another consumer may change these rows now
+                    for partition in self._partitions.difference(partitions):
+                        self.toast_cache.drop_partition(partition)
+                    claimed = [p for p in partitions if p not in self._partitions]
+                    self._partitions = set(partitions)
+                    if not partitions:
+                        time.sleep(1)
+                        continue
+
+                    if claimed:
+                        # Entries the previous owner left pending go before anything newer
+                        self.reclaim_pending(claimed, min_idle_ms=0)
+
+                    if time.time() - self._last_reclaim >= CDC_RECLAIM_INTERVAL:
+                        self.reclaim_pending(partitions)
+                        self._last_reclaim = time.time()
+
+                    # Read new messages
+                    streams = self.redis.xreadgroup(
+                        self.group_name, 
+                        self.consumer_name, 
+                        {partition_stream_key(p): ">" for p in partitions}, 
+                        count=self.batch_size, 
+                        block=CDC_BLOCK_MS
+                    )
                     
-                for stream, messages in streams:
-                    for message_id, data in messages:
-                        self.process_message(message_id, data)
-                        self.redis.xack(self.stream_key, self.group_name, message_id)
+                    if not streams:
+                        continue
                         
+                    for stream, messages in streams:
+                        self._apply_and_ack(stream, messages)
+                            
+                except Exception as e:
+                    logger.error(f"Consumer Error: {e}")
+                    time.sleep(1)
+        finally:
+            self.leases.release_all()
+
+    def _apply_and_ack(self, stream, messages, retry: bool = False) -> None:
+        """
+        Applies a batch and acknowledges it with one XACK. If the batch fails, retries
+        its entries one at a time so a single poison entry does not hold back the rest:
+        entries that apply are acknowledged, failing ones stay pending (with their
+        error recorded) until reclaim_pending retries or dead-letters them. Entries
+        whose SharePoint writes failed are left pending the same way.
+        retry: the entries were reclaimed from the pending entries list.
+
+        The partition lease is renewed while the batch applies. If it is lost, the
+        batch is abandoned unacknowledged for the new owner to take over.
+        """
+        try:
+            with self.leases.heartbeat():
+                self._apply_entries(stream, messages, retry)
+        except LeaseLostError as e:
+            self.db.rollback()
+            self.toast_cache.drop_partition(stream_partition(stream))
+            logger.warning(f"Abandoning CDC batch of {len(messages)} from {stream}: {e}")
+
+    def _apply_entries(self, stream, messages, retry: bool) -> None:
+        partition = stream_partition(stream)
+        try:
+            self.process_batch(messages, retry=retry, partition=partition)
+            self._ack(stream, [message_id for message_id, _ in messages], retry)
+            return
+        except CDCWriteError as e:
+            # The rest of the batch is committed: acknowledge it, keep the failed entries
+            applied = [message_id for message_id, _ in messages if message_id not in e.errors]
+            if applied:
+                self._ack(stream, applied, retry)
+            for message_id, error in e.errors.items():
+                self._record_error(message_id, error)
+            return
+        except LeaseLostError:
+            raise
+        except Exception as e:
+            self.db.rollback()
+            if len(messages) == 1:
+                self._record_error(messages[0][0], e)
+                return
+            logger.warning(f"CDC batch of {len(messages)} from {stream} failed ({e}), retrying entries individually")
+
+        applied = []
+        for message_id, data in messages:
+            try:
+                self.process_batch([(message_id, data)], retry=retry, partition=partition)
+                applied.append(message_id)
+            except LeaseLostError:
+                # Entries applied so far are committed; acknowledging them needs the lease too
+                break
             except Exception as e:
-                logger.error(f"Consumer Error: {e}")
-                time.sleep(1)
+                self.db.rollback()
+                self._record_error(message_id, e.errors[message_id] if isinstance(e, CDCWriteError) else e)
+        if applied:
+            self._ack(stream, applied, retry)
+
+    def _ack(self, stream, message_ids, clear_errors: bool) -> None:
+        self._check_lease(stream_partition(stream))
+        self.redis.xack(stream, self.group_name, *message_ids)
+        if clear_errors:
+            # Retried entries may have an error recorded from an earlier delivery
+            self.redis.hdel(CDC_ERRORS_KEY, *message_ids)
+
+    def _record_error(self, message_id, error) -> None:
+        logger.error(f"Failed to apply CDC entry {message_id}: {error}")
+        self.redis.hset(CDC_ERRORS_KEY, message_id, str(error))
+
+    def _check_lease(self, partition: Optional[int]) -> None:
+        if partition is not None and not self.leases.owns(partition):
+            raise LeaseLostError(f"lease on CDC partition {partition} lost")
+
+    def reclaim_pending(self, partitions: List[int], min_idle_ms: int = CDC_CLAIM_IDLE_MS) -> int:
+        """
+        Takes over pending entries idle for min_idle_ms on the given partitions (left
+        by a crashed consumer or a previous owner, or failed here earlier) and retries
+        them. Entries delivered more than CDC_MAX_DELIVERIES times are dead-lettered
+        and acknowledged. Returns the number of entries reclaimed.
+        """
+        reclaimed = 0
+        for partition in partitions:
+            stream = partition_stream_key(partition)
+            start_id = "0-0"
+            while True:
+                response = self.redis.xautoclaim(
+                    stream, self.group_name, self.consumer_name,
+                    min_idle_time=min_idle_ms, start_id=start_id, count=self.batch_size,
+                )
+                next_id, claimed = response[0], response[1]
+                # Entries trimmed from the stream while pending come back without data
+                messages = [(message_id, data) for message_id, data in claimed if data]
+                if messages:
+                    reclaimed += len(messages)
+                    try:
+                        self._retry_or_dead_letter(stream, messages)
+                    except LeaseLostError as e:
+                        logger.warning(f"Stopped reclaiming {stream}: {e}")
+                        break
+                if next_id in (b"0-0", "0-0") or not claimed:
+                    break
+                start_id = next_id
+        return reclaimed
+
+    def _retry_or_dead_letter(self, stream, messages) -> None:
+        pending = self.redis.xpending_range(
+            stream, self.group_name, min=messages[0][0], max=messages[-1][0],
+            count=len(messages), consumername=self.consumer_name,
+        )
+        deliveries = {entry["message_id"]: entry["times_delivered"] for entry in pending}
+
+        retry, dead = [], []
+        for message_id, data in messages:
+            if deliveries.get(message_id, 0) > CDC_MAX_DELIVERIES:
+                dead.append((message_id, data))
+            else:
+                retry.append((message_id, data))
+
+        if dead:
+            self._check_lease(stream_partition(stream))
+        for message_id, data in dead:
+            error = self.redis.hget(CDC_ERRORS_KEY, message_id)
+            self.dead_letters.add(stream, message_id, data, deliveries[message_id], error.decode() if error else None)
+        if dead:
+            self._ack(stream, [message_id for message_id, _ in dead], clear_errors=True)
+
+        if retry:
+            logger.info(f"Retrying {len(retry)} reclaimed CDC entries from {stream}")
+            self._apply_and_ack(stream, retry, retry=True)
 
     def process_message(self, message_id, data):
-        # data is dict of bytes
-        payload = data.get(b'payload')
-        instance_id_bytes = data.get(b'instance_id')
-        instance_id_str = instance_id_bytes.decode('utf-8') if instance_id_bytes else ""
-        
-        if not payload:
-            return
+        self.process_batch([(message_id, data)])
 
-        decoded = self.decoder.decode(payload)
-        if not decoded or decoded["type"] in ("BEGIN", "COMMIT", "RELATION", "UNKNOWN"):
-            return
+    def process_batch(self, messages: List[Tuple[Any, Dict[bytes, Any]]], retry: bool = False, partition: Optional[int] = None) -> int:
+        """
+        Decodes a batch of stream entries, collapses changes to the same (sync_def, pk)
+        into their final state, then applies them with batched Graph writes and one
+        ledger write. An entry carries a whole source transaction (its rows on this
+        partition), so a transaction is never split across ledger commits.
+        Returns the number of coalesced changes. If some writes fail, the others are
+        still committed and CDCWriteError names the entries to leave pending.
 
-        # INSERT/UPDATE/DELETE
-        schema = decoded.get("schema")
-        table = decoded.get("table")
-        op_type = decoded.get("type")
-        row_data = decoded.get("data")
-        
-        if not schema or not table:
-            return
+        A key whose change failed is held in CDC_RETRY_KEYS_KEY until its retry
+        (retry=True) resolves it. A retried change older than one applied to the key
+        since is dropped, so it cannot overwrite the newer state.
+
+        With a partition, its lease is confirmed before each group of writes. If it was
+        lost, the writes made so far are committed and LeaseLostError is raised.
+        """
+        changes = self._coalesce(messages, partition)
+        if not changes:
+            return 0
+
+        held = self._held_positions(changes)
+        to_apply = {}
+        for key, change in changes.items():
+            if key in held and change["position"] < held[key]:
+                logger.info(f"Dropping CDC change to {change['schema']}.{change['table']} {change['pk_val']}: a newer change was applied")
+                self.toast_cache.evict(change["toast_key"])
+            else:
+                to_apply[key] = change
+
+        try:
+            failed = self._apply_changes(to_apply, partition)
+        except LeaseLostError:
+            raise
+        except Exception:
+            # A single entry fails on its own and stays pending: guard its keys
+            if len(messages) == 1:
+                self._hold_keys(changes.values())
+            raise
+
+        self._resolve_held(changes, held, failed, retry)
+        if failed:
+            errors: Dict[Any, str] = {}
+            for key, error in failed.items():
+                for message_id in changes[key]["message_ids"]:
+                    errors.setdefault(message_id, error)
+            # Those entries are retried whole: guard every key they carry, written or not
+            self._hold_keys(change for change in changes.values() if not errors.keys().isdisjoint(change["message_ids"]))
+            raise CDCWriteError(errors)
+        return len(changes)
+
+    def _apply_changes(self, changes: Dict[tuple, Dict[str, Any]], partition: Optional[int] = None) -> Dict[tuple, str]:
+        """
+        Writes coalesced changes to SharePoint and commits the ledger for the ones
+        written. Returns the error per key whose write failed.
+        """
+        if not changes:
+            return {}
 
-        sync_def = self._get_sync_def(instance_id_str, schema, table)
-        if not sync_def:
-            # No sync definition for this table
+        # Ledger entries for the whole batch, one query per sync definition
+        hashes_by_def: Dict[UUID, List[str]] = {}
+        for change in changes.values():
+            hashes_by_def.setdefault(change["sync_def"].id, []).append(change["id_hash"])
+        ledger_by_def = {
+            sync_def_id: self.ledger.get_entries(sync_def_id, hashes)
+            for sync_def_id, hashes in hashes_by_def.items()
+        }
+
+        write_groups: Dict[int, Dict[str, Any]] = {}
+        services: Dict[tuple, Any] = {}
+        for key, change in changes.items():
+            ledger_entry = ledger_by_def[change["sync_def"].id].get(change["id_hash"])
+            planned = self._plan_change(change, ledger_entry, services)
+            if not planned:
+                continue
+            content_service, site_id, operation = planned
+            group = write_groups.setdefault(id(content_service), {
+                "service": content_service,
+                "site_id": site_id,
+                "operations": [],
+                "rows": [],
+            })
+            group["operations"].append(operation)
+            group["rows"].append((key, change, ledger_entry))
+
+        ledger_rows = []
+        deleted_by_def: Dict[UUID, List[str]] = {}
+        failed: Dict[tuple, str] = {}
+        lease_lost = None
+        for group in write_groups.values():
+            try:
+                self._check_lease(partition)
+            except LeaseLostError as e:
+                lease_lost = e
+                break
+            results = group["service"].write_items(group["site_id"], group["operations"])
+            for operation, (key, change, ledger_entry), result in zip(group["operations"], group["rows"], results):
+                if not result["success"]:
+                    error = f"Failed to {operation['action']} SP item: [{result['status']}] {result['error']}"
+                    logger.error(error)
+                    failed[key] = error
+                    continue
+
+                sync_def = change["sync_def"]
+                if operation["action"] == "delete":
+                    deleted_by_def.setdefault(sync_def.id, []).append(change["id_hash"])
+                elif ledger_entry:
+                    ledger_rows.append({
+                        "sync_def_id": sync_def.id,
+                        "source_identity_hash": change["id_hash"],
+                        "source_identity": ledger_entry.source_identity,
+                        "source_key_strategy": ledger_entry.source_key_strategy,
+                        "source_instance_id": ledger_entry.source_instance_id,
+                        "sp_list_id": ledger_entry.sp_list_id,
+                        "sp_item_id": ledger_entry.sp_item_id,
+                        "content_hash": change["content_hash"],
+                        "provenance": "PUSH",
+                        "last_sync_ts": datetime.utcnow(),
+                    })
+                elif result["id"]:
+                    ledger_rows.append({
+                        "sync_def_id": sync_def.id,
+                        "source_identity_hash": change["id_hash"],
+                        "source_identity": str(change["pk_val"]),
+                        "source_key_strategy": "PRIMARY_KEY",
+                        "source_instance_id": self._source_instance_id(change["instance_id"]),
+                        "sp_list_id": operation["list_id"],
+                        "sp_item_id": int(result["id"]),
+                        "content_hash": change["content_hash"],
+                        "provenance": "PUSH",
+                        "last_sync_ts": datetime.utcnow(),
+                    })
+
+        self.ledger.upsert_entries(ledger_rows)
+        for sync_def_id, hashes in deleted_by_def.items():
+            self.ledger.delete_entries(sync_def_id, hashes)
+        self.db.commit()
+        if lease_lost:
+            # Written items are in the ledger, so the new owner updates rather than duplicates them
+            raise lease_lost
+        return failed
+
+    @staticmethod
+    def _retry_field(change: Dict[str, Any]) -> str:
+        return f"{change['sync_def'].id}:{change['id_hash']}"
+
+    @staticmethod
+    def _parse_position(value) -> Tuple[int, int, int]:
+        """"lsn:ms-seq" -> (lsn, ms, seq), ordered like the changes they describe."""
+        if isinstance(value, bytes):
+            value = value.decode()
+        lsn, entry_id = value.split(":", 1)
+        ms, seq = entry_id.split("-", 1)
+        return int(lsn), int(ms), int(seq)
+
+    @classmethod
+    def _entry_position(cls, message_id, data: Dict[bytes, Any]) -> Tuple[int, int, int]:
+        """Source commit LSN, then stream order: chunks of one transaction share an LSN."""
+        lsn = data.get(b'lsn') or 0
+        lsn = lsn.decode() if isinstance(lsn, bytes) else lsn
+        message_id = message_id.decode() if isinstance(message_id, bytes) else message_id
+        return cls._parse_position(f"{lsn}:{message_id}")
+
+    def _held_positions(self, changes: Dict[tuple, Dict[str, Any]]) -> Dict[tuple, Tuple[int, int, int]]:
+        """Position of the newest change applied to each held key of the batch, one HMGET."""
+        keys = list(changes)
+        values = self.redis.hmget(CDC_RETRY_KEYS_KEY, [self._retry_field(changes[key]) for key in keys])
+        return {key: self._parse_position(value) for key, value in zip(keys, values) if value is not None}
+
+    def _hold_keys(self, changes) -> None:
+        for change in changes:
+            self.redis.hsetnx(CDC_RETRY_KEYS_KEY, self._retry_field(change), _NO_POSITION)
+
+    def _resolve_held(self, changes, held, failed, retry: bool) -> None:
+        """
+        A retry that applied (or dropped) a held key's change releases the key. A
+        newer change applied meanwhile records its position, so the pending older
+        one is dropped when it is retried.
+        """
+        resolved = [key for key in held if key not in failed]
+        if not resolved:
             return
-            
-        if sync_def.is_paused:
+        if retry:
+            self.redis.hdel(CDC_RETRY_KEYS_KEY, *[self._retry_field(changes[key]) for key in resolved])
             return
+        positions = {}
+        for key in resolved:
+            position = max(held[key], changes[key]["position"])
+            positions[self._retry_field(changes[key])] = "%d:%d-%d" % position
+        self.redis.hset(CDC_RETRY_KEYS_KEY, mapping=positions)
 
-        # Throttle check? 
-        # Ideally we check Redis for last processed time for this sync_def.
-        
-        self._apply_change(sync_def, op_type, row_data, instance_id_str)
+    def _coalesce(self, messages, partition: Optional[int] = None) -> Dict[tuple, Dict[str, Any]]:
+        """
+        Decodes messages in stream order and keeps only the final state per
+        (sync_def, pk). A later INSERT/UPDATE replaces earlier row data; a DELETE
+        replaces everything before it.
+        """
+        changes: Dict[tuple, Dict[str, Any]] = {}
+        positions = {message_id: self._entry_position(message_id, data) for message_id, data in messages}
+        for message_id, instance_id_str, payload in self._payloads(messages):
+            # Always decode: RELATION messages update decoder state for later rows
+            self._ensure_relation(instance_id_str, payload)
+            decoded = self.decoder.decode(payload)
+            if not decoded or decoded["type"] in ("BEGIN", "COMMIT", "RELATION", "UNKNOWN"):
+                continue
+
+            # INSERT/UPDATE/DELETE
+            schema = decoded.get("schema")
+            table = decoded.get("table")
+            op_type = decoded.get("type")
+            row_data = decoded.get("data")
+            
+            if not schema or not table:
+                continue
+
+            sync_def = self._get_sync_def(instance_id_str, schema, table)
+            if not sync_def:
+                # No sync definition for this table
+                continue
+                
+            if sync_def.is_paused:
+                continue
+
+            pg_pk_col = "id"
+            for fm in sync_def.field_mappings:
+                if fm.is_key and fm.source_column_name:
+                    pg_pk_col = fm.source_column_name
+
+            pg_pk_val = row_data.get(pg_pk_col)
+            if pg_pk_val is None:
+                # Cannot identify row
+                continue
+
+            toast_key = (partition, instance_id_str, schema, table, str(pg_pk_val))
+            unchanged = []
+            if op_type == "DELETE":
+                self.toast_cache.evict(toast_key)
+            else:
+                unchanged = self.toast_cache.carry_forward(toast_key, row_data)
+                self.toast_cache.remember(toast_key, row_data, self._toastable_columns(decoded["relation_id"]))
+
+            key = (sync_def.id, str(pg_pk_val))
+            # Re-insert so the dict keeps the order of each key's last change
+            previous = changes.pop(key, None)
+            # Every entry that touched the key depends on its final write
+            message_ids = previous["message_ids"] if previous else []
+            if message_id not in message_ids:
+                message_ids.append(message_id)
+            position = max(previous["position"], positions[message_id]) if previous else positions[message_id]
+            changes[key] = {
+                "sync_def": sync_def,
+                "op_type": op_type,
+                "row_data": row_data,
+                "pk_col": pg_pk_col,
+                "pk_val": pg_pk_val,
+                "schema": schema,
+                "table": table,
+                "unchanged": unchanged,
+                # Identity Hash
+                "id_hash": hashlib.sha256(str(pg_pk_val).encode()).hexdigest(),
+                "instance_id": instance_id_str,
+                "toast_key": toast_key,
+                "message_ids": message_ids,
+                "position": position,
+            }
+
+        self._seed_unchanged(changes)
+        for change in changes.values():
+            self._map_fields(change)
+        return changes
+
+    @staticmethod
+    def _payloads(messages):
+        """
+        Yields (entry id, instance_id, pgoutput message) in stream order. An entry holds the
+        row messages of one source transaction (on this partition), framed by
+        pack_messages; entries without a message count are a single raw message.
+        """
+        for message_id, data in messages:
+            # data is dict of bytes
+            payload = data.get(b'payload')
+            if not payload:
+                continue
+            instance_id_bytes = data.get(b'instance_id')
+            instance_id_str = instance_id_bytes.decode('utf-8') if instance_id_bytes else ""
+            if b'count' in data:
+                for message in unpack_messages(payload):
+                    yield message_id, instance_id_str, message
+            else:
+                yield message_id, instance_id_str, payload
+
+    @staticmethod
+    def _map_fields(change: Dict[str, Any]) -> None:
+        """
+        Maps source columns to SharePoint fields the way Pusher does, so the content
+        hash matches a batch push of the same row. Columns still marked unchanged
+        (value unknown) are left out of both.
+        """
+        row_data = change["row_data"]
+        sp_data = {}
+        hashed_data = {}
+        for fm in change["sync_def"].field_mappings:
+            if fm.sync_direction == "PULL_ONLY" or fm.is_system_field:
+                continue
+            if fm.source_column_name in row_data and fm.target_column_name:
+                value = row_data[fm.source_column_name]
+                if value is UNCHANGED_TOAST:
+                    continue
+                sp_data[fm.target_column_name] = serialize_value_for_sharepoint(value)
+                hashed_data[fm.source_column_name] = value
+        change["sp_data"] = sp_data
+        change["content_hash"] = compute_content_hash(hashed_data)
+
+    def _toastable_columns(self, rel_id: int) -> List[str]:
+        relation = self.decoder.relations.get(rel_id, {})
+        cached = self._toastable.get(rel_id)
+        if cached is None or cached[0] is not relation:
+            # A new RELATION message replaces the relation dict
+            cached = (relation, toastable_columns(relation))
+            self._toastable[rel_id] = cached
+        return cached[1]
+
+    def _seed_unchanged(self, changes: Dict[tuple, Dict[str, Any]]) -> None:
+        """
+        Reads unchanged TOAST values the cache did not have from the source table,
+        one query per table. If the source cannot be read the columns stay unknown
+        and are left out of the SharePoint write rather than blanked.
+        """
+        pending: Dict[tuple, List[Dict[str, Any]]] = {}
+        for change in changes.values():
+            if change["unchanged"]:
+                pending.setdefault((change["instance_id"], change["schema"], change["table"], change["pk_col"]), []).append(change)
+
+        for (instance_id, schema, table, pk_col), table_changes in pending.items():
+            try:
+                client = self._source_client(instance_id)
+                rows = client.fetch_rows(schema, table, pk_col, [change["pk_val"] for change in table_changes]) if client else {}
+            except Exception as e:
+                logger.warning(f"Could not read unchanged TOAST values from {schema}.{table}: {e}")
+                continue
+            for change in table_changes:
+                row = rows.get(str(change["pk_val"]))
+                if not row:
+                    continue
+                for col in change["unchanged"]:
+                    if col in row:
+                        change["row_data"][col] = row[col]
+                self.toast_cache.remember(change["toast_key"], change["row_data"], change["unchanged"])
+
+    def _source_client(self, instance_id: str) -> Optional[DatabaseClient]:
+        client = self._source_clients.get(instance_id)
+        if client is None:
+            instance = self.db.get(DatabaseInstance, UUID(instance_id)) if instance_id else None
+            if not instance:
+                return None
+            client = DatabaseClient(instance)
+            self._source_clients[instance_id] = client
+        return client
+
+    def _ensure_relation(self, instance_id_str: str, payload: bytes) -> None:
+        """
+        Loads the RELATION for a row message from the producer's registry when this
+        consumer has not seen it (it took the partition over, or restarted).
+        """
+        if payload[:1] not in (b'I', b'U', b'D') or len(payload) < 5:
+            return
+        rel_id = struct.unpack('>i', payload[1:5])[0]
+        if rel_id in self.decoder.relations:
+            return
+        relation_payload = self.redis.hget(relations_key(instance_id_str), rel_id)
+        if relation_payload:
+            self.decoder.decode(relation_payload)
 
     def _get_sync_def(self, instance_id: str, schema: str, table: str) -> Optional[SyncDefinition]:
         # Cache refresh every 60s
@@ -119,21 +657,37 @@ class CDCConsumer:
         results = self.db.execute(stmt).all()
         
         self._sync_def_cache = {}
+        self._evaluators = {}
         for sync_def, source in results:
             key = (str(source.database_instance_id), sync_def.source_schema or "public", sync_def.source_table_name)
             self._sync_def_cache[key] = sync_def
         
         self._last_cache_update = time.time()
 
-    def _apply_change(self, sync_def: SyncDefinition, op_type: str, row_data: dict, instance_id_str: str):
+    def _plan_change(self, change: Dict[str, Any], ledger_entry: Optional[SyncLedgerEntry], services: Dict[tuple, Any]):
+        """
+        Resolves the target list and content service for a coalesced change and
+        returns (content_service, site_id, operation), or None when nothing is written.
+        """
+        sync_def = change["sync_def"]
+        op_type = change["op_type"]
+
+        # Ledger Check
+        if op_type == "DELETE":
+            if not ledger_entry:
+                return None
+        # Loop Prevention: If ledger says this content came from PULL (SharePoint), ignore echo.
+        # If DB change hash matches Ledger hash AND Ledger provenance is PULL, it's an echo.
+        elif ledger_entry and ledger_entry.provenance == "PULL" and ledger_entry.content_hash == change["content_hash"]:
+            return None # Echo
+
         # Resolve Target
         # Sharding support
         target_list_id = None
         if sync_def.target_strategy == "CONDITIONAL":
-            evaluator = ShardingEvaluator(sync_def.sharding_policy)
             # row_data from decoder is dict {col: val}.
             # ShardingEvaluator expects dict.
-            shard_uuid = evaluator.evaluate(row_data)
+            shard_uuid = self._sharding_evaluator(sync_def).evaluate(change["row_data"])
             if shard_uuid:
                 target_list_id = str(shard_uuid)
         
@@ -141,9 +695,35 @@ class CDCConsumer:
             # Default target
             if not sync_def.target_list_id:
                 logger.warning(f"No target for SyncDef {sync_def.id}")
-                return
+                return None
             target_list_id = str(sync_def.target_list_id)
 
+        resolved = self._get_content_service(sync_def, target_list_id, services)
+        if not resolved:
+            return None
+        content_service, site_id = resolved
+
+        if op_type == "DELETE":
+            operation = {"action": "delete", "list_id": target_list_id, "item_id": str(ledger_entry.sp_item_id)}
+        elif ledger_entry:
+            operation = {"action": "update", "list_id": target_list_id, "item_id": str(ledger_entry.sp_item_id), "fields": change["sp_data"]}
+        else:
+            operation = {"action": "create", "list_id": target_list_id, "fields": change["sp_data"]}
+        return content_service, site_id, operation
+
+    def _sharding_evaluator(self, sync_def: SyncDefinition) -> ShardingEvaluator:
+        """One evaluator per sync definition, rebuilt when the sync definitions are reloaded."""
+        evaluator = self._evaluators.get(sync_def.id)
+        if evaluator is None:
+            evaluator = self._evaluators[sync_def.id] = ShardingEvaluator(sync_def.sharding_policy)
+        return evaluator
+
+    def _get_content_service(self, sync_def: SyncDefinition, target_list_id: str, services: Dict[tuple, Any]):
+        """Resolves (content_service, site_id) for a target, cached for the batch."""
+        cache_key = (sync_def.id, target_list_id)
+        if cache_key in services:
+            return services[cache_key]
+
         # Resolve Context (Connection/Site)
         # Fetch Target Object to get context
         target = self.db.get(SyncTarget, (sync_def.id, UUID(target_list_id)))
@@ -154,102 +734,32 @@ class CDCConsumer:
                  SyncTarget.sync_def_id == sync_def.id,
                  SyncTarget.is_default == True
              )).scalars().first()
-             if not target: 
-                 return # Cannot sync
         
-        conn_id = target.sharepoint_connection_id
-        site_id = target.site_id or os.environ.get("SHAREPOINT_SITE_ID", "")
-        
-        if conn_id:
-            conn = self.db.get(SharePointConnection, conn_id)
-        else:
-            conn = self.db.query(SharePointConnection).filter(SharePointConnection.status == "ACTIVE").first()
+        resolved = None
+        if target:
+            conn_id = target.sharepoint_connection_id
+            site_id = target.site_id or os.environ.get("SHAREPOINT_SITE_ID", "")
             
-        if not conn:
-            return
-
-        if self.content_service_factory:
-            content_service = self.content_service_factory(conn, site_id, target_list_id)
-        else:
-            client_secret = os.environ.get("AZURE_CLIENT_SECRET", "")
-            graph = GraphClient(conn.tenant_id, conn.client_id, client_secret, conn.authority_host)
-            content_service = SharePointContentService(graph)
-
-        # Map Fields
-        sp_data = {}
-        pg_pk_col = "id"
-        pg_pk_val = None
-        
-        for fm in sync_def.field_mappings:
-            if fm.source_column_name in row_data:
-                sp_data[fm.target_column_name] = row_data[fm.source_column_name]
-            if fm.is_key and fm.source_column_name:
-                pg_pk_col = fm.source_column_name
+            if conn_id:
+                conn = self.db.get(SharePointConnection, conn_id)
+            else:
+                conn = self.db.query(SharePointConnection).filter(SharePointConnection.status == "ACTIVE").first()
                 
-        pg_pk_val = row_data.get(pg_pk_col)
-        if pg_pk_val is None:
-            # Cannot identify row
-            return
-            
-        # Identity Hash
-        id_hash = hashlib.sha256(str(pg_pk_val).encode()).hexdigest()
-        
-        # Ledger Check
-        ledger_entry = self.db.get(SyncLedgerEntry, (sync_def.id, id_hash))
-        
-        if op_type == "DELETE":
-            if ledger_entry:
-                try:
-                    content_service.delete_item(site_id, target_list_id, str(ledger_entry.sp_item_id))
-                    self.db.delete(ledger_entry)
-                    self.db.commit()
-                except Exception as e:
-                    logger.error(f"Failed to delete SP item: {e}")
-            return
+            if conn:
+                if self.content_service_factory:
+                    content_service = self.content_service_factory(conn, site_id, target_list_id)
+                else:
+                    client_secret = os.environ.get("AZURE_CLIENT_SECRET", "")
+                    graph = shared_graph_client(conn.tenant_id, conn.client_id, client_secret, conn.authority_host)
+                    content_service = SharePointContentService(graph)
+                resolved = (content_service, site_id)
 
-        # INSERT / UPDATE
-        # Calculate Hash
-        content_hash = hashlib.sha256(json.dumps(sp_data, sort_keys=True, default=str).encode()).hexdigest()
-        
-        # Loop Prevention: If ledger says this content came from PULL (SharePoint), ignore echo.
-        # Wait, if we are in CDC, we are seeing a DB change.
-        # If DB change hash matches Ledger hash AND Ledger provenance is PULL, it's an echo.
-        
-        if ledger_entry and ledger_entry.provenance == "PULL" and ledger_entry.content_hash == content_hash:
-            return # Echo
+        services[cache_key] = resolved
+        return resolved
 
-        if ledger_entry:
-            # Update
-            try:
-                content_service.update_item(site_id, target_list_id, str(ledger_entry.sp_item_id), sp_data)
-                ledger_entry.content_hash = content_hash
-                ledger_entry.provenance = "PUSH"
-                ledger_entry.last_sync_ts = datetime.utcnow()
-                self.db.commit()
-            except Exception as e:
-                logger.error(f"Failed to update SP item: {e}")
-        else:
-            # Create
-            try:
-                sp_id = content_service.create_item(site_id, target_list_id, sp_data)
-                try:
-                    source_instance_id = UUID(instance_id_str) if instance_id_str else uuid.uuid4()
-                except ValueError:
-                    source_instance_id = uuid.uuid4()
-
-                new_entry = SyncLedgerEntry(
-                    sync_def_id=sync_def.id,
-                    source_identity_hash=id_hash,
-                    source_identity=str(pg_pk_val),
-                    source_key_strategy="PRIMARY_KEY",
-                    source_instance_id=source_instance_id,
-                    sp_list_id=target_list_id,
-                    sp_item_id=int(sp_id),
-                    content_hash=content_hash,
-                    provenance="PUSH",
-                    last_sync_ts=datetime.utcnow()
-                )
-                self.db.add(new_entry)
-                self.db.commit()
-            except Exception as e:
-                logger.error(f"Failed to create SP item: {e}")
+    @staticmethod
+    def _source_instance_id(instance_id_str: str) -> UUID:
+        try:
+            return UUID(instance_id_str) if instance_id_str else uuid.uuid4()
+        except ValueError:
+            return uuid.uuid4()
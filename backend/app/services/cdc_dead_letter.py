@@ -0,0 +1,98 @@
+import os
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+# Entries that failed CDC_MAX_DELIVERIES times are moved here instead of being retried forever
+CDC_DEAD_LETTER_STREAM = "arcore:cdc:dead"
+CDC_DEAD_LETTER_MAXLEN = int(os.environ.get("CDC_DEAD_LETTER_MAXLEN", "100000"))
+# Fields of the original entry kept with a dead letter, and written back on replay
+_ENTRY_FIELDS = (b'payload', b'instance_id', b'lsn', b'xid', b'count')
+
+# Last error per pending entry id, so a dead letter records why it kept failing
+CDC_ERRORS_KEY = "arcore:cdc:errors"
+
+_MESSAGE_TYPES = {
+    b'R': "RELATION", b'I': "INSERT", b'U': "UPDATE", b'D': "DELETE",
+    b'B': "BEGIN", b'C': "COMMIT",
+}
+
+
+def _text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    return value.decode("utf-8", errors="replace") if isinstance(value, bytes) else str(value)
+
+
+class DeadLetterService:
+    """
+    Dead-letter stream for CDC entries that could not be applied. Each dead letter
+    keeps the original stream, entry id and payload so it can be inspected and
+    replayed onto its partition once the cause has been fixed.
+    """
+    def __init__(self, redis_client: Optional[redis.Redis] = None):
+        self.redis = redis_client or redis.Redis.from_url(os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
+
+    def add(self, stream: Any, message_id: Any, data: Dict[bytes, Any], deliveries: int, error: Optional[str] = None) -> None:
+        fields = {field.decode(): data[field] for field in _ENTRY_FIELDS if field in data}
+        fields.update({
+            "stream": _text(stream),
+            "message_id": _text(message_id),
+            "deliveries": deliveries,
+            "error": error or "",
+            "failed_at": int(time.time()),
+        })
+        self.redis.xadd(CDC_DEAD_LETTER_STREAM, fields, maxlen=CDC_DEAD_LETTER_MAXLEN, approximate=True)
+        logger.error(f"Dead-lettered CDC entry {fields['message_id']} from {fields['stream']} after {deliveries} deliveries: {error}")
+
+    def list_entries(self, count: int = 100, after: str = "-") -> List[Dict[str, Any]]:
+        """Oldest first. Pass the last returned id as `after` to page."""
+        start = after if after == "-" else f"({after}"
+        entries = self.redis.xrange(CDC_DEAD_LETTER_STREAM, min=start, max="+", count=count)
+        return [self._to_dict(entry_id, fields) for entry_id, fields in entries]
+
+    def count(self) -> int:
+        return self.redis.xlen(CDC_DEAD_LETTER_STREAM)
+
+    def replay(self, entry_ids: List[str]) -> int:
+        """
+        Appends each dead letter back onto its original stream and removes it from
+        the dead-letter stream. The replayed event lands after any newer changes to
+        the same row, so only replay entries whose row has not changed since.
+        """
+        replayed = 0
+        for entry_id in entry_ids:
+            entries = self.redis.xrange(CDC_DEAD_LETTER_STREAM, min=entry_id, max=entry_id)
+            if not entries:
+                continue
+            _, fields = entries[0]
+            self.redis.xadd(fields[b'stream'], {field: fields[field] for field in _ENTRY_FIELDS if field in fields})
+            self.redis.xdel(CDC_DEAD_LETTER_STREAM, entry_id)
+            replayed += 1
+        return replayed
+
+    def discard(self, entry_ids: List[str]) -> int:
+        if not entry_ids:
+            return 0
+        return self.redis.xdel(CDC_DEAD_LETTER_STREAM, *entry_ids)
+
+    @staticmethod
+    def _to_dict(entry_id: Any, fields: Dict[bytes, Any]) -> Dict[str, Any]:
+        payload = fields.get(b'payload', b"")
+        return {
+            "id": _text(entry_id),
+            "stream": _text(fields.get(b'stream')),
+            "message_id": _text(fields.get(b'message_id')),
+            "instance_id": _text(fields.get(b'instance_id')),
+            # Entries with a count hold a framed transaction, see pack_messages
+            "message_type": "TRANSACTION" if b'count' in fields else _MESSAGE_TYPES.get(payload[:1], "UNKNOWN"),
+            "payload_hex": payload.hex(),
+            "message_count": int(fields.get(b'count') or 1),
+            "deliveries": int(fields.get(b'deliveries') or 0),
+            "error": _text(fields.get(b'error')),
+            "failed_at": int(fields.get(b'failed_at') or 0),
+        }
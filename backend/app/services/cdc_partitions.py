@@ -0,0 +1,268 @@
+import os
+import math
+import struct
+import threading
+import time
+import zlib
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Set
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+# CDC events are spread over N streams by hash(relation, primary key), so every
+# change to a row lands in the same stream and is applied by a single consumer.
+CDC_STREAM_PREFIX = "arcore:cdc:events"
+CDC_STREAM_PARTITIONS = int(os.environ.get("CDC_STREAM_PARTITIONS", "8"))
+# A consumer owns a partition while it keeps renewing this lease. It is renewed
+# between batches and, every third of the lease, while a batch is applied.
+CDC_PARTITION_LEASE_MS = int(os.environ.get("CDC_PARTITION_LEASE_MS", "30000"))
+
+# The consumer group every CDC consumer reads partitions through
+CDC_CONSUMER_GROUP = "arcore_cdc_group"
+
+# Latest RELATION payload per source relation, so a consumer that takes over a
+# partition (or restarts) can decode rows whose RELATION message it never saw
+RELATIONS_KEY_PREFIX = "arcore:cdc:relations"
+
+# Extend the lease only if we still hold it
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Drop the lease only if we still hold it
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaseLostError(Exception):
+    """The consumer no longer holds the lease on the partition it is applying."""
+
+
+def partition_stream_key(partition: int) -> str:
+    return f"{CDC_STREAM_PREFIX}:{partition}"
+
+def stream_partition(stream_key: Any) -> int:
+    """Inverse of partition_stream_key (accepts the bytes key XREADGROUP returns)."""
+    return int(_text(stream_key).rsplit(":", 1)[1])
+
+def all_stream_keys(partitions: int = CDC_STREAM_PARTITIONS) -> List[str]:
+    return [partition_stream_key(p) for p in range(partitions)]
+
+def relations_key(instance_id: Any) -> str:
+    return f"{RELATIONS_KEY_PREFIX}:{instance_id}"
+
+_FRAME_LENGTH = struct.Struct('>i')
+
+def pack_messages(payloads: List[bytes]) -> bytes:
+    """
+    Frames the pgoutput messages of one transaction (on one partition) into a
+    single stream entry payload: Int32 length + message, repeated.
+    """
+    return b"".join(_FRAME_LENGTH.pack(len(payload)) + payload for payload in payloads)
+
+def unpack_messages(data: bytes) -> List[bytes]:
+    payloads = []
+    offset = 0
+    while offset < len(data):
+        length, = _FRAME_LENGTH.unpack_from(data, offset)
+        offset += 4
+        payloads.append(data[offset:offset + length])
+        offset += length
+    return payloads
+
+def producer_stats_key(instance_id: Any) -> str:
+    return f"{CDC_STREAM_PREFIX}:producer:{instance_id}"
+
+def stream_staging_key(instance_id: Any, xid: int) -> str:
+    """List of the chunks of a streamed (in-progress) transaction, held until it commits."""
+    return f"{CDC_STREAM_PREFIX}:staging:{instance_id}:{xid}"
+
+def _text(value: Any) -> Any:
+    return value.decode() if isinstance(value, bytes) else value
+
+def group_backlog(redis_client: redis.Redis, stream_keys: List[str]) -> List[Dict[str, Any]]:
+    """
+    Per partition stream: entries the consumer group has not been delivered yet
+    (lag), entries delivered but not acknowledged (pending), and the stream length.
+    Acknowledged entries still in the stream count towards neither.
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    for stream_key in stream_keys:
+        pipe.xlen(stream_key)
+        pipe.xinfo_groups(stream_key)
+    results = pipe.execute(raise_on_error=False)
+
+    backlog = []
+    for i, stream_key in enumerate(stream_keys):
+        length, groups = results[2 * i], results[2 * i + 1]
+        length = 0 if isinstance(length, Exception) else length
+        group = None
+        if not isinstance(groups, Exception):
+            group = next((g for g in groups if _text(g.get("name")) == CDC_CONSUMER_GROUP), None)
+
+        if group is None:
+            # No consumer has attached yet: everything in the stream is waiting
+            lag, pending, last_delivered_id = length, 0, None
+        else:
+            pending = group.get("pending") or 0
+            last_delivered_id = _text(group.get("last-delivered-id"))
+            lag = group.get("lag")
+            if lag is None:
+                # Redis < 7, or lag unknown after deletions: assume every unpending entry is waiting
+                lag = max(0, length - pending)
+        backlog.append({
+            "stream": stream_key,
+            "length": length,
+            "lag": lag,
+            "pending": pending,
+            "last_delivered_id": last_delivered_id,
+        })
+    return backlog
+
+def trim_acknowledged(redis_client: redis.Redis, backlog: List[Dict[str, Any]]) -> None:
+    """
+    Trims each stream with MINID up to its oldest unacknowledged entry (or the
+    last delivered one when nothing is pending). Entries the group still needs
+    are never removed. `backlog` is the output of group_backlog.
+    """
+    with_pending = [b for b in backlog if b["pending"] and b["last_delivered_id"]]
+    pipe = redis_client.pipeline(transaction=False)
+    for b in with_pending:
+        pipe.xpending(b["stream"], CDC_CONSUMER_GROUP)
+    oldest_pending = {b["stream"]: _text(summary.get("min")) for b, summary in zip(with_pending, pipe.execute())}
+
+    pipe = redis_client.pipeline(transaction=False)
+    for b in backlog:
+        if not b["last_delivered_id"] or b["last_delivered_id"] == "0-0":
+            continue
+        min_id = oldest_pending.get(b["stream"]) or b["last_delivered_id"]
+        # Approximate (~) trimming removes whole macro nodes only, which is much cheaper
+        pipe.xtrim(b["stream"], minid=min_id, approximate=True)
+    pipe.execute()
+
+def partition_for(schema: str, table: str, key_values: Iterable[Any], partitions: int = CDC_STREAM_PARTITIONS) -> int:
+    """
+    Stable partition for a row. Uses crc32 rather than hash(), which is salted per
+    process and would send the same row to different streams from different producers.
+    """
+    key = f"{schema}.{table}:" + "\x1f".join("" if v is None else str(v) for v in key_values)
+    return zlib.crc32(key.encode()) % partitions
+
+
+class PartitionLeases:
+    """
+    Claims and renews stream partitions for one consumer.
+
+    Live consumers heartbeat into a sorted set; each aims to own its fair share
+    (ceil(partitions / live consumers)). Leases are Redis keys set with NX and a
+    TTL, so a crashed consumer's partitions become claimable once the lease expires.
+    Partitions are only released between batches, after everything read from them
+    has been acknowledged, which keeps per-row ordering across hand-offs. While a
+    batch is applied, heartbeat() keeps renewing the leases and owns() confirms a
+    lease before writes and acknowledgements.
+    """
+    def __init__(self, redis_client: redis.Redis, consumer_name: str, partitions: int = CDC_STREAM_PARTITIONS, lease_ms: int = CDC_PARTITION_LEASE_MS):
+        self.redis = redis_client
+        self.consumer_name = consumer_name
+        self.partitions = partitions
+        self.lease_ms = lease_ms
+        self.members_key = f"{CDC_STREAM_PREFIX}:consumers"
+        self.owned: Set[int] = set()
+        # owned is also read and updated by the heartbeat thread: change it under this lock
+        self._lock = threading.Lock()
+        self._renew = redis_client.register_script(_RENEW_SCRIPT)
+        self._release = redis_client.register_script(_RELEASE_SCRIPT)
+        # Start claiming at a consumer-specific offset so consumers don't all race for partition 0
+        self._offset = zlib.crc32(consumer_name.encode()) % partitions
+
+    def _lease_key(self, partition: int) -> str:
+        return f"{CDC_STREAM_PREFIX}:lease:{partition}"
+
+    def refresh(self) -> List[int]:
+        """
+        Heartbeats, renews held leases, gives up partitions above the fair share and
+        claims free ones up to it. Returns the partitions owned afterwards.
+        """
+        now_ms = self.renew()
+        self.redis.zremrangebyscore(self.members_key, 0, now_ms - self.lease_ms)
+        live = max(1, self.redis.zcard(self.members_key))
+        share = math.ceil(self.partitions / live)
+
+        with self._lock:
+            # Rebalance: hand partitions back when more consumers have joined
+            while len(self.owned) > share:
+                partition = max(self.owned)
+                self._release(keys=[self._lease_key(partition)], args=[self.consumer_name])
+                self.owned.discard(partition)
+                logger.info(f"Consumer {self.consumer_name} released CDC partition {partition}")
+
+            for i in range(self.partitions):
+                if len(self.owned) >= share:
+                    break
+                partition = (self._offset + i) % self.partitions
+                if partition in self.owned:
+                    continue
+                if self.redis.set(self._lease_key(partition), self.consumer_name, nx=True, px=self.lease_ms):
+                    self.owned.add(partition)
+                    logger.info(f"Consumer {self.consumer_name} claimed CDC partition {partition}")
+
+            return sorted(self.owned)
+
+    def renew(self) -> int:
+        """Heartbeats and extends every held lease, dropping lost ones. Returns the heartbeat time (ms)."""
+        now_ms = int(time.time() * 1000)
+        self.redis.zadd(self.members_key, {self.consumer_name: now_ms})
+        with self._lock:
+            for partition in sorted(self.owned):
+                if not self._renew(keys=[self._lease_key(partition)], args=[self.consumer_name, self.lease_ms]):
+                    logger.warning(f"Consumer {self.consumer_name} lost lease on CDC partition {partition}")
+                    self.owned.discard(partition)
+        return now_ms
+
+    def owns(self, partition: int) -> bool:
+        """Whether the lease on partition is still ours, checked in Redis."""
+        if partition not in self.owned:
+            return False
+        if _text(self.redis.get(self._lease_key(partition))) == self.consumer_name:
+            return True
+        with self._lock:
+            self.owned.discard(partition)
+        logger.warning(f"Consumer {self.consumer_name} lost lease on CDC partition {partition}")
+        return False
+
+    @contextmanager
+    def heartbeat(self):
+        """Renews the held leases in a background thread for the duration of the block."""
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(self.lease_ms / 3000):
+                try:
+                    self.renew()
+                except Exception as e:
+                    logger.warning(f"Consumer {self.consumer_name} could not renew CDC partition leases: {e}")
+
+        thread = threading.Thread(target=beat, name=f"{self.consumer_name}-leases", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def release_all(self) -> None:
+        with self._lock:
+            for partition in list(self.owned):
+                self._release(keys=[self._lease_key(partition)], args=[self.consumer_name])
+            self.owned.clear()
+        self.redis.zrem(self.members_key, self.consumer_name)
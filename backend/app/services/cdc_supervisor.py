@@ -0,0 +1,145 @@
+import os
+import random
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+from uuid import UUID
+
+import redis
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.core import DatabaseInstance
+from app.services.cdc import CDCService
+
+logger = logging.getLogger(__name__)
+
+# Seconds between scans for instances whose replication slot was added, changed or removed
+CDC_SUPERVISOR_REFRESH_INTERVAL = float(os.environ.get("CDC_SUPERVISOR_REFRESH_INTERVAL", "30"))
+# Restart backoff for a failing worker: 1s, 2s, 4s ... up to the max (with jitter)
+CDC_WORKER_MAX_BACKOFF = float(os.environ.get("CDC_WORKER_MAX_BACKOFF", "300"))
+# A worker that ran this long before failing starts its backoff from the beginning again
+CDC_WORKER_STABLE_SECONDS = 300
+
+
+class CDCWorker:
+    """
+    Runs CDCService for one instance on its own thread, restarting it with
+    exponential backoff whenever it fails, until stop() is called.
+    """
+    def __init__(self, instance_id: UUID, slot_name: str, session_factory: Callable[[], Session], redis_client: redis.Redis):
+        self.instance_id = instance_id
+        self.slot_name = slot_name
+        self.session_factory = session_factory
+        self.redis = redis_client
+        self.stop_event = threading.Event()
+        self.failures = 0
+        self.thread = threading.Thread(target=self._run, name=f"cdc-{slot_name}", daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        self.thread.join(timeout)
+
+    def is_alive(self) -> bool:
+        return self.thread.is_alive()
+
+    def _run(self) -> None:
+        attempt = 0
+        while not self.stop_event.is_set():
+            started = time.time()
+            db = self.session_factory()
+            try:
+                CDCService(db, self.instance_id, stop_event=self.stop_event, redis_client=self.redis).run()
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"CDC worker for slot {self.slot_name} failed: {e}")
+            finally:
+                db.close()
+
+            if self.stop_event.is_set():
+                break
+            if time.time() - started >= CDC_WORKER_STABLE_SECONDS:
+                attempt = 0
+            delay = self.backoff_delay(attempt)
+            attempt += 1
+            logger.info(f"Restarting CDC worker for slot {self.slot_name} in {delay:.1f}s")
+            self.stop_event.wait(delay)
+        logger.info(f"CDC worker for slot {self.slot_name} stopped")
+
+    @staticmethod
+    def backoff_delay(attempt: int) -> float:
+        return min(2 ** attempt, CDC_WORKER_MAX_BACKOFF) * random.uniform(0.5, 1.5)
+
+
+class CDCSupervisor:
+    """
+    Runs one CDCWorker thread per ACTIVE instance with a replication slot, in one
+    process. Workers share a Redis client and the session factory's connection
+    pool; each still holds its own replication connection. The instance list is
+    re-read every refresh interval, so slots are added and removed without a restart.
+    """
+    def __init__(self, session_factory: Callable[[], Session], redis_client: Optional[redis.Redis] = None, refresh_interval: float = CDC_SUPERVISOR_REFRESH_INTERVAL):
+        self.session_factory = session_factory
+        self.redis = redis_client or redis.Redis.from_url(os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
+        self.refresh_interval = refresh_interval
+        self.workers: Dict[UUID, CDCWorker] = {}
+        self.stop_event = threading.Event()
+
+    def discover(self) -> Dict[UUID, str]:
+        """Instances that should be streaming: {instance_id: slot_name}."""
+        db = self.session_factory()
+        try:
+            rows = db.execute(select(DatabaseInstance.id, DatabaseInstance.replication_slot_name).where(
+                DatabaseInstance.replication_slot_name.isnot(None),
+                DatabaseInstance.status == "ACTIVE"
+            )).all()
+            return {instance_id: slot_name for instance_id, slot_name in rows if slot_name}
+        finally:
+            db.close()
+
+    def reconcile(self) -> None:
+        """Starts workers for new slots and stops workers whose slot was removed or renamed."""
+        wanted = self.discover()
+
+        for instance_id, worker in list(self.workers.items()):
+            if wanted.get(instance_id) != worker.slot_name:
+                logger.info(f"Stopping CDC worker for slot {worker.slot_name}")
+                worker.stop()
+                del self.workers[instance_id]
+
+        for instance_id, slot_name in wanted.items():
+            if instance_id not in self.workers:
+                logger.info(f"Starting CDC worker for instance {instance_id} on slot {slot_name}")
+                worker = CDCWorker(instance_id, slot_name, self.session_factory, self.redis)
+                worker.start()
+                self.workers[instance_id] = worker
+
+    def run(self) -> None:
+        logger.info("Starting CDC supervisor")
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    self.reconcile()
+                except Exception as e:
+                    logger.error(f"CDC supervisor refresh failed: {e}")
+                self.stop_event.wait(self.refresh_interval)
+        finally:
+            self.shutdown()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def shutdown(self, timeout: float = 30) -> None:
+        """Stops every worker and waits for them to flush and checkpoint."""
+        for worker in self.workers.values():
+            worker.stop()
+        deadline = time.time() + timeout
+        for worker in self.workers.values():
+            worker.join(max(0, deadline - time.time()))
+        self.workers.clear()
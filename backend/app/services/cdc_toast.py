@@ -0,0 +1,74 @@
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List
+
+from app.services.pgoutput import UNCHANGED_TOAST
+
+# Rows whose TOAST-able values are remembered. Each entry holds the row's
+# variable-width column values, so size this against the widest synced tables.
+CDC_TOAST_CACHE_SIZE = int(os.environ.get("CDC_TOAST_CACHE_SIZE", "5000"))
+
+# Fixed-width types are stored inline and never arrive as 'unchanged TOAST'
+_FIXED_WIDTH_TYPES = {
+    16, 18, 20, 21, 23, 26,     # bool, char, int8, int2, int4, oid
+    700, 701,                   # float4, float8
+    1082, 1083, 1114, 1184,     # date, time, timestamp, timestamptz
+    2950,                       # uuid
+}
+
+
+def toastable_columns(relation: Dict[str, Any]) -> List[str]:
+    return [col["name"] for col in relation.get("columns", []) if col["type"] not in _FIXED_WIDTH_TYPES]
+
+
+class ToastCache:
+    """
+    Bounded LRU of the last-known TOAST-able column values per row, keyed by
+    (partition, instance, schema, table, pk). An UPDATE that leaves a large value
+    untouched carries no data for it (pgoutput sends 'u'); the cache fills it back in.
+    Values are only valid while this consumer owns the row's partition, so a
+    partition's rows are dropped when its lease is lost or released.
+    """
+    def __init__(self, maxsize: int = CDC_TOAST_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._rows: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def carry_forward(self, key: Hashable, row: Dict[str, Any]) -> List[str]:
+        """
+        Replaces UNCHANGED_TOAST values in `row` with the cached ones. Returns the
+        columns that are still unchanged markers because nothing is cached for them.
+        """
+        cached = self._rows.get(key)
+        missing = []
+        for col, val in row.items():
+            if val is UNCHANGED_TOAST:
+                if cached is not None and col in cached:
+                    row[col] = cached[col]
+                else:
+                    missing.append(col)
+        if cached is not None:
+            self._rows.move_to_end(key)
+        return missing
+
+    def remember(self, key: Hashable, row: Dict[str, Any], columns: List[str]) -> None:
+        values = {col: row[col] for col in columns if col in row and row[col] is not UNCHANGED_TOAST}
+        if not values:
+            return
+        cached = self._rows.get(key)
+        if cached is not None:
+            cached.update(values)
+            self._rows.move_to_end(key)
+        else:
+            self._rows[key] = values
+            if len(self._rows) > self.maxsize:
+                self._rows.popitem(last=False)
+
+    def evict(self, key: Hashable) -> None:
+        self._rows.pop(key, None)
+
+    def drop_partition(self, partition: Any) -> None:
+        for key in [key for key in self._rows if key[0] == partition]:
+            del self._rows[key]
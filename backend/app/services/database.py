@@ -1,7 +1,59 @@
+import os
+import uuid
+import threading
 import psycopg
-from typing import Dict, Any, Optional, List
+from psycopg_pool import ConnectionPool
+from typing import Dict, Any, Optional, List, Tuple, Iterator
 from app.models.core import DatabaseInstance
 
+# Source database connection pools (one per DSN, shared by every DatabaseClient in the process)
+SOURCE_POOL_MIN_SIZE = int(os.environ.get("SOURCE_POOL_MIN_SIZE", "1"))
+SOURCE_POOL_MAX_SIZE = int(os.environ.get("SOURCE_POOL_MAX_SIZE", "10"))
+# Idle connections above min size are closed after this many seconds
+SOURCE_POOL_MAX_IDLE = float(os.environ.get("SOURCE_POOL_MAX_IDLE", "300"))
+# Connections are recycled after this many seconds regardless of use
+SOURCE_POOL_MAX_LIFETIME = float(os.environ.get("SOURCE_POOL_MAX_LIFETIME", "3600"))
+# Seconds to wait for a free connection before raising PoolTimeout
+SOURCE_POOL_TIMEOUT = float(os.environ.get("SOURCE_POOL_TIMEOUT", "30"))
+
+# Rows per multi-row INSERT/UPDATE statement (keeps bind parameters well under the 65535 limit)
+WRITE_BATCH_ROWS = 1000
+
+_pool_lock = threading.Lock()
+_pools: Dict[str, ConnectionPool] = {}
+
+def get_source_pool(dsn: str) -> ConnectionPool:
+    """
+    Returns the process-wide connection pool for a source DSN, opening it on first use.
+    Connections are health-checked when borrowed, so a server restart or dropped
+    TCP session costs one reconnect instead of a failed query.
+    """
+    with _pool_lock:
+        pool = _pools.get(dsn)
+        if pool is None:
+            info = psycopg.conninfo.conninfo_to_dict(dsn)
+            pool = ConnectionPool(
+                dsn,
+                min_size=SOURCE_POOL_MIN_SIZE,
+                max_size=SOURCE_POOL_MAX_SIZE,
+                max_idle=SOURCE_POOL_MAX_IDLE,
+                max_lifetime=SOURCE_POOL_MAX_LIFETIME,
+                timeout=SOURCE_POOL_TIMEOUT,
+                check=ConnectionPool.check_connection,
+                name=f"source:{info.get('host')}:{info.get('port')}/{info.get('dbname')}",
+                open=True,
+            )
+            _pools[dsn] = pool
+        return pool
+
+def close_source_pools() -> None:
+    """Closes every source pool (worker shutdown, tests)."""
+    with _pool_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
 class DatabaseClient:
     def __init__(self, instance: DatabaseInstance, db_name: str = "postgres"):
         # Prioritize Instance credentials if available
@@ -17,9 +69,15 @@ class DatabaseClient:
         port = instance.port or 5432
         
         self.dsn = f"postgresql://{user}:{password}@{host}:{port}/{target_db}"
+        self._column_type_cache: Dict[Tuple[str, str], Dict[str, str]] = {}
+        self._key_default_cache: Dict[Tuple[str, str, str], Tuple[Optional[str], bool]] = {}
+
+    def _connection(self):
+        """Borrows a pooled connection; commits on clean exit, rolls back on error."""
+        return get_source_pool(self.dsn).connection()
 
     def fetch_row(self, schema: str, table: str, pk_col: str, pk_val: Any) -> Optional[Dict[str, Any]]:
-        with psycopg.connect(self.dsn) as conn:
+        with self._connection() as conn:
             with conn.cursor() as cur:
                 query = f"SELECT * FROM {schema}.{table} WHERE {pk_col} = %s"
                 cur.execute(query, (pk_val,))
@@ -46,7 +104,7 @@ class DatabaseClient:
         
         query = f"INSERT INTO {schema}.{table} ({col_str}) VALUES ({val_str}) RETURNING *"
         
-        with psycopg.connect(self.dsn) as conn:
+        with self._connection() as conn:
             with conn.cursor() as cur:
                 cur.execute(query, list(data.values()))
                 # Return the full inserted row (including defaults/IDs generated)
@@ -68,7 +126,7 @@ class DatabaseClient:
         query = f"UPDATE {schema}.{table} SET {set_str} WHERE {pk_col} = %s RETURNING *"
         values = list(data.values()) + [pk_val]
         
-        with psycopg.connect(self.dsn) as conn:
+        with self._connection() as conn:
             with conn.cursor() as cur:
                 cur.execute(query, values)
                 if cur.description:
@@ -81,7 +139,7 @@ class DatabaseClient:
 
     def delete_row(self, schema: str, table: str, pk_col: str, pk_val: Any) -> bool:
         query = f"DELETE FROM {schema}.{table} WHERE {pk_col} = %s"
-        with psycopg.connect(self.dsn) as conn:
+        with self._connection() as conn:
             with conn.cursor() as cur:
                 cur.execute(query, (pk_val,))
                 return cur.rowcount > 0
@@ -98,7 +156,7 @@ class DatabaseClient:
         print(f"[DEBUG] DatabaseClient SQL: {query}")
         print(f"[DEBUG] DatabaseClient Params: {params}")
 
-        with psycopg.connect(self.dsn) as conn:
+        with self._connection() as conn:
             with conn.cursor() as cur:
                 cur.execute(query, params)
                 
@@ -110,11 +168,220 @@ class DatabaseClient:
                 
                 return [dict(zip(col_names, row)) for row in rows]
 
+    def iter_changed_rows(self, schema: str, table: str, cursor_col: str, pk_col: str, after: Optional[Tuple[Any, Any]] = None, chunk_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Streams every row after a keyset position, ordered by (cursor_col, pk_col),
+        as lists of up to chunk_size dicts. Reads through a server-side named cursor,
+        so memory stays flat however large the table is.
+
+        `after` is the (cursor_val, pk_val) of the last row already handled. Paging on
+        the pair means rows sharing a cursor_col value are never skipped at a page
+        boundary. A pk_val of None resumes at cursor_val inclusively, for watermarks
+        that only recorded a timestamp.
+        """
+        where_clause = ""
+        params = []
+        if after is not None:
+            cursor_val, pk_val = after
+            if pk_val is None:
+                where_clause = f"WHERE {cursor_col} >= %s"
+                params = [cursor_val]
+            else:
+                where_clause = f"WHERE ({cursor_col}, {pk_col}) > (%s, %s)"
+                params = [cursor_val, pk_val]
+
+        query = f"SELECT * FROM {schema}.{table} {where_clause} ORDER BY {cursor_col} ASC, {pk_col} ASC"
+        print(f"[DEBUG] DatabaseClient SQL: {query}")
+        print(f"[DEBUG] DatabaseClient Params: {params}")
+
+        with self._connection() as conn:
+            with conn.cursor(name=f"arcore_changed_rows_{uuid.uuid4().hex}") as cur:
+                cur.itersize = chunk_size
+                cur.execute(query, params)
+                col_names = None
+                while True:
+                    rows = cur.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    if col_names is None:
+                        col_names = [desc[0] for desc in cur.description]
+                    yield [dict(zip(col_names, row)) for row in rows]
+
+    def _column_types(self, conn, schema: str, table: str) -> Dict[str, str]:
+        """Column name -> SQL type (e.g. 'integer', 'numeric(10,2)') for casting VALUES lists."""
+        key = (schema, table)
+        types = self._column_type_cache.get(key)
+        if types is None:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT attname, format_type(atttypid, atttypmod) FROM pg_attribute "
+                    "WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped",
+                    (f"{schema}.{table}",)
+                )
+                types = dict(cur.fetchall())
+            self._column_type_cache[key] = types
+        return types
+
+    def _column_type(self, types: Dict[str, str], schema: str, table: str, col: str) -> str:
+        if col not in types:
+            raise ValueError(f"Column '{col}' not found on {schema}.{table}")
+        return types[col]
+
+    def _key_default(self, conn, schema: str, table: str, pk_col: str) -> Tuple[Optional[str], bool]:
+        """
+        SQL expression that generates a new key value (the column default, or nextval
+        of an identity column's sequence) and whether the key is GENERATED ALWAYS.
+        """
+        key = (schema, table, pk_col)
+        cached = self._key_default_cache.get(key)
+        if cached is None:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT pg_get_expr(d.adbin, d.adrelid), a.attidentity FROM pg_attribute a "
+                    "LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum "
+                    "WHERE a.attrelid = %s::regclass AND a.attname = %s",
+                    (f"{schema}.{table}", pk_col)
+                )
+                row = cur.fetchone()
+            expr, identity = (row[0], row[1]) if row else (None, "")
+            if identity:
+                expr = f"nextval(pg_get_serial_sequence('{schema}.{table}', '{pk_col}'))"
+            cached = (expr, identity == "a")
+            self._key_default_cache[key] = cached
+        return cached
+
+    def fetch_rows(self, schema: str, table: str, pk_col: str, pk_vals: List[Any]) -> Dict[str, Dict[str, Any]]:
+        """Fetches many rows with one `pk = ANY(...)` query. Result is keyed by str(pk)."""
+        if not pk_vals:
+            return {}
+
+        with self._connection() as conn:
+            pk_type = self._column_type(self._column_types(conn, schema, table), schema, table, pk_col)
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT * FROM {schema}.{table} WHERE {pk_col} = ANY(%s::{pk_type}[])", (list(pk_vals),))
+                if cur.description is None:
+                    return {}
+                col_names = [desc[0] for desc in cur.description]
+                rows = [dict(zip(col_names, row)) for row in cur.fetchall()]
+                return {str(row.get(pk_col)): row for row in rows}
+
+    def write_batch(self, schema: str, table: str, pk_col: str, inserts: Optional[List[Dict[str, Any]]] = None, updates: Optional[List[Tuple[Any, Dict[str, Any]]]] = None, deletes: Optional[List[Any]] = None) -> Dict[str, Any]:
+        """
+        Applies a page of changes in one transaction with set-based statements:
+        INSERT ... SELECT and UPDATE ... FROM (VALUES ...) per set of columns, and
+        a single DELETE ... WHERE pk = ANY(...). Inserts without a key get one
+        generated up front from the key column's default.
+
+        Returns:
+            inserted: the inserted row (or None) for each dict in `inserts`, in order
+            updated: updated rows keyed by str(pk)
+            deleted: number of rows deleted
+        """
+        inserts = inserts or []
+        updates = updates or []
+        deletes = deletes or []
+        result = {"inserted": [None] * len(inserts), "updated": {}, "deleted": 0}
+        if not (inserts or updates or deletes):
+            return result
+
+        with self._connection() as conn:
+            types = self._column_types(conn, schema, table)
+            with conn.cursor() as cur:
+                # INSERT: one statement per distinct column set
+                insert_groups: Dict[Tuple[str, ...], List[int]] = {}
+                for i, data in enumerate(inserts):
+                    insert_groups.setdefault(tuple(data.keys()), []).append(i)
+
+                for cols, indexes in insert_groups.items():
+                    if not cols:
+                        continue
+                    # RETURNING order is not guaranteed, so every row carries its ordinal
+                    # and the inserted rows are joined back to it on the key
+                    generate_key = pk_col not in cols
+                    overriding = ""
+                    if generate_key:
+                        key_expr, always = self._key_default(conn, schema, table, pk_col)
+                        if not key_expr:
+                            raise ValueError(f"Inserts into {schema}.{table} need '{pk_col}': it has no default")
+                        overriding = " OVERRIDING SYSTEM VALUE" if always else ""
+                    insert_cols = list(cols) + ([pk_col] if generate_key else [])
+                    casts = ["integer"] + [self._column_type(types, schema, table, col) for col in insert_cols]
+                    row_sql = "(" + ", ".join(f"%s::{t}" for t in casts) + ")"
+                    col_str = ", ".join(insert_cols)
+                    alias_str = ", ".join(["_arcore_ord"] + insert_cols)
+                    for start in range(0, len(indexes), WRITE_BATCH_ROWS):
+                        chunk = indexes[start:start + WRITE_BATCH_ROWS]
+                        keys = []
+                        if generate_key:
+                            cur.execute(f"SELECT {key_expr} FROM generate_series(1, %s)", (len(chunk),))
+                            keys = [row[0] for row in cur.fetchall()]
+                        query = (
+                            f"WITH v({alias_str}) AS (VALUES {', '.join([row_sql] * len(chunk))}), "
+                            f"ins AS (INSERT INTO {schema}.{table} ({col_str}){overriding} SELECT {col_str} FROM v RETURNING *) "
+                            f"SELECT v._arcore_ord, ins.* FROM ins JOIN v ON ins.{pk_col} = v.{pk_col}"
+                        )
+                        params = [
+                            value
+                            for ordinal, i in enumerate(chunk)
+                            for value in [ordinal] + [inserts[i][col] for col in cols] + ([keys[ordinal]] if generate_key else [])
+                        ]
+                        cur.execute(query, params)
+                        col_names = [desc[0] for desc in cur.description][1:]
+                        rows = cur.fetchall()
+                        if len(rows) != len(chunk):
+                            raise RuntimeError(f"INSERT into {schema}.{table} returned {len(rows)} rows for {len(chunk)}")
+                        for row in rows:
+                            result["inserted"][chunk[row[0]]] = dict(zip(col_names, row[1:]))
+
+                # UPDATE: changes to one key are merged (later values win), one statement per distinct column set
+                latest: Dict[str, Tuple[Any, Dict[str, Any]]] = {}
+                for pk_val, data in updates:
+                    if data:
+                        latest.setdefault(str(pk_val), (pk_val, {}))[1].update(data)
+
+                update_groups: Dict[Tuple[str, ...], List[Tuple[Any, Dict[str, Any]]]] = {}
+                for pk_val, data in latest.values():
+                    update_groups.setdefault(tuple(data.keys()), []).append((pk_val, data))
+
+                for cols, items in update_groups.items():
+                    # VALUES columns are untyped text, so cast each one to the target column type
+                    casts = [self._column_type(types, schema, table, pk_col)] + [self._column_type(types, schema, table, col) for col in cols]
+                    row_sql = "(" + ", ".join(f"%s::{t}" for t in casts) + ")"
+                    set_str = ", ".join(f"{col} = v.{col}" for col in cols)
+                    # The key travels under its own alias, so the key column itself may also be updated
+                    alias_str = ", ".join(["_arcore_pk"] + list(cols))
+                    for start in range(0, len(items), WRITE_BATCH_ROWS):
+                        chunk = items[start:start + WRITE_BATCH_ROWS]
+                        query = (
+                            f"UPDATE {schema}.{table} AS t SET {set_str} "
+                            f"FROM (VALUES {', '.join([row_sql] * len(chunk))}) AS v({alias_str}) "
+                            f"WHERE t.{pk_col} = v._arcore_pk RETURNING v._arcore_pk, t.*"
+                        )
+                        params = [value for pk_val, data in chunk for value in [pk_val] + [data[col] for col in cols]]
+                        cur.execute(query, params)
+                        col_names = [desc[0] for desc in cur.description][1:]
+                        for row in cur.fetchall():
+                            result["updated"][str(row[0])] = dict(zip(col_names, row[1:]))
+
+                # DELETE
+                if deletes:
+                    pk_type = self._column_type(types, schema, table, pk_col)
+                    cur.execute(f"DELETE FROM {schema}.{table} WHERE {pk_col} = ANY(%s::{pk_type}[])", (list(deletes),))
+                    result["deleted"] = cur.rowcount
+
+        return result
+
     def execute_raw(self, query: str, params: Optional[tuple] = None, autocommit: bool = False) -> List[tuple]:
         """Executes a raw query and returns all rows as tuples."""
-        with psycopg.connect(self.dsn, autocommit=autocommit) as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                if cur.description:
-                    return cur.fetchall()
-                return []
+        with self._connection() as conn:
+            # Statements such as pg_create_logical_replication_slot cannot run inside a transaction
+            conn.autocommit = autocommit
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(query, params)
+                    if cur.description:
+                        return cur.fetchall()
+                    return []
+            finally:
+                if autocommit:
+                    conn.autocommit = False
@@ -6,7 +6,7 @@ from sqlalchemy import select
 
 from app.models.core import SyncDefinition, SyncLedgerEntry, SyncTarget, SharePointConnection
 from app.services.sharepoint_content import SharePointContentService
-from app.services.graph import GraphClient
+from app.services.graph import shared_graph_client
 from app.schemas.ops import DriftReportResponse, DriftItem
 import os
 
@@ -40,7 +40,7 @@ class DriftService:
             real_secret = os.environ.get("AZURE_CLIENT_SECRET", "")
             site_id = target.site_id or os.environ.get("SHAREPOINT_SITE_ID", "")
             
-            graph = GraphClient(
+            graph = shared_graph_client(
                 tenant_id=conn.tenant_id,
                 client_id=conn.client_id,
                 client_secret=real_secret, 
@@ -1,44 +1,151 @@
+import os
 import time
+import asyncio
+import threading
+import httpx
 import requests
 import msal
-from typing import Optional, Tuple, Dict, Any
+from requests.adapters import HTTPAdapter
+from typing import Optional, Tuple, Dict, Any, List
+from app.services.throttle import TenantThrottle, get_tenant_throttle
+
+# Graph JSON batching accepts at most 20 sub-requests per $batch call
+MAX_BATCH_SIZE = 20
+
+# Connection pooling: number of per-host pools kept, and connections kept per host
+GRAPH_POOL_CONNECTIONS = int(os.environ.get("GRAPH_POOL_CONNECTIONS", "10"))
+GRAPH_POOL_MAXSIZE = int(os.environ.get("GRAPH_POOL_MAXSIZE", "32"))
+
+# Attempts per Graph call before giving up on throttling (429/503)
+GRAPH_MAX_RETRIES = int(os.environ.get("GRAPH_MAX_RETRIES", "5"))
+
+# Seconds before expiry at which a cached access token is refreshed
+TOKEN_REFRESH_MARGIN = 300
+
+_session_lock = threading.Lock()
+_shared_session: Optional[requests.Session] = None
+
+_client_lock = threading.Lock()
+_clients: Dict[Tuple[str, str, str], "GraphClient"] = {}
+
+def build_session(pool_connections: int = GRAPH_POOL_CONNECTIONS, pool_maxsize: int = GRAPH_POOL_MAXSIZE) -> requests.Session:
+    """
+    Builds a keep-alive session with bounded per-host connection pools.
+    Retries are left to GraphClient so throttling is handled in one place.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "Accept-Encoding": "gzip, deflate",  # requests decodes compressed bodies transparently
+        "Connection": "keep-alive",
+    })
+    return session
+
+def get_shared_session() -> requests.Session:
+    """
+    Returns the process-wide Graph session so every GraphClient (push, ingress,
+    discovery, provisioning) reuses the same TCP/TLS connections.
+    """
+    global _shared_session
+    if _shared_session is None:
+        with _session_lock:
+            if _shared_session is None:
+                _shared_session = build_session()
+    return _shared_session
+
+def parse_retry_after(headers) -> Optional[float]:
+    """Retry-After in seconds, or None when absent or given as an HTTP date."""
+    value = (headers or {}).get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def shared_graph_client(tenant_id: str, client_id: str, client_secret: str, authority_host: str = "https://login.microsoftonline.com") -> "GraphClient":
+    """
+    Returns the process-wide GraphClient for (tenant, client_id, authority).
+    Reusing the client keeps its MSAL app and access token, so a token is
+    acquired about once an hour instead of once per run, request or event.
+    A rotated secret replaces the cached client.
+    """
+    key = (tenant_id, client_id, authority_host)
+    with _client_lock:
+        client = _clients.get(key)
+        if client is None or client.client_secret != client_secret:
+            client = GraphClient(tenant_id, client_id, client_secret, authority_host)
+            _clients[key] = client
+        return client
+
+def clear_graph_clients(tenant_id: Optional[str] = None, client_id: Optional[str] = None) -> None:
+    """
+    Drops the cached GraphClients of one tenant/app (e.g. after its connection is
+    updated or deleted), or every cached client when called without arguments.
+    """
+    with _client_lock:
+        if tenant_id is None and client_id is None:
+            _clients.clear()
+            return
+        for key in [k for k in _clients if (tenant_id is None or k[0] == tenant_id) and (client_id is None or k[1] == client_id)]:
+            del _clients[key]
 
 class GraphClient:
-    def __init__(self, tenant_id: str, client_id: str, client_secret: str, authority_host: str = "https://login.microsoftonline.com"):
+    def __init__(self, tenant_id: str, client_id: str, client_secret: str, authority_host: str = "https://login.microsoftonline.com", session: Optional[requests.Session] = None, throttle: Optional[TenantThrottle] = None):
         self.tenant_id = tenant_id
         self.client_id = client_id
         self.client_secret = client_secret
         self.authority = f"{authority_host}/{tenant_id}"
         self.scopes = ["https://graph.microsoft.com/.default"]
+        self.session = session or get_shared_session()
+        self.throttle = throttle or get_tenant_throttle(tenant_id)
         
         self._app = msal.ConfidentialClientApplication(
             client_id=client_id,
             authority=self.authority,
             client_credential=client_secret,
+            http_client=self.session,
         )
         self._token_cache: Optional[Tuple[str, float]] = None
+        self._token_lock = threading.Lock()
 
-    def _get_access_token(self) -> str:
-        # Check in-memory cache
+    def _cached_token(self) -> Optional[str]:
         if self._token_cache:
             token, exp = self._token_cache
-            # Buffer of 60 seconds
-            if time.time() < (exp - 60):
+            # Refresh 5 minutes before expiry so in-flight calls never carry a stale token
+            if time.time() < (exp - TOKEN_REFRESH_MARGIN):
                 return token
+        return None
 
-        # Acquire new token
-        result = self._app.acquire_token_for_client(scopes=self.scopes)
-        if "access_token" not in result:
-            error_desc = result.get('error_description') or result.get('error') or str(result)
-            raise RuntimeError(f"Graph token acquisition failed: {error_desc}")
-            
-        token = result["access_token"]
-        # MSAL usually returns 'expires_in' (seconds)
-        exp = time.time() + int(result.get("expires_in", 3599))
-        self._token_cache = (token, exp)
-        return token
+    def _get_access_token(self) -> str:
+        # Check in-memory cache
+        token = self._cached_token()
+        if token:
+            return token
 
-    def request(self, method: str, path: str, params: Optional[Dict] = None, json_body: Optional[Dict] = None) -> Any:
+        # Only one thread acquires; the others wait and reuse its token
+        with self._token_lock:
+            token = self._cached_token()
+            if token:
+                return token
+
+            # Acquire new token
+            result = self._app.acquire_token_for_client(scopes=self.scopes)
+            if "access_token" not in result:
+                error_desc = result.get('error_description') or result.get('error') or str(result)
+                raise RuntimeError(f"Graph token acquisition failed: {error_desc}")
+                
+            token = result["access_token"]
+            # MSAL usually returns 'expires_in' (seconds)
+            exp = time.time() + int(result.get("expires_in", 3599))
+            self._token_cache = (token, exp)
+            return token
+
+    def request(self, method: str, path: str, params: Optional[Dict] = None, json_body: Optional[Dict] = None, cost: int = 1) -> Any:
+        """
+        Sends one Graph request. Every attempt first takes `cost` slots from the
+        tenant's shared rate controller; 429/503 slow the whole tenant down.
+        """
         url = f"https://graph.microsoft.com/v1.0{path}"
         token = self._get_access_token()
         headers = {
@@ -50,10 +157,11 @@ class GraphClient:
         if json_body:
             print(f"[DEBUG] Request Body: {json_body}")
 
-        # Basic retry logic for throttling (429) or temporary server errors (503)
-        max_retries = 3
+        # Retry throttling (429) or temporary server errors (503) with jittered backoff
+        max_retries = GRAPH_MAX_RETRIES
         for attempt in range(max_retries):
-            resp = requests.request(
+            self.throttle.acquire(cost)
+            resp = self.session.request(
                 method=method,
                 url=url,
                 headers=headers,
@@ -67,8 +175,9 @@ class GraphClient:
                 print(f"[DEBUG] Error Response: {resp.text}")
 
             if resp.status_code in (429, 503):
-                retry_after = int(resp.headers.get("Retry-After", 5))
-                time.sleep(min(retry_after, 30))
+                retry_after = parse_retry_after(resp.headers)
+                self.throttle.on_throttled(retry_after)
+                time.sleep(self.throttle.backoff_delay(attempt, retry_after))
                 continue
 
             if resp.status_code == 403:
@@ -80,8 +189,119 @@ class GraphClient:
 
             if resp.status_code >= 400:
                 raise RuntimeError(f"Graph {method} {path} failed [{resp.status_code}]: {resp.text}")
-            
+
+            self.throttle.on_success()
             # Return JSON if content exists, else empty dict
             return resp.json() if resp.content else {}
             
         raise RuntimeError(f"Graph request failed after {max_retries} retries: {method} {path}")
+
+    def batch(self, sub_requests: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Sends up to MAX_BATCH_SIZE sub-requests in a single JSON $batch call.
+        Each sub-request is {"id", "method", "url", optional "body"} with url relative to /v1.0.
+        Throttled sub-requests (429/503) are retried on their own, honouring Retry-After.
+        Returns sub-responses keyed by sub-request id: {"id", "status", "headers", "body"}.
+        """
+        if len(sub_requests) > MAX_BATCH_SIZE:
+            raise ValueError(f"Graph $batch supports at most {MAX_BATCH_SIZE} requests, got {len(sub_requests)}")
+
+        pending = {}
+        for sub in sub_requests:
+            entry = {"id": str(sub["id"]), "method": sub["method"], "url": sub["url"]}
+            if sub.get("body") is not None:
+                entry["body"] = sub["body"]
+                entry["headers"] = {"Content-Type": "application/json"}
+            pending[entry["id"]] = entry
+
+        results: Dict[str, Dict[str, Any]] = {}
+        max_retries = GRAPH_MAX_RETRIES
+        for attempt in range(max_retries):
+            # Graph meters each sub-request, so the batch costs one slot per request
+            response = self.request("POST", "/$batch", json_body={"requests": list(pending.values())}, cost=len(pending))
+
+            retry_after = None
+            throttled = False
+            for sub in response.get("responses", []):
+                sub_id = str(sub.get("id"))
+                status = int(sub.get("status", 0))
+                if status in (429, 503) and attempt < max_retries - 1:
+                    throttled = True
+                    sub_retry_after = parse_retry_after(sub.get("headers"))
+                    if sub_retry_after is not None:
+                        retry_after = max(retry_after or 0, sub_retry_after)
+                    continue
+                results[sub_id] = sub
+                pending.pop(sub_id, None)
+
+            if not pending:
+                break
+            if throttled:
+                self.throttle.on_throttled(retry_after)
+            time.sleep(self.throttle.backoff_delay(attempt, retry_after))
+
+        # Anything Graph never answered is reported as a failure rather than dropped
+        for sub_id in pending:
+            results.setdefault(sub_id, {"id": sub_id, "status": 0, "body": {"error": {"message": "No response in $batch"}}})
+
+        return results
+
+
+class AsyncGraphClient:
+    """
+    asyncio counterpart of GraphClient.request with the same retry and 403 semantics.
+    Tokens and the tenant rate controller come from the wrapped GraphClient; the
+    controller talks to Redis synchronously, so it is called from a worker thread.
+    """
+    def __init__(self, graph_client: GraphClient, http_client: httpx.AsyncClient):
+        self.graph = graph_client
+        self.http = http_client
+
+    async def request(self, method: str, path: str, params: Optional[Dict] = None, json_body: Optional[Dict] = None, cost: int = 1) -> Any:
+        url = f"https://graph.microsoft.com/v1.0{path}"
+        # Token refresh can block on MSAL's HTTP call; keep it off the event loop
+        token = self.graph._cached_token() or await asyncio.to_thread(self.graph._get_access_token)
+        headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        }
+
+        # Retry throttling (429) or temporary server errors (503) with jittered backoff
+        throttle = self.graph.throttle
+        max_retries = GRAPH_MAX_RETRIES
+        for attempt in range(max_retries):
+            wait = await asyncio.to_thread(throttle.reserve, cost)
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = await asyncio.to_thread(throttle.reserve, cost)
+
+            resp = await self.http.request(
+                method=method,
+                url=url,
+                headers=headers,
+                params=params,
+                json=json_body,
+                timeout=30
+            )
+
+            if resp.status_code in (429, 503):
+                retry_after = parse_retry_after(resp.headers)
+                await asyncio.to_thread(throttle.on_throttled, retry_after)
+                await asyncio.sleep(throttle.backoff_delay(attempt, retry_after))
+                continue
+
+            if resp.status_code == 403:
+                raise RuntimeError(
+                    f"Graph {method} {path} failed [403] - Access Denied. "
+                    "Ensure the App Registration has 'Sites.ReadWrite.All' (Application) permission "
+                    "and Admin Consent is granted. See docs/guides/admin/sharepoint_setup.md."
+                )
+
+            if resp.status_code >= 400:
+                raise RuntimeError(f"Graph {method} {path} failed [{resp.status_code}]: {resp.text}")
+
+            await asyncio.to_thread(throttle.on_success)
+            # Return JSON if content exists, else empty dict
+            return resp.json() if resp.content else {}
+
+        raise RuntimeError(f"Graph request failed after {max_retries} retries: {method} {path}")
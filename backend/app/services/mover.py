@@ -1,4 +1,4 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Tuple
 from uuid import UUID
 import logging
 from app.services.sharepoint_content import SharePointContentService
@@ -95,3 +95,81 @@ class MoveManager:
             logger.error(f"Failed to write audit log for move: {e}")
 
         return True
+
+    def move_items(
+        self,
+        site_id: str,
+        moves: List[Tuple[SyncLedgerEntry, Dict[str, Any]]],
+        new_list_id: str
+    ) -> List[bool]:
+        """
+        Batched variant of move_item for many entries moving to the same list.
+        Same Copy (Create) -> Update Ledger -> Delete Old strategy, but creates and
+        deletes are dispatched through Graph $batch calls.
+
+        Args:
+            site_id: The SharePoint Site ID.
+            moves: List of (entry, item_data) pairs.
+            new_list_id: The SharePoint List ID (GUID string) to move to.
+
+        Returns:
+            One bool per input pair, in input order (same meaning as move_item).
+        """
+        outcomes = [True] * len(moves)
+        to_move = [i for i, (entry, _) in enumerate(moves) if entry.sp_list_id != new_list_id]
+        if not to_move:
+            return outcomes
+
+        logger.info(f"Moving {len(to_move)} items to {new_list_id}")
+
+        # 1. Create in New Location
+        create_results = self.content.create_items(site_id, new_list_id, [moves[i][1] for i in to_move])
+
+        deletes = []  # (index, old_list_id, old_item_id)
+        for i, result in zip(to_move, create_results):
+            entry = moves[i][0]
+            if not result["success"] or not result["id"]:
+                logger.error(f"Failed to create item {entry.source_identity_hash} in new list {new_list_id}: {result['error']}")
+                outcomes[i] = False
+                continue
+
+            old_list_id = entry.sp_list_id
+            old_item_id = str(entry.sp_item_id)
+
+            # 2. Update Ledger
+            entry.sp_list_id = new_list_id
+            entry.sp_item_id = int(result["id"])
+            try:
+                self.ledger.record_entry(entry)
+            except Exception as e:
+                logger.critical(f"Failed to update ledger after creating item {result['id']} in {new_list_id}. Data duplication risk! Error: {e}")
+                outcomes[i] = False
+                continue
+
+            deletes.append((i, old_list_id, old_item_id))
+
+        # 3. Delete from Old Location (grouped per source list)
+        by_list: Dict[str, List[Tuple[int, str]]] = {}
+        for i, old_list_id, old_item_id in deletes:
+            by_list.setdefault(old_list_id, []).append((i, old_item_id))
+
+        for old_list_id, items in by_list.items():
+            delete_results = self.content.delete_items(site_id, old_list_id, [item_id for _, item_id in items])
+            for (i, old_item_id), result in zip(items, delete_results):
+                if not result["success"]:
+                    logger.warning(f"Failed to delete old item {old_item_id} from {old_list_id} after move. Orphan created. Error: {result['error']}")
+
+                # 4. Audit Log
+                entry = moves[i][0]
+                try:
+                    self.ledger.log_move(
+                        source_identity_hash=entry.source_identity_hash,
+                        from_list_id=old_list_id,
+                        to_list_id=new_list_id,
+                        status="SUCCESS",
+                        details=f"Moved item {old_item_id} to {entry.sp_item_id}"
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to write audit log for move: {e}")
+
+        return outcomes
@@ -1,151 +1,454 @@
+import json
 import struct
-from typing import Optional, Dict, Any, Tuple
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from typing import Optional, Dict, Any, Callable, List, Tuple
+from uuid import UUID, SafeUUID
 
 # Basic PgOutput Parser
 # Protocol: https://www.postgresql.org/docs/current/protocol-logicalrep-message-formats.html
+#
+# Messages are read in place: fixed-width fields with precompiled Struct.unpack_from
+# at an offset into the payload, column values decoded straight from a memoryview.
+# Nothing is sliced off the payload except the final str of each value.
+
+_INT16 = struct.Struct('>h')
+_INT32 = struct.Struct('>i')
+_unpack_int16 = _INT16.unpack_from
+_unpack_int32 = _INT32.unpack_from
+# BEGIN: Int64(final LSN), Int64(commit timestamp), Int32(xid)
+_unpack_begin = struct.Struct('>qqi').unpack_from
+# COMMIT: Int8(flags), Int64(commit LSN), Int64(end LSN), Int64(commit timestamp)
+_unpack_commit = struct.Struct('>bqqq').unpack_from
+# Protocol v2 streaming of in-progress transactions
+# STREAM START: Int32(xid), Int8(first segment)
+_unpack_stream_start = struct.Struct('>ib').unpack_from
+# STREAM COMMIT: Int32(xid), Int8(flags), Int64(commit LSN), Int64(end LSN), Int64(commit timestamp)
+_unpack_stream_commit = struct.Struct('>ibqqq').unpack_from
+# STREAM ABORT: Int32(xid), Int32(subtransaction xid)
+_unpack_stream_abort = struct.Struct('>ii').unpack_from
+
+# Message and tuple-data type bytes
+_RELATION, _INSERT, _UPDATE, _DELETE, _BEGIN, _COMMIT = b'RIUDBC'
+_STREAM_START, _STREAM_STOP, _STREAM_COMMIT, _STREAM_ABORT = b'SEcA'
+_TEXT, _BINARY, _NULL, _UNCHANGED = b'tbnu'
+_OLD_KEY, _OLD_ROW = b'KO'
+
+
+class _UnchangedToast:
+    """Value of a column sent as 'u': an unchanged TOASTed value the WAL record does not carry."""
+    __slots__ = ()
+
+    def __repr__(self):
+        return "UNCHANGED_TOAST"
+
+UNCHANGED_TOAST = _UnchangedToast()
+
+
+def strip_stream_xid(payload: bytes) -> bytes:
+    """A message from inside a stream block in its non-streamed layout, without the leading Int32 xid."""
+    return payload[:1] + payload[5:]
+
+
+def _parse_bool(text: str) -> bool:
+    return text == "t"
+
+def _parse_bytea(text: str) -> bytes:
+    # Hex output format (bytea_output = 'hex', the default)
+    if text.startswith("\\x"):
+        return bytes.fromhex(text[2:])
+    raise ValueError("bytea escape format is not supported")
+
+def _parse_array(element: Callable[[str], Any]) -> Callable[[str], list]:
+    """Parser for the text form of an array, e.g. {1,2,NULL} or {"a b","c\\"d"}."""
+    def parse(text: str) -> list:
+        # Arrays with non-default bounds are prefixed with their dimensions: [0:2]={...}
+        if text.startswith("["):
+            text = text[text.index("=") + 1:]
+        value, end = _parse_array_level(text, 0, element)
+        return value
+    return parse
+
+def _parse_array_level(text: str, pos: int, element: Callable[[str], Any]) -> Tuple[list, int]:
+    # text[pos] == "{"
+    items = []
+    pos += 1
+    while pos < len(text):
+        ch = text[pos]
+        if ch == "}":
+            return items, pos + 1
+        if ch == ",":
+            pos += 1
+        elif ch == "{":
+            sub, pos = _parse_array_level(text, pos, element)
+            items.append(sub)
+        elif ch == '"':
+            chars = []
+            pos += 1
+            while text[pos] != '"':
+                if text[pos] == "\\":
+                    pos += 1
+                chars.append(text[pos])
+                pos += 1
+            items.append(element("".join(chars)))
+            pos += 1
+        else:
+            end = pos
+            while text[end] not in ",}":
+                end += 1
+            raw = text[pos:end]
+            items.append(None if raw == "NULL" else element(raw))
+            pos = end
+    raise ValueError("Unterminated array literal")
+
+
+# Text-format output -> the Python value psycopg returns for the same type, so rows
+# decoded from the WAL compare and hash like rows read by Pusher. Types without an
+# entry stay as strings.
+_SCALAR_CONVERTERS: Dict[int, Callable[[str], Any]] = {
+    16: _parse_bool,                # bool
+    17: _parse_bytea,               # bytea
+    20: int, 21: int, 23: int,      # int8, int2, int4
+    26: int,                        # oid
+    114: json.loads,                # json
+    700: float, 701: float,         # float4, float8
+    1082: date.fromisoformat,       # date
+    1083: time.fromisoformat,       # time
+    1114: datetime.fromisoformat,   # timestamp
+    1184: datetime.fromisoformat,   # timestamptz
+    1700: Decimal,                  # numeric
+    2950: UUID,                     # uuid
+    3802: json.loads,               # jsonb
+}
+
+# Array type OID -> element type OID (text-like elements have no converter)
+_ARRAY_ELEMENTS = {
+    199: 114, 1000: 16, 1001: 17, 1005: 21, 1007: 23, 1016: 20, 1028: 26,
+    1009: 25, 1014: 1042, 1015: 1043,
+    1021: 700, 1022: 701, 1182: 1082, 1183: 1083, 1115: 1114, 1185: 1184,
+    1231: 1700, 2951: 2950, 3807: 3802,
+}
+
+TYPE_CONVERTERS: Dict[int, Callable[[str], Any]] = dict(_SCALAR_CONVERTERS)
+for _array_oid, _element_oid in _ARRAY_ELEMENTS.items():
+    TYPE_CONVERTERS[_array_oid] = _parse_array(_SCALAR_CONVERTERS.get(_element_oid, str))
+
+
+# Binary format (pgoutput `binary true`): each type's send() output. Values decode
+# straight from the memoryview into the same Python values as TYPE_CONVERTERS.
+_unpack_int8 = struct.Struct('>q').unpack_from
+# numeric: Int16(ndigits), Int16(weight), UInt16(sign), Int16(dscale), then base-10000 digits
+_unpack_numeric = struct.Struct('>hhHh').unpack_from
+# array: Int32(ndim), Int32(has nulls), Int32(element OID), then Int32(size), Int32(lower bound) per dimension
+_unpack_array = struct.Struct('>iii').unpack_from
+_unpack_dimension = struct.Struct('>ii').unpack_from
+
+_NUMERIC_NEG, _NUMERIC_NAN, _NUMERIC_PINF, _NUMERIC_NINF = 0x4000, 0xC000, 0xD000, 0xF000
+# Unpackers for the base-10000 digits, by digit count
+_NUMERIC_DIGITS: Dict[int, Callable[[memoryview, int], Tuple[int, ...]]] = {}
+_NUMERIC_SPECIAL = {_NUMERIC_NAN: Decimal("NaN"), _NUMERIC_PINF: Decimal("Infinity"), _NUMERIC_NINF: Decimal("-Infinity")}
+# date and timestamps count from 2000-01-01; the extremes of the range encode +/-infinity
+_PG_EPOCH_DATE = date(2000, 1, 1)
+_PG_EPOCH = datetime(2000, 1, 1)
+_PG_EPOCH_TZ = datetime(2000, 1, 1, tzinfo=timezone.utc)
+_INT32_MAX, _INT32_MIN = 2 ** 31 - 1, -2 ** 31
+_INT64_MAX, _INT64_MIN = 2 ** 63 - 1, -2 ** 63
+_new_object = object.__new__
+_set_attribute = object.__setattr__
+
+
+def _recv_numeric(data: memoryview) -> Decimal:
+    ndigits, weight, sign, dscale = _unpack_numeric(data, 0)
+    if sign in _NUMERIC_SPECIAL:
+        return _NUMERIC_SPECIAL[sign]
+    digits = _NUMERIC_DIGITS.get(ndigits)
+    if digits is None:
+        digits = _NUMERIC_DIGITS[ndigits] = struct.Struct(f'>{ndigits}h').unpack_from
+    value = 0
+    for group in digits(data, 8):
+        value = value * 10000 + group
+    # Rescale to exactly dscale decimal places, so the Decimal matches Decimal(text)
+    shift = (weight - ndigits + 1) * 4 + dscale
+    value = value * 10 ** shift if shift >= 0 else value // 10 ** -shift
+    return Decimal(f"{'-' if sign == _NUMERIC_NEG else ''}{value}E-{dscale}")
+
+def _recv_date(data: memoryview) -> Any:
+    days, = _unpack_int32(data, 0)
+    if days in (_INT32_MAX, _INT32_MIN):
+        return "infinity" if days > 0 else "-infinity"
+    return _PG_EPOCH_DATE + timedelta(days=days)
+
+def _recv_time(data: memoryview) -> time:
+    micros, = _unpack_int8(data, 0)
+    seconds, micros = divmod(micros, 1_000_000)
+    minutes, seconds = divmod(seconds, 60)
+    return time(minutes // 60, minutes % 60, seconds, micros)
+
+def _recv_timestamp(epoch: datetime) -> Callable[[memoryview], Any]:
+    def recv(data: memoryview) -> Any:
+        micros, = _unpack_int8(data, 0)
+        if micros in (_INT64_MAX, _INT64_MIN):
+            return "infinity" if micros > 0 else "-infinity"
+        return epoch + timedelta(0, 0, micros)
+    return recv
+
+def _recv_uuid(data: memoryview) -> UUID:
+    # UUID(bytes=...) validates in Python; build it from the int directly
+    value = _new_object(UUID)
+    _set_attribute(value, "int", int.from_bytes(data, "big"))
+    _set_attribute(value, "is_safe", SafeUUID.unknown)
+    return value
+
+def _recv_text(data: memoryview) -> str:
+    return str(data, 'utf-8')
+
+def _recv_jsonb(data: memoryview) -> Any:
+    # Byte1(version = 1), then the text form
+    return json.loads(str(data[1:], 'utf-8'))
+
+def _recv_unknown(data: memoryview) -> str:
+    # send() output of a type with no decoder, as bytea hex text: it must still serialize to JSON
+    return "\\x" + data.hex()
+
+def _recv_array(data: memoryview) -> list:
+    ndim, _, element_oid = _unpack_array(data, 0)
+    offset = 12
+    sizes = []
+    for _ in range(ndim):
+        size, _ = _unpack_dimension(data, offset)
+        sizes.append(size)
+        offset += 8
+    convert = BINARY_CONVERTERS.get(element_oid, _recv_unknown)
+    value, _ = _recv_array_level(data, offset, sizes, convert)
+    return value
+
+def _recv_array_level(data: memoryview, offset: int, sizes: List[int], convert: Callable[[memoryview], Any]) -> Tuple[list, int]:
+    items = []
+    for _ in range(sizes[0] if sizes else 0):
+        if len(sizes) > 1:
+            sub, offset = _recv_array_level(data, offset, sizes[1:], convert)
+            items.append(sub)
+            continue
+        length, = _unpack_int32(data, offset)
+        offset += 4
+        if length == -1:
+            items.append(None)
+        else:
+            items.append(convert(data[offset:offset + length]))
+            offset += length
+    return items, offset
+
+
+# Fixed-width types, unpacked straight from the payload without slicing out the value
+BINARY_UNPACKERS: Dict[int, Callable[[bytes, int], Tuple[Any]]] = {
+    16: struct.Struct('>?').unpack_from,            # bool
+    20: _unpack_int8,                               # int8
+    21: _unpack_int16,                              # int2
+    23: _unpack_int32,                              # int4
+    26: struct.Struct('>I').unpack_from,            # oid
+    700: struct.Struct('>f').unpack_from,           # float4
+    701: struct.Struct('>d').unpack_from,           # float8
+}
+
+# Types without an entry (here or in BINARY_UNPACKERS) arrive as '\\x<hex>' text.
+# Arrays carry their element OID and share one decoder.
+BINARY_CONVERTERS: Dict[int, Callable[[memoryview], Any]] = {
+    17: bytes,                                      # bytea
+    18: _recv_text, 19: _recv_text,                 # char, name
+    25: _recv_text,                                 # text
+    114: lambda data: json.loads(str(data, 'utf-8')),  # json
+    1042: _recv_text, 1043: _recv_text,             # bpchar, varchar
+    1082: _recv_date,                               # date
+    1083: _recv_time,                               # time
+    1114: _recv_timestamp(_PG_EPOCH),               # timestamp
+    1184: _recv_timestamp(_PG_EPOCH_TZ),            # timestamptz (sent as UTC)
+    1700: _recv_numeric,                            # numeric
+    2950: _recv_uuid,                               # uuid
+    3802: _recv_jsonb,                              # jsonb
+}
+for _oid, _unpack in BINARY_UNPACKERS.items():
+    BINARY_CONVERTERS[_oid] = lambda data, unpack=_unpack: unpack(data, 0)[0]
+for _array_oid in _ARRAY_ELEMENTS:
+    BINARY_CONVERTERS[_array_oid] = _recv_array
+
 
 class PgOutputDecoder:
     def __init__(self):
         self.relations = {} # RelID -> Schema/Table/Cols
+        # Between STREAM START and STREAM STOP, change messages carry the xid of their
+        # (sub)transaction after the type byte
+        self.in_stream = False
 
     def decode(self, payload: bytes) -> Optional[Dict[str, Any]]:
-        msg_type = chr(payload[0])
-        data = payload[1:]
-        
-        if msg_type == 'R': # Relation
-            return self._decode_relation(data)
-        elif msg_type == 'I': # Insert
-            return self._decode_insert(data)
-        elif msg_type == 'U': # Update
-            return self._decode_update(data)
-        elif msg_type == 'D': # Delete
-            return self._decode_delete(data)
-        elif msg_type == 'B': # Begin
-            return {"type": "BEGIN"}
-        elif msg_type == 'C': # Commit
-            return {"type": "COMMIT"}
+        msg_type = payload[0]
+        start = 1
+        xid = None
+        if self.in_stream and msg_type in (_INSERT, _UPDATE, _DELETE, _RELATION):
+            # Fields start after the xid; `start` is the offset of the RelID
+            xid, = _unpack_int32(payload, 1)
+            start = 5
+
+        if msg_type == _INSERT:
+            message = self._decode_insert(payload, start)
+        elif msg_type == _UPDATE:
+            message = self._decode_update(payload, start)
+        elif msg_type == _DELETE:
+            message = self._decode_delete(payload, start)
+        elif msg_type == _RELATION:
+            message = self._decode_relation(payload, start)
         else:
-            return {"type": "UNKNOWN", "code": msg_type}
+            return self._decode_control(payload, msg_type)
 
-    def _read_int32(self, data, offset) -> Tuple[int, int]:
-        val = struct.unpack('>i', data[offset:offset+4])[0]
-        return val, offset+4
+        if xid is not None:
+            message["xid"] = xid
+        return message
+
+    def _decode_control(self, payload: bytes, msg_type: int) -> Dict[str, Any]:
+        if msg_type == _BEGIN:
+            final_lsn, commit_ts, xid = _unpack_begin(payload, 1)
+            return {"type": "BEGIN", "final_lsn": final_lsn, "commit_ts": commit_ts, "xid": xid}
+        elif msg_type == _COMMIT:
+            flags, commit_lsn, end_lsn, commit_ts = _unpack_commit(payload, 1)
+            return {"type": "COMMIT", "commit_lsn": commit_lsn, "end_lsn": end_lsn, "commit_ts": commit_ts}
+        elif msg_type == _STREAM_START:
+            xid, first_segment = _unpack_stream_start(payload, 1)
+            self.in_stream = True
+            return {"type": "STREAM_START", "xid": xid, "first_segment": first_segment == 1}
+        elif msg_type == _STREAM_STOP:
+            self.in_stream = False
+            return {"type": "STREAM_STOP"}
+        elif msg_type == _STREAM_COMMIT:
+            xid, flags, commit_lsn, end_lsn, commit_ts = _unpack_stream_commit(payload, 1)
+            return {"type": "STREAM_COMMIT", "xid": xid, "commit_lsn": commit_lsn, "end_lsn": end_lsn, "commit_ts": commit_ts}
+        elif msg_type == _STREAM_ABORT:
+            xid, subxid = _unpack_stream_abort(payload, 1)
+            return {"type": "STREAM_ABORT", "xid": xid, "subxid": subxid}
+        else:
+            return {"type": "UNKNOWN", "code": chr(msg_type)}
 
-    def _read_string(self, data, offset) -> Tuple[str, int]:
-        end = data.find(b'\0', offset)
+    @staticmethod
+    def _read_string(payload: bytes, offset: int) -> Tuple[str, int]:
+        end = payload.find(b'\0', offset)
         if end == -1:
             raise ValueError("String null terminator not found")
-        val = data[offset:end].decode('utf-8')
-        return val, end+1
+        return str(memoryview(payload)[offset:end], 'utf-8'), end + 1
 
-    def _decode_relation(self, data):
+    def _decode_relation(self, payload: bytes, start: int = 1):
         # Byte1('R'), Int32(ID), String(Namespace), String(Name), Int8(ReplicaIdent), Int16(NumCols)
-        offset = 0
-        rel_id, offset = self._read_int32(data, offset)
-        namespace, offset = self._read_string(data, offset)
-        name, offset = self._read_string(data, offset)
-        replica_identity = chr(data[offset])
-        offset += 1
-        num_cols = struct.unpack('>h', data[offset:offset+2])[0]
-        offset += 2
-        
+        rel_id, = _unpack_int32(payload, start)
+        namespace, offset = self._read_string(payload, start + 4)
+        name, offset = self._read_string(payload, offset)
+        replica_identity = chr(payload[offset])
+        num_cols, = _unpack_int16(payload, offset + 1)
+        offset += 3
+
         columns = []
         for _ in range(num_cols):
             # Int8(Flags), String(Name), Int32(DataTypeID), Int32(TypeMod)
-            flags = data[offset]
-            offset += 1
-            col_name, offset = self._read_string(data, offset)
-            col_type, offset = self._read_int32(data, offset)
-            type_mod, offset = self._read_int32(data, offset)
-            columns.append({"name": col_name, "type": col_type, "key": bool(flags & 1)}) # 1 = Part of Key? (Verify flags)
+            flags = payload[offset]
+            col_name, offset = self._read_string(payload, offset + 1)
+            col_type, = _unpack_int32(payload, offset)
+            offset += 8
+            columns.append({"name": col_name, "type": col_type, "key": bool(flags & 1)}) # Flag 1: part of the replica identity key
 
-        self.relations[rel_id] = {"schema": namespace, "table": name, "columns": columns}
+        self.relations[rel_id] = {
+            "schema": namespace,
+            "table": name,
+            "columns": columns,
+            # Column names and value converters by position, looked up for every decoded tuple
+            "names": [col["name"] for col in columns],
+            "converters": [TYPE_CONVERTERS.get(col["type"]) for col in columns],
+            "binary_unpackers": [BINARY_UNPACKERS.get(col["type"]) for col in columns],
+            "binary_converters": [BINARY_CONVERTERS.get(col["type"], _recv_unknown) for col in columns],
+        }
         return {"type": "RELATION", "id": rel_id, "schema": namespace, "table": name}
 
-    def _decode_tuple(self, data, offset, rel_id) -> Tuple[Dict[str, Any], int]:
-        # Int16(NumCols), then 't'(text) or 'n'(null) followed by len/data
-        num_cols = struct.unpack('>h', data[offset:offset+2])[0]
+    @staticmethod
+    def _decode_tuple(payload: bytes, view: memoryview, offset: int, relation: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], int]:
+        # Int16(NumCols), then 't'(text) or 'b'(binary) or 'n'(null) or 'u'(unchanged TOAST) followed by len/data
+        num_cols, = _unpack_int16(payload, offset)
         offset += 2
-        
+        names = relation["names"] if relation else []
+        converters = relation["converters"] if relation else []
+        unpackers = relation["binary_unpackers"] if relation else []
+        receivers = relation["binary_converters"] if relation else []
+        known = len(names)
+
         row = {}
-        columns = self.relations.get(rel_id, {}).get("columns", [])
-        
         for i in range(num_cols):
-            col_type = chr(data[offset])
+            kind = payload[offset]
             offset += 1
-            
+
             val = None
-            if col_type == 'n': # Null
-                pass
-            elif col_type == 't': # Text
-                length, offset = self._read_int32(data, offset)
-                val_bytes = data[offset:offset+length]
-                val = val_bytes.decode('utf-8')
+            if kind == _TEXT:
+                length, = _unpack_int32(payload, offset)
+                offset += 4
+                val = str(view[offset:offset + length], 'utf-8')
                 offset += length
-            elif col_type == 'u': # Unchanged TOAST
-                pass 
-                
-            if i < len(columns):
-                row[columns[i]["name"]] = val
-            else:
-                row[f"col_{i}"] = val
-                
+                convert = converters[i] if i < known else None
+                if convert is not None:
+                    try:
+                        val = convert(val)
+                    except (ValueError, ArithmeticError):
+                        # Values Python cannot represent (infinity, BC dates, ...) stay as text
+                        pass
+            elif kind == _BINARY:
+                length, = _unpack_int32(payload, offset)
+                offset += 4
+                unpack = unpackers[i] if i < known else None
+                if unpack is not None:
+                    val, = unpack(payload, offset)
+                else:
+                    data = view[offset:offset + length]
+                    recv = receivers[i] if i < known else _recv_unknown
+                    try:
+                        val = str(data, 'utf-8') if recv is _recv_text else recv(data)
+                    except (ValueError, ArithmeticError, struct.error):
+                        # e.g. BC dates and years past 9999: keep the raw send() output
+                        val = _recv_unknown(data)
+                offset += length
+            elif kind == _UNCHANGED:
+                val = UNCHANGED_TOAST
+
+            row[names[i] if i < known else f"col_{i}"] = val
+
         return row, offset
 
-    def _decode_insert(self, data):
-        # Byte1('I'), Int32(RelID), Tuple('N')
-        offset = 0
-        rel_id, offset = self._read_int32(data, offset)
-        tuple_type = chr(data[offset]) # 'N'
-        offset += 1
-        
-        row, offset = self._decode_tuple(data, offset, rel_id)
-        
+    def _row_message(self, msg_type: str, rel_id: int, row: Dict[str, Any]) -> Dict[str, Any]:
         relation = self.relations.get(rel_id, {})
         return {
-            "type": "INSERT",
+            "type": msg_type,
+            "relation_id": rel_id,
             "schema": relation.get("schema"),
             "table": relation.get("table"),
             "data": row
         }
 
-    def _decode_update(self, data):
+    def _decode_insert(self, payload: bytes, start: int = 1):
+        # Byte1('I'), Int32(RelID), Byte1('N'), TupleData
+        rel_id, = _unpack_int32(payload, start)
+        row, _ = self._decode_tuple(payload, memoryview(payload), start + 5, self.relations.get(rel_id))
+        return self._row_message("INSERT", rel_id, row)
+
+    def _decode_update(self, payload: bytes, start: int = 1):
         # Byte1('U'), Int32(RelID), Optional OldTuple('K'|'O'), NewTuple('N')
-        offset = 0
-        rel_id, offset = self._read_int32(data, offset)
-        sub_type = chr(data[offset])
-        offset += 1
-        
+        rel_id, = _unpack_int32(payload, start)
+        relation = self.relations.get(rel_id)
+        view = memoryview(payload)
+        offset = start + 4
+
         old_row = None
-        if sub_type in ('K', 'O'):
-            old_row, offset = self._decode_tuple(data, offset, rel_id)
-            sub_type = chr(data[offset]) # Read next, should be 'N'
-            offset += 1
-            
-        row, offset = self._decode_tuple(data, offset, rel_id)
-        
-        relation = self.relations.get(rel_id, {})
-        return {
-            "type": "UPDATE",
-            "schema": relation.get("schema"),
-            "table": relation.get("table"),
-            "data": row,
-            "old_data": old_row
-        }
+        if payload[offset] in (_OLD_KEY, _OLD_ROW):
+            old_row, offset = self._decode_tuple(payload, view, offset + 1, relation)
+        # Skip the 'N' marker
+        row, _ = self._decode_tuple(payload, view, offset + 1, relation)
+
+        message = self._row_message("UPDATE", rel_id, row)
+        message["old_data"] = old_row
+        return message
 
-    def _decode_delete(self, data):
+    def _decode_delete(self, payload: bytes, start: int = 1):
         # Byte1('D'), Int32(RelID), OldTuple('K'|'O')
-        offset = 0
-        rel_id, offset = self._read_int32(data, offset)
-        sub_type = chr(data[offset])
-        offset += 1
-        
-        row, offset = self._decode_tuple(data, offset, rel_id)
-        
-        relation = self.relations.get(rel_id, {})
-        return {
-            "type": "DELETE",
-            "schema": relation.get("schema"),
-            "table": relation.get("table"),
-            "data": row
-        }
+        rel_id, = _unpack_int32(payload, start)
+        row, _ = self._decode_tuple(payload, memoryview(payload), start + 5, self.relations.get(rel_id))
+        return self._row_message("DELETE", rel_id, row)
@@ -1,3 +1,4 @@
+import asyncio
 import hashlib
 import json
 from typing import Optional, List, Dict, Any
@@ -6,17 +7,55 @@ from datetime import datetime, date
 from decimal import Decimal
 from sqlalchemy.orm import Session
 from sqlalchemy import select
-from sqlalchemy.dialects.postgresql import insert
+import httpx
 
 from app.models.core import SyncDefinition, SyncCursor, SharePointConnection, SyncTarget, SyncSource, SyncLedgerEntry
 from app.models.inventory import SharePointList, SharePointSite
-from app.services.sharepoint_content import SharePointContentService
-from app.services.graph import GraphClient
+from app.services.sharepoint_content import SharePointContentService, AsyncSharePointContentService
+from app.services.graph import shared_graph_client, AsyncGraphClient, GRAPH_POOL_MAXSIZE
 from app.services.database import DatabaseClient
+from app.services.state import LedgerService
 import os
 
 from app.services.sharding import ShardingEvaluator
 
+# "on": the push task runs run_push_async, writing items concurrently instead of in $batch calls
+PUSH_ASYNC = os.environ.get("PUSH_ASYNC", "off")
+# Concurrent item writes allowed per target list in run_push_async
+DEFAULT_MAX_IN_FLIGHT = int(os.environ.get("PUSH_MAX_IN_FLIGHT", "8"))
+# Source rows read, written and checkpointed together
+PUSH_CHUNK_SIZE = int(os.environ.get("PUSH_CHUNK_SIZE", "1000"))
+
+
+def serialize_value_for_sharepoint(value: Any) -> Any:
+    """
+    Convert Python types to SharePoint/JSON-compatible types.
+    """
+    if value is None:
+        return None
+    elif isinstance(value, datetime):
+        # SharePoint expects ISO 8601 format with timezone
+        return value.isoformat()
+    elif isinstance(value, date):
+        # Convert date to datetime at midnight, then to ISO 8601
+        return datetime.combine(value, datetime.min.time()).isoformat()
+    elif isinstance(value, Decimal):
+        # Convert Decimal to float for JSON serialization
+        return float(value)
+    elif isinstance(value, UUID):
+        return str(value)
+    else:
+        return value
+
+def compute_content_hash(data: Dict[str, Any]) -> str:
+    """
+    Hash of a row's mapped source columns ({source column: typed value}). Shared by
+    Pusher and the CDC consumer so both sides of echo suppression agree.
+    """
+    serialized = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
 class Pusher:
     def __init__(self, db: Session):
         self.db = db
@@ -40,7 +79,7 @@ class Pusher:
         if not conn:
              raise ValueError("No active SharePoint connection found")
 
-        graph = GraphClient(
+        graph = shared_graph_client(
             tenant_id=conn.tenant_id,
             client_id=conn.client_id,
             client_secret=real_secret, 
@@ -55,6 +94,52 @@ class Pusher:
         """
         Pushes changes from Source Database to SharePoint (Two-Way Sync or One-Way Push).
         Implements Loop Prevention using SyncLedger.
+        Drains every changed row in one run, a chunk at a time, checkpointing the
+        ledger and source cursor after each chunk.
+        """
+        run = self._start_push(sync_def_id)
+
+        for rows in self._iter_source_chunks(run):
+            write_groups = self._plan_chunk(run, rows)
+
+            # Dispatch planned writes and reconcile the ledger with per-item results
+            for group in write_groups.values():
+                results = group["service"].write_items(group["site_id"], group["operations"])
+                self._apply_write_results(run, group, results)
+
+            self._checkpoint_push(run)
+
+        return self._finish_push(run)
+
+    async def run_push_async(self, sync_def_id: UUID, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT) -> dict:
+        """
+        Async variant of run_push. Planning and ledger/cursor bookkeeping are identical;
+        item writes are issued concurrently, with at most max_in_flight requests
+        outstanding per target list.
+        """
+        run = self._start_push(sync_def_id)
+
+        async with httpx.AsyncClient(timeout=30, limits=httpx.Limits(max_connections=GRAPH_POOL_MAXSIZE)) as http:
+            async def dispatch(group):
+                async_graph = AsyncGraphClient(group["service"].graph, http)
+                service = AsyncSharePointContentService(async_graph, max_in_flight_per_list=max_in_flight)
+                return group, await service.write_items(group["site_id"], group["operations"])
+
+            for rows in self._iter_source_chunks(run):
+                write_groups = self._plan_chunk(run, rows)
+                dispatched = await asyncio.gather(*(dispatch(g) for g in write_groups.values()))
+
+                for group, results in dispatched:
+                    self._apply_write_results(run, group, results)
+
+                self._checkpoint_push(run)
+
+        return self._finish_push(run)
+
+    def _start_push(self, sync_def_id: UUID) -> Dict[str, Any]:
+        """
+        Resolves the definition, targets, source instance, field mappings and the
+        source keyset cursor into the run state shared by every chunk.
         """
         # 1. Load Definition
         sync_def = self.db.get(SyncDefinition, sync_def_id)
@@ -129,16 +214,18 @@ class Pusher:
         db_client = DatabaseClient(db_instance)
 
         # 5. Get Source Cursor (Watermark)
+        # KEYSET cursors hold the (updated_at, pk) of the last handled row; older
+        # TIMESTAMP cursors only the timestamp, and are upgraded on the next write.
         cursor_stmt = select(SyncCursor).where(
             SyncCursor.sync_def_id == sync_def_id,
             SyncCursor.cursor_scope == "SOURCE",
-            SyncCursor.cursor_type == "TIMESTAMP", # Assuming timestamp strategy
+            SyncCursor.cursor_type.in_(("KEYSET", "TIMESTAMP")),
             SyncCursor.source_instance_id == db_instance.id
         )
         cursor = self.db.execute(cursor_stmt).scalars().first()
-        last_watermark = cursor.cursor_value if cursor else None
+        last_position = self._decode_source_cursor(cursor)
 
-        # 6. Fetch Changed Rows from Source
+        # 6. Resolve Source Table
         cursor_col = "updated_at" 
         schema_name = sync_def.source_schema or "public"
         table_name = sync_def.source_table_name or sync_def.name
@@ -154,13 +241,6 @@ class Pusher:
                  table_name = tbl.table_name
                  schema_name = tbl.schema_name
 
-        print(f"[DEBUG] Fetching changed rows from {schema_name}.{table_name} WHERE {cursor_col} > {last_watermark}")
-        rows = db_client.fetch_changed_rows(schema_name, table_name, cursor_col, last_watermark)
-        print(f"[DEBUG] Found {len(rows)} changed rows to process")
-
-        processed_count = 0
-        max_cursor_seen = last_watermark
-
         # Pre-load field mappings with directional filtering
         # Map PG Col -> Target Col
         pg_to_sp_map = {}
@@ -185,50 +265,72 @@ class Pusher:
 
         print(f"[DEBUG] Field Mappings: {len(pg_to_sp_map)} fields mapped for PUSH (excluding PULL_ONLY). PK: {pg_pk_col}")
 
-        failed_count = 0
-        success_count = 0
+        return {
+            "sync_def_id": sync_def_id,
+            "source_instance_id": db_instance.id,
+            "db_client": db_client,
+            "schema_name": schema_name,
+            "table_name": table_name,
+            "cursor_col": cursor_col,
+            "pg_pk_col": pg_pk_col,
+            "pg_to_sp_map": pg_to_sp_map,
+            "target_map": target_map,
+            "default_target": default_target,
+            "sharding_evaluator": sharding_evaluator,
+            "cursor": cursor,
+            "last_position": last_position,
+            "rows_seen": 0,
+            "processed_count": 0,
+            "success_count": 0,
+            "failed_count": 0,
+            # Furthest handled row, as (sequence in the stream, (cursor value, pk value))
+            "max_cursor_seen": None,
+            "ledger_rows": [],
+            "cursor_updated": False,
+        }
 
-        for row in rows:
-            # 7. Process Row
-            source_id = str(row.get(pg_pk_col))
-            id_hash = hashlib.sha256(source_id.encode()).hexdigest()
-            
-            # Extract content for SP with type serialization
-            sp_fields = {}
-            filtered_row_data = {} # For hash
-            for pg_col, sp_col in pg_to_sp_map.items():
-                val = row.get(pg_col)
-                # Serialize Python types to SharePoint/JSON-compatible types
-                serialized_val = self._serialize_value_for_sharepoint(val)
-                sp_fields[sp_col] = serialized_val
-                filtered_row_data[pg_col] = val
-            
-            # If no fields mapped, we can't sync content (unless we just want to create empty placeholders, which is rare)
-            if not sp_fields:
-                print(f"[WARN] No fields mapped for row {source_id}. Skipping sync.")
-                failed_count += 1
-                continue
+    def _iter_source_chunks(self, run: Dict[str, Any]):
+        print(f"[DEBUG] Streaming changed rows from {run['schema_name']}.{run['table_name']} after {run['last_position']}")
+        return run["db_client"].iter_changed_rows(
+            run["schema_name"],
+            run["table_name"],
+            run["cursor_col"],
+            run["pg_pk_col"],
+            after=run["last_position"],
+            chunk_size=PUSH_CHUNK_SIZE
+        )
 
-            content_hash = self._compute_content_hash(filtered_row_data)
+    def _plan_chunk(self, run: Dict[str, Any], rows: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+        """
+        Applies loop prevention to one chunk of changed rows and groups the resulting
+        writes per content service. No SharePoint writes happen here.
+        """
+        sync_def_id = run["sync_def_id"]
+        pg_pk_col = run["pg_pk_col"]
+        target_map = run["target_map"]
 
-            # Extract Timestamp
-            row_ts = row.get(cursor_col)
+        print(f"[DEBUG] Found {len(rows)} changed rows to process")
 
-            # Determine Target
-            target_list_id = None
-            if sharding_evaluator:
-                shard_uuid = sharding_evaluator.evaluate(row)
-                if shard_uuid:
-                    target_list_id = str(shard_uuid)
-            
-            if not target_list_id:
-                target_list_id = str(default_target.target_list_id)
+        # Writes are planned per row first, then dispatched per content service
+        # (through Graph $batch, or concurrently in run_push_async).
+        write_groups: Dict[int, Dict[str, Any]] = {}
 
-            # Resolve Target Context
+        # Identity hashes for the whole batch, so the ledger is read with one query instead of one per row
+        row_identities = []
+        for row in rows:
+            source_id = str(row.get(pg_pk_col))
+            row_identities.append((source_id, hashlib.sha256(source_id.encode()).hexdigest()))
+        ledger_entries = LedgerService(self.db).get_entries(sync_def_id, (id_hash for _, id_hash in row_identities))
+
+        # Route the whole chunk first, then plan each target list's rows as one sub-batch
+        # so the target, its inventory record and its content service are resolved once
+        seq_start = run["rows_seen"]
+        run["rows_seen"] += len(rows)
+        for target_list_id, indices in self._route_chunk(run, rows).items():
             target_obj = target_map.get(target_list_id)
             if not target_obj:
-                print(f"Target list {target_list_id} determined but not found in active targets. Skipping.")
-                failed_count += 1
+                print(f"Target list {target_list_id} determined but not found in active targets. Skipping {len(indices)} rows.")
+                run["failed_count"] += len(indices)
                 continue
 
             # Validate List Status in Inventory
@@ -237,13 +339,13 @@ class Pusher:
             sp_list_record = self.db.get(SharePointList, target_obj.target_list_id)
             if sp_list_record and sp_list_record.status == 'DELETED':
                 print(f"[ERROR] Target list '{sp_list_record.display_name}' ({target_list_id}) is marked DELETED in inventory. Please update the Sync Definition to point to the new list.")
-                failed_count += 1
+                run["failed_count"] += len(indices)
                 continue
 
             # Resolve the actual SharePoint GUID for API calls (not the database UUID)
             if not sp_list_record:
                 print(f"[ERROR] Target list {target_list_id} not found in inventory. Cannot determine SharePoint GUID.")
-                failed_count += 1
+                run["failed_count"] += len(indices)
                 continue
 
             sp_list_guid = sp_list_record.list_id  # This is the actual SharePoint GUID
@@ -252,132 +354,210 @@ class Pusher:
                 content_service, site_id = self._get_content_service(target_obj.sharepoint_connection_id, target_obj.site_id)
             except Exception as e:
                 print(f"Failed to get content service for target {target_list_id}: {e}")
-                failed_count += 1
+                run["failed_count"] += len(indices)
+                continue
+
+            planned = [
+                self._plan_row(run, rows[i], row_identities[i], seq_start + i, sp_list_guid, ledger_entries)
+                for i in indices
+            ]
+            planned = [write for write in planned if write]
+            if not planned:
+                continue
+
+            group = write_groups.setdefault(id(content_service), {
+                "service": content_service,
+                "site_id": site_id,
+                "operations": [],
+                "rows": [],
+            })
+            for operation, planned_row in planned:
+                group["operations"].append(operation)
+                group["rows"].append(planned_row)
+
+        return write_groups
+
+    def _route_chunk(self, run: Dict[str, Any], rows: List[Dict[str, Any]]) -> Dict[str, List[int]]:
+        """Row indices per target list id. Rows no sharding rule routes go to the default target."""
+        default_id = str(run["default_target"].target_list_id)
+        sharding_evaluator = run["sharding_evaluator"]
+        if not sharding_evaluator:
+            return {default_id: list(range(len(rows)))}
+
+        routes: Dict[str, List[int]] = {}
+        for shard_uuid, indices in sharding_evaluator.evaluate_batch(rows).items():
+            routes.setdefault(str(shard_uuid) if shard_uuid else default_id, []).extend(indices)
+        return routes
+
+    def _plan_row(self, run: Dict[str, Any], row: Dict[str, Any], identity: tuple, seq: int,
+                  sp_list_guid: str, ledger_entries: Dict[str, Any]) -> Optional[tuple]:
+        """(operation, planned row) for one routed row, or None when nothing is written."""
+        source_id, id_hash = identity
+        cursor_col = run["cursor_col"]
+        position = (row.get(cursor_col), row.get(run["pg_pk_col"]))
+
+        # Extract content for SP with type serialization
+        sp_fields = {}
+        filtered_row_data = {} # For hash
+        for pg_col, sp_col in run["pg_to_sp_map"].items():
+            val = row.get(pg_col)
+            # Serialize Python types to SharePoint/JSON-compatible types
+            serialized_val = self._serialize_value_for_sharepoint(val)
+            sp_fields[sp_col] = serialized_val
+            filtered_row_data[pg_col] = val
+
+        # If no fields mapped, we can't sync content (unless we just want to create empty placeholders, which is rare)
+        if not sp_fields:
+            print(f"[WARN] No fields mapped for row {source_id}. Skipping sync.")
+            run["failed_count"] += 1
+            return None
+
+        content_hash = self._compute_content_hash(filtered_row_data)
+
+        # Extract Timestamp
+        row_ts = row.get(cursor_col)
+
+        # LOOP PREVENTION / LEDGER CHECK
+        ledger_entry = ledger_entries.get(id_hash)
+        
+        if ledger_entry:
+            # If Provenance is PULL (last write came from SP), we must check if Source changed since then.
+            if ledger_entry.provenance == "PULL":
+                # Check if hash matches. If hash is same, it's definitely a loop echo.
+                if ledger_entry.content_hash == content_hash:
+                    # Skip, but count as processed and advance the cursor past it
+                    self._advance_source_cursor(run, seq, position)
+                    run["processed_count"] += 1
+                    return None
+        
+        # If we are here, it's a valid Push (New or Update from Source)
+        if ledger_entry:
+            operation = {"action": "update", "list_id": sp_list_guid, "item_id": str(ledger_entry.sp_item_id), "fields": sp_fields}
+        else:
+            operation = {"action": "create", "list_id": sp_list_guid, "fields": sp_fields}
+
+        return operation, {
+            "ledger_entry": ledger_entry,
+            "id_hash": id_hash,
+            "source_id": source_id,
+            "sp_list_guid": sp_list_guid,
+            "sp_fields": sp_fields,
+            "content_hash": content_hash,
+            "row_ts": row_ts,
+            "seq": seq,
+            "position": position,
+        }
+
+    def _apply_write_results(self, run: Dict[str, Any], group: Dict[str, Any], results: List[Dict[str, Any]]) -> None:
+        """
+        Reconciles the ledger and run counters with per-item write results.
+        """
+        for planned, result in zip(group["rows"], results):
+            run["processed_count"] += 1
+            ledger_entry = planned["ledger_entry"]
+            row_ts = planned["row_ts"]
+
+            if not result["success"]:
+                action = "update" if ledger_entry else "create"
+                print(f"Failed to {action} SP item: [{result['status']}] {result['error']}")
+                run["failed_count"] += 1
                 continue
 
-            # LOOP PREVENTION / LEDGER CHECK
-            ledger_entry = self.db.get(SyncLedgerEntry, (sync_def_id, id_hash))
-            
-            if ledger_entry:
-                # If Provenance is PULL (last write came from SP), we must check if Source changed since then.
-                if ledger_entry.provenance == "PULL":
-                    # Check if hash matches. If hash is same, it's definitely a loop echo.
-                    if ledger_entry.content_hash == content_hash:
-                        # Skip
-                        # Update max cursor
-                        if str(row_ts) > str(max_cursor_seen if max_cursor_seen else ""):
-                            max_cursor_seen = str(row_ts)
-                        continue
-            
-            # If we are here, it's a valid Push (New or Update from Source)
-            
             if ledger_entry:
-                # Update SP Item
-                try:
-                    content_service.update_item(site_id, sp_list_guid, str(ledger_entry.sp_item_id), sp_fields)
-                    
-                    # Update Ledger
-                    ledger_entry.content_hash = content_hash
-                    ledger_entry.last_sync_ts = datetime.utcnow()
-                    ledger_entry.provenance = "PUSH"
-                    ledger_entry.last_source_ts = row_ts if isinstance(row_ts, datetime) else datetime.utcnow() # approx
-                    success_count += 1
-                    # Only advance cursor on successful update
-                    if str(row_ts) > str(max_cursor_seen if max_cursor_seen else ""):
-                        max_cursor_seen = str(row_ts)
-                except Exception as e:
-                    # Log error
-                    print(f"Failed to update SP item: {e}")
-                    failed_count += 1
+                # Update Ledger (item location is unchanged)
+                sp_list_id = ledger_entry.sp_list_id
+                sp_item_id = ledger_entry.sp_item_id
+            elif result["id"]:
+                # Create Ledger
+                sp_list_id = planned["sp_list_guid"]  # Store SharePoint GUID in ledger
+                sp_item_id = int(result["id"])
             else:
-                # Create SP Item
-                try:
-                    sp_id_str = content_service.create_item(site_id, sp_list_guid, sp_fields)
-                    if sp_id_str:
-                        sp_item_id = int(sp_id_str)
-
-                        # Create Ledger
-                        new_entry = SyncLedgerEntry(
-                            sync_def_id=sync_def_id,
-                            source_identity_hash=id_hash,
-                            source_identity=source_id,
-                            source_key_strategy="PRIMARY_KEY",
-                            source_instance_id=db_instance.id,
-                            sp_list_id=sp_list_guid,  # Store SharePoint GUID in ledger
-                            sp_item_id=sp_item_id,
-                            content_hash=content_hash,
-                            last_source_ts=row_ts if isinstance(row_ts, datetime) else datetime.utcnow(),
-                            last_sync_ts=datetime.utcnow(),
-                            provenance="PUSH"
-                        )
-                        self.db.add(new_entry)
-                        success_count += 1
-                        # Only advance cursor on successful create
-                        if str(row_ts) > str(max_cursor_seen if max_cursor_seen else ""):
-                            max_cursor_seen = str(row_ts)
-                    else:
-                        print(f"Graph API returned no ID for created item. Payload: {sp_fields}")
-                        failed_count += 1
-                except Exception as e:
-                     print(f"Failed to create SP item: {e}")
-                     failed_count += 1
-
-            processed_count += 1
+                print(f"Graph API returned no ID for created item. Payload: {planned['sp_fields']}")
+                run["failed_count"] += 1
+                continue
+
+            run["ledger_rows"].append({
+                "sync_def_id": run["sync_def_id"],
+                "source_identity_hash": planned["id_hash"],
+                "source_identity": planned["source_id"],
+                "source_key_strategy": "PRIMARY_KEY",
+                "source_instance_id": run["source_instance_id"],
+                "sp_list_id": sp_list_id,
+                "sp_item_id": sp_item_id,
+                "content_hash": planned["content_hash"],
+                "last_source_ts": row_ts if isinstance(row_ts, datetime) else datetime.utcnow(), # approx
+                "last_sync_ts": datetime.utcnow(),
+                "provenance": "PUSH",
+            })
+
+            run["success_count"] += 1
+            # Only advance cursor on successful write
+            self._advance_source_cursor(run, planned["seq"], planned["position"])
+
+    def _advance_source_cursor(self, run: Dict[str, Any], seq: int, position: tuple) -> None:
+        # Rows arrive in keyset order, so the furthest handled row is the one seen last.
+        # Rows without a cursor value sort after every other row and cannot be resumed from.
+        if position[0] is None:
+            return
+        if run["max_cursor_seen"] is None or seq > run["max_cursor_seen"][0]:
+            run["max_cursor_seen"] = (seq, position)
+
+    def _checkpoint_push(self, run: Dict[str, Any]) -> None:
+        """
+        Persists the ledger rows and keyset cursor for the chunk just written, so an
+        interrupted run resumes after the last handled row.
+        """
+        # Ledger inserts and updates are written back in one INSERT ... ON CONFLICT per chunk
+        LedgerService(self.db).upsert_entries(run["ledger_rows"])
+        run["ledger_rows"] = []
 
         # 8. Update Cursor
-        if max_cursor_seen:
-            # Check for existing cursor
-            cursor_stmt = select(SyncCursor).where(
-                SyncCursor.sync_def_id == sync_def_id,
-                SyncCursor.cursor_scope == "SOURCE",
-                SyncCursor.source_instance_id == db_instance.id
-            )
-            cursor = self.db.execute(cursor_stmt).scalars().first()
-            
+        if run["max_cursor_seen"]:
+            _, (cursor_val, pk_val) = run["max_cursor_seen"]
+            cursor_value = json.dumps([str(cursor_val), pk_val], default=str)
+            cursor = run["cursor"]
+
             if cursor:
-                cursor.cursor_value = max_cursor_seen
+                cursor.cursor_type = "KEYSET"
+                cursor.cursor_value = cursor_value
                 cursor.updated_at = datetime.utcnow()
                 self.db.add(cursor)
             else:
-                new_cursor = SyncCursor(
-                    sync_def_id=sync_def_id,
+                cursor = SyncCursor(
+                    sync_def_id=run["sync_def_id"],
                     cursor_scope="SOURCE",
-                    cursor_type="TIMESTAMP",
-                    cursor_value=max_cursor_seen,
-                    source_instance_id=db_instance.id,
+                    cursor_type="KEYSET",
+                    cursor_value=cursor_value,
+                    source_instance_id=run["source_instance_id"],
                     updated_at=datetime.utcnow()
                 )
-                self.db.add(new_cursor)
-            
-            self.db.commit()
+                self.db.add(cursor)
+                run["cursor"] = cursor
+            run["cursor_updated"] = True
+
+        self.db.commit()
 
+    def _finish_push(self, run: Dict[str, Any]) -> dict:
         return {
-            "processed_count": processed_count,
-            "success_count": success_count,
-            "failed_count": failed_count,
-            "cursor_updated": bool(max_cursor_seen)
+            "processed_count": run["processed_count"],
+            "success_count": run["success_count"],
+            "failed_count": run["failed_count"],
+            "cursor_updated": run["cursor_updated"]
         }
 
-    def _serialize_value_for_sharepoint(self, value: Any) -> Any:
-        """
-        Convert Python types to SharePoint/JSON-compatible types.
-        """
-        if value is None:
+    @staticmethod
+    def _decode_source_cursor(cursor: Optional[SyncCursor]) -> Optional[tuple]:
+        """Returns the (cursor value, pk value) keyset position stored in a SOURCE cursor."""
+        if not cursor or not cursor.cursor_value:
             return None
-        elif isinstance(value, datetime):
-            # SharePoint expects ISO 8601 format with timezone
-            return value.isoformat()
-        elif isinstance(value, date):
-            # Convert date to datetime at midnight, then to ISO 8601
-            return datetime.combine(value, datetime.min.time()).isoformat()
-        elif isinstance(value, Decimal):
-            # Convert Decimal to float for JSON serialization
-            return float(value)
-        elif isinstance(value, UUID):
-            return str(value)
-        else:
-            return value
+        if cursor.cursor_type == "KEYSET":
+            cursor_val, pk_val = json.loads(cursor.cursor_value)
+            return cursor_val, pk_val
+        # Timestamp-only watermark: resume inclusively at that timestamp
+        return cursor.cursor_value, None
+
+    def _serialize_value_for_sharepoint(self, value: Any) -> Any:
+        return serialize_value_for_sharepoint(value)
 
     def _compute_content_hash(self, data: Dict[str, Any]) -> str:
-        serialized = json.dumps(data, sort_keys=True, default=str)
-        return hashlib.sha256(serialized.encode()).hexdigest()
+        return compute_content_hash(data)
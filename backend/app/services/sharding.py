@@ -1,7 +1,204 @@
-from typing import Dict, Any, Optional
+from functools import lru_cache
+from typing import Dict, Any, Optional, Callable, List, Tuple
 from uuid import UUID
+import json
 import operator
 
+# Checked in this order, so ">=" is found before ">"
+_OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">=": operator.ge,
+    "<=": operator.le,
+    ">": operator.gt,
+    "<": operator.lt
+}
+
+# Compiled policies kept, keyed by the policy's canonical JSON
+SHARDING_POLICY_CACHE_SIZE = 256
+
+def _parse_literal(val_str: str) -> Any:
+    # Basic inference: 'quoted' string, integer, decimal, else the bare word as a string
+    if val_str.startswith("'") and val_str.endswith("'"):
+        return val_str[1:-1]
+    elif val_str.isdigit():
+        return int(val_str)
+    elif val_str.replace('.', '', 1).isdigit():
+        return float(val_str)
+    return val_str
+
+
+def _compile_term(condition: str) -> Optional[Tuple[str, Callable[[Any, Any], bool], Any]]:
+    """'field op value' -> (field, operator, literal), or None if there is no operator."""
+    for op_str, op in _OPERATORS.items():
+        if f" {op_str} " in condition:
+            field, val_str = condition.split(f" {op_str} ", 1)
+            return field.strip(), op, _parse_literal(val_str.strip())
+    return None
+
+
+def _compile_condition(condition: str) -> Optional[List[Tuple[str, Callable[[Any, Any], bool], Any]]]:
+    """
+    "a == 'x' and b > 1" -> its terms, or None for invalid syntax, which never matches.
+    """
+    terms = [_compile_term(sub.strip()) for sub in condition.split(' and ')]
+    if any(term is None for term in terms):
+        return None
+    return terms
+
+
+class _EqualityIndex:
+    """A run of consecutive "field == literal" rules, as one dict lookup."""
+    __slots__ = ("field", "targets")
+
+    def __init__(self, field: str, value: Any, target: UUID):
+        self.field = field
+        self.targets = {value: target}
+
+    def route(self, row: Dict[str, Any]) -> Optional[UUID]:
+        if self.field not in row:
+            return None
+        try:
+            return self.targets.get(row[self.field])
+        except TypeError:
+            return None # Unhashable value: equal to no literal
+
+    def route_batch(self, rows: List[Dict[str, Any]], pending: List[int], groups: Dict[Optional[UUID], List[int]]) -> List[int]:
+        field, get = self.field, self.targets.get
+        remaining = []
+        for i in pending:
+            row = rows[i]
+            target = None
+            if field in row:
+                try:
+                    target = get(row[field])
+                except TypeError:
+                    pass
+            if target is None:
+                remaining.append(i)
+            else:
+                groups.setdefault(target, []).append(i)
+        return remaining
+
+
+class _Rule:
+    """Any other rule: every term must hold, evaluated field by field."""
+    __slots__ = ("terms", "target", "predicate")
+
+    def __init__(self, terms: List[Tuple[str, Callable[[Any, Any], bool], Any]], target: UUID):
+        self.terms = terms
+        self.target = target
+        self.predicate = self._compile(terms)
+
+    @staticmethod
+    def _compile(terms: List[Tuple[str, Callable[[Any, Any], bool], Any]]) -> Callable[[Dict[str, Any]], bool]:
+        if len(terms) == 1:
+            field, op, value = terms[0]
+
+            def predicate(row: Dict[str, Any]) -> bool:
+                return field in row and bool(op(row[field], value))
+        else:
+            def predicate(row: Dict[str, Any]) -> bool:
+                for field, op, value in terms:
+                    if field not in row or not op(row[field], value):
+                        return False
+                return True
+        return predicate
+
+    def route(self, row: Dict[str, Any]) -> Optional[UUID]:
+        try:
+            return self.target if self.predicate(row) else None
+        except Exception:
+            # Skip a rule that cannot be evaluated for this row (e.g. str > int)
+            return None
+
+    def route_batch(self, rows: List[Dict[str, Any]], pending: List[int], groups: Dict[Optional[UUID], List[int]]) -> List[int]:
+        matched = pending
+        try:
+            # Narrow the candidates one term (column) at a time
+            for field, op, value in self.terms:
+                matched = [i for i in matched if field in rows[i] and op(rows[i][field], value)]
+        except Exception:
+            # Some row cannot be compared: fall back to row by row, which skips just that row
+            matched = [i for i in pending if self.route(rows[i]) is not None]
+        if not matched:
+            return pending
+        groups.setdefault(self.target, []).extend(matched)
+        matched_set = set(matched)
+        return [i for i in pending if i not in matched_set]
+
+
+class CompiledPolicy:
+    """
+    A sharding policy parsed once into steps evaluated in rule order. A run of
+    consecutive "field == literal" rules on the same field becomes one dict lookup,
+    so the common fan-out on a status column routes in O(1) however many rules it has.
+    """
+    def __init__(self, policy: Dict[str, Any]):
+        self.steps: List[Any] = []
+        default = policy.get("default_target_list_id")
+        self.default_target = UUID(default) if default else None
+
+        for rule in policy.get("rules", []):
+            condition = rule.get("if")
+            target_id = rule.get("target_list_id")
+            if not condition or not target_id:
+                continue
+            try:
+                target = UUID(target_id)
+            except ValueError:
+                continue # A rule with an invalid target never routes
+
+            terms = _compile_condition(condition)
+            if terms is None:
+                continue
+            if len(terms) == 1 and terms[0][1] is operator.eq:
+                field, _, value = terms[0]
+                last = self.steps[-1] if self.steps else None
+                if isinstance(last, _EqualityIndex) and last.field == field:
+                    # Earlier rules win, as they would when evaluated in order
+                    last.targets.setdefault(value, target)
+                else:
+                    self.steps.append(_EqualityIndex(field, value, target))
+            else:
+                self.steps.append(_Rule(terms, target))
+        self._routes = [step.route for step in self.steps]
+
+    def route(self, row: Dict[str, Any]) -> Optional[UUID]:
+        for route in self._routes:
+            target = route(row)
+            if target is not None:
+                return target
+        return self.default_target
+
+    def route_batch(self, rows: List[Dict[str, Any]]) -> Dict[Optional[UUID], List[int]]:
+        """
+        Routes a whole batch step by step: each step sees only the rows no earlier
+        step matched. Returns row indices per target, in row order.
+        """
+        groups: Dict[Optional[UUID], List[int]] = {}
+        pending = list(range(len(rows)))
+        for step in self.steps:
+            if not pending:
+                break
+            pending = step.route_batch(rows, pending, groups)
+        if pending:
+            groups.setdefault(self.default_target, []).extend(pending)
+        for target, indices in groups.items():
+            indices.sort()
+        return groups
+
+
+@lru_cache(maxsize=SHARDING_POLICY_CACHE_SIZE)
+def _compile_policy(policy_json: str) -> CompiledPolicy:
+    return CompiledPolicy(json.loads(policy_json))
+
+
+def compile_policy(policy: Optional[Dict[str, Any]]) -> CompiledPolicy:
+    """Compiled form of a policy, shared by every evaluator of an identical policy."""
+    return _compile_policy(json.dumps(policy or {}, sort_keys=True, default=str))
+
+
 class ShardingEvaluator:
     def __init__(self, policy: Dict[str, Any]):
         """
@@ -17,58 +214,7 @@ class ShardingEvaluator:
         self.policy = policy
         self.rules = policy.get("rules", [])
         self.default_target = policy.get("default_target_list_id")
-
-    def _basic_eval(self, condition: str, row: Dict[str, Any]) -> bool:
-        """
-        Very basic parser for conditions like "field op value".
-        Supports: ==, !=, >, <, >=, <=, and
-        """
-        # Split by ' and ' for basic AND logic
-        sub_conditions = condition.split(' and ')
-        for sub in sub_conditions:
-            if not self._eval_single(sub.strip(), row):
-                return False
-        return True
-
-    def _eval_single(self, condition: str, row: Dict[str, Any]) -> bool:
-        ops = {
-            "==": operator.eq,
-            "!=": operator.ne,
-            ">=": operator.ge,
-            "<=": operator.le,
-            ">": operator.gt,
-            "<": operator.lt
-        }
-        
-        # Find operator
-        found_op = None
-        for op_str in ops.keys():
-            if f" {op_str} " in condition:
-                found_op = op_str
-                break
-        
-        if not found_op:
-            return False # Invalid syntax
-            
-        field, val_str = condition.split(f" {found_op} ", 1)
-        field = field.strip()
-        val_str = val_str.strip()
-        
-        # Resolve field
-        if field not in row:
-            return False
-        row_val = row[field]
-        
-        # Parse value type (basic inference)
-        comp_val = val_str
-        if val_str.startswith("'") and val_str.endswith("'"):
-            comp_val = val_str[1:-1]
-        elif val_str.isdigit():
-            comp_val = int(val_str)
-        elif val_str.replace('.', '', 1).isdigit():
-            comp_val = float(val_str)
-            
-        return ops[found_op](row_val, comp_val)
+        self.compiled = compile_policy(policy)
 
     def evaluate(self, row: Dict[str, Any]) -> Optional[UUID]:
         """
@@ -77,21 +223,12 @@ class ShardingEvaluator:
         If no rules match, returns the default_target_list_id.
         Returns None if no target can be determined.
         """
-        for rule in self.rules:
-            condition = rule.get("if")
-            target_id = rule.get("target_list_id")
-            
-            if not condition or not target_id:
-                continue
+        return self.compiled.route(row)
 
-            try:
-                if self._basic_eval(condition, row):
-                    return UUID(target_id)
-            except Exception:
-                # Log error or skip rule if evaluation fails
-                continue
-        
-        if self.default_target:
-            return UUID(self.default_target)
-            
-        return None
+    def evaluate_batch(self, rows: List[Dict[str, Any]]) -> Dict[Optional[UUID], List[int]]:
+        """
+        Routes a batch of rows at once, rule by rule over the rows still unmatched.
+        Returns the indices of the rows per target list, the same targets evaluate()
+        gives row by row. Rows with no target are grouped under None.
+        """
+        return self.compiled.route_batch(rows)
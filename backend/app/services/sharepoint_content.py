@@ -1,5 +1,32 @@
-from typing import Dict, Any, Optional
-from app.services.graph import GraphClient
+import asyncio
+from typing import Dict, Any, Optional, List, Tuple
+from app.services.graph import GraphClient, AsyncGraphClient, MAX_BATCH_SIZE
+
+def _to_sub_request(request_id: str, site_id: str, op: Dict[str, Any]) -> Dict[str, Any]:
+    """Translates a write operation into a Graph request {"id", "method", "url", "body"?}."""
+    action = op["action"]
+    list_path = f"/sites/{site_id}/lists/{op['list_id']}/items"
+    if action == "create":
+        return {"id": request_id, "method": "POST", "url": list_path, "body": {"fields": op["fields"]}}
+    if action == "update":
+        return {"id": request_id, "method": "PATCH", "url": f"{list_path}/{op['item_id']}/fields", "body": op["fields"]}
+    if action == "delete":
+        return {"id": request_id, "method": "DELETE", "url": f"{list_path}/{op['item_id']}"}
+    raise ValueError(f"Unsupported batch action: {action}")
+
+def _to_result(op: Dict[str, Any], response: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Maps a Graph (sub-)response {"status", "body"} to a per-operation write result."""
+    if response is None:
+        return {"success": False, "status": 0, "id": None, "error": "Missing sub-response in $batch"}
+
+    status = int(response.get("status", 0))
+    body = response.get("body") or {}
+    if 200 <= status < 300:
+        item_id = body.get("id") if op["action"] == "create" else op.get("item_id")
+        return {"success": True, "status": status, "id": str(item_id) if item_id is not None else None, "error": None}
+
+    error = body.get("error", {}).get("message") if isinstance(body, dict) else None
+    return {"success": False, "status": status, "id": None, "error": error or str(body)}
 
 class SharePointContentService:
     def __init__(self, graph_client: GraphClient):
@@ -31,6 +58,59 @@ class SharePointContentService:
         # Note: Updating 'fields' endpoint is often safer for preserving metadata than updating 'items' directly
         self.graph.request("PATCH", f"/sites/{site_id}/lists/{list_id}/items/{item_id}/fields", json_body=fields)
 
+    def create_items(self, site_id: str, list_id: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Creates many items in the specified list using Graph JSON batching.
+        Returns one result per input, in input order (see write_items).
+        """
+        return self.write_items(site_id, [
+            {"action": "create", "list_id": list_id, "fields": fields} for fields in items
+        ])
+
+    def update_items(self, site_id: str, list_id: str, updates: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        Updates many items in the specified list. updates is a list of (item_id, fields).
+        Returns one result per input, in input order (see write_items).
+        """
+        return self.write_items(site_id, [
+            {"action": "update", "list_id": list_id, "item_id": item_id, "fields": fields} for item_id, fields in updates
+        ])
+
+    def delete_items(self, site_id: str, list_id: str, item_ids: List[str]) -> List[Dict[str, Any]]:
+        """
+        Deletes many items from the specified list.
+        Returns one result per input, in input order (see write_items).
+        """
+        return self.write_items(site_id, [
+            {"action": "delete", "list_id": list_id, "item_id": item_id} for item_id in item_ids
+        ])
+
+    def write_items(self, site_id: str, operations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Dispatches create/update/delete operations in Graph $batch calls of up to 20.
+        Each operation is {"action": "create"|"update"|"delete", "list_id", "item_id"?, "fields"?}.
+        Operations may target different lists within the same site.
+
+        Returns one result per operation, in input order:
+        {"success": bool, "status": int, "id": str | None, "error": str | None}
+        A failing operation never fails the rest of the batch.
+        """
+        results: List[Dict[str, Any]] = []
+        for start in range(0, len(operations), MAX_BATCH_SIZE):
+            chunk = operations[start:start + MAX_BATCH_SIZE]
+            sub_requests = [_to_sub_request(str(i), site_id, op) for i, op in enumerate(chunk)]
+
+            try:
+                responses = self.graph.batch(sub_requests)
+            except Exception as e:
+                # Whole $batch call failed (auth, network) - every operation in it failed
+                results.extend({"success": False, "status": 0, "id": None, "error": str(e)} for _ in chunk)
+                continue
+
+            for i, op in enumerate(chunk):
+                results.append(_to_result(op, responses.get(str(i))))
+        return results
+
     def get_item(self, site_id: str, list_id: str, item_id: str) -> Dict[str, Any]:
         """
         Retrieves an item and its fields.
@@ -86,3 +166,31 @@ class SharePointContentService:
                 break
                 
         return items, ""
+
+
+class AsyncSharePointContentService:
+    """
+    Issues item writes concurrently instead of in $batch calls, keeping at most
+    max_in_flight_per_list requests outstanding against any one list.
+    """
+    def __init__(self, graph_client: AsyncGraphClient, max_in_flight_per_list: int = 8):
+        self.graph = graph_client
+        self.max_in_flight_per_list = max_in_flight_per_list
+        self._list_limits: Dict[str, asyncio.Semaphore] = {}
+
+    async def write_items(self, site_id: str, operations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Same contract as SharePointContentService.write_items: one result per
+        operation, in input order, and a failing operation never fails the rest.
+        """
+        return list(await asyncio.gather(*(self._write_item(site_id, op) for op in operations)))
+
+    async def _write_item(self, site_id: str, op: Dict[str, Any]) -> Dict[str, Any]:
+        limit = self._list_limits.setdefault(op["list_id"], asyncio.Semaphore(self.max_in_flight_per_list))
+        sub = _to_sub_request("0", site_id, op)
+        async with limit:
+            try:
+                body = await self.graph.request(sub["method"], sub["url"], json_body=sub.get("body"))
+            except Exception as e:
+                return {"success": False, "status": 0, "id": None, "error": str(e)}
+        return _to_result(op, {"status": 200, "body": body})
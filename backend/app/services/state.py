@@ -1,10 +1,15 @@
-from typing import Optional
+from typing import Optional, Dict, Iterable, List, Any
 from datetime import datetime
 from uuid import UUID
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy import select, func, delete
+from sqlalchemy.dialects.postgresql import insert
 from app.models.core import SyncLedgerEntry, SyncCursor, MoveAuditLog
 
+# Columns refreshed when an upserted ledger row already exists.
+# Identity columns (source_identity, key strategy, instance) are kept from the first write.
+LEDGER_UPSERT_COLUMNS = ("sp_list_id", "sp_item_id", "content_hash", "last_source_ts", "last_sync_ts", "provenance")
+
 class LedgerService:
     def __init__(self, db: Session):
         self.db = db
@@ -24,6 +29,94 @@ class LedgerService:
     def get_entry(self, sync_def_id: UUID, source_identity_hash: str) -> Optional[SyncLedgerEntry]:
         return self.db.get(SyncLedgerEntry, (sync_def_id, source_identity_hash))
 
+    def get_entries(self, sync_def_id: UUID, source_identity_hashes: Iterable[str], chunk_size: int = 1000) -> Dict[str, SyncLedgerEntry]:
+        """
+        Loads the ledger entries for many identity hashes with one IN query per
+        chunk_size hashes. Returns {source_identity_hash: entry}; misses are absent.
+        """
+        hashes = list(dict.fromkeys(source_identity_hashes))
+        entries: Dict[str, SyncLedgerEntry] = {}
+        for start in range(0, len(hashes), chunk_size):
+            chunk = hashes[start:start + chunk_size]
+            stmt = select(SyncLedgerEntry).where(
+                SyncLedgerEntry.sync_def_id == sync_def_id,
+                SyncLedgerEntry.source_identity_hash.in_(chunk)
+            )
+            for entry in self.db.execute(stmt).scalars().all():
+                entries[entry.source_identity_hash] = entry
+        return entries
+
+    def get_entries_by_sp_items(self, sync_def_id: UUID, sp_list_id: str, sp_item_ids: Iterable[int], chunk_size: int = 1000) -> Dict[int, SyncLedgerEntry]:
+        """
+        Resolves many SharePoint items of one list to their ledger entries with one
+        IN query per chunk_size ids (served by ix_sync_ledger_sp_item).
+        Returns {sp_item_id: entry}; misses are absent.
+        """
+        item_ids = list(dict.fromkeys(int(i) for i in sp_item_ids))
+        entries: Dict[int, SyncLedgerEntry] = {}
+        for start in range(0, len(item_ids), chunk_size):
+            stmt = select(SyncLedgerEntry).where(
+                SyncLedgerEntry.sync_def_id == sync_def_id,
+                SyncLedgerEntry.sp_list_id == sp_list_id,
+                SyncLedgerEntry.sp_item_id.in_(item_ids[start:start + chunk_size])
+            )
+            for entry in self.db.execute(stmt).scalars().all():
+                entries[entry.sp_item_id] = entry
+        return entries
+
+    def upsert_entries(self, rows: List[Dict[str, Any]], chunk_size: int = 1000, commit: bool = False) -> int:
+        """
+        Writes many ledger rows with INSERT ... ON CONFLICT (sync_def_id, source_identity_hash)
+        DO UPDATE, one statement per chunk_size rows, bypassing ORM unit-of-work overhead.
+
+        Each row is a dict of SyncLedgerEntry columns. A missing or None last_source_ts
+        keeps the stored value. When a key appears more than once, the last row wins.
+        Returns the number of distinct rows written.
+        """
+        if not rows:
+            return 0
+
+        # ON CONFLICT cannot touch the same row twice in one statement
+        deduped = {}
+        for row in rows:
+            deduped[(row["sync_def_id"], row["source_identity_hash"])] = row
+        unique_rows = [self._complete_ledger_row(row) for row in deduped.values()]
+
+        for start in range(0, len(unique_rows), chunk_size):
+            stmt = insert(SyncLedgerEntry).values(unique_rows[start:start + chunk_size])
+            set_ = {col: stmt.excluded[col] for col in LEDGER_UPSERT_COLUMNS}
+            set_["last_source_ts"] = func.coalesce(stmt.excluded.last_source_ts, SyncLedgerEntry.last_source_ts)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[SyncLedgerEntry.sync_def_id, SyncLedgerEntry.source_identity_hash],
+                set_=set_
+            )
+            self.db.execute(stmt)
+
+        if commit:
+            self.db.commit()
+        return len(unique_rows)
+
+    def delete_entries(self, sync_def_id: UUID, source_identity_hashes: Iterable[str], chunk_size: int = 1000) -> None:
+        """Deletes many ledger entries with one DELETE per chunk_size hashes. Does not commit."""
+        hashes = list(dict.fromkeys(source_identity_hashes))
+        for start in range(0, len(hashes), chunk_size):
+            stmt = delete(SyncLedgerEntry).where(
+                SyncLedgerEntry.sync_def_id == sync_def_id,
+                SyncLedgerEntry.source_identity_hash.in_(hashes[start:start + chunk_size])
+            )
+            self.db.execute(stmt)
+
+    @staticmethod
+    def _complete_ledger_row(row: Dict[str, Any]) -> Dict[str, Any]:
+        # Multi-row VALUES needs the same keys on every row
+        complete = {
+            "source_key_strategy": "PRIMARY_KEY",
+            "last_source_ts": None,
+            "last_sync_ts": datetime.utcnow(),
+        }
+        complete.update(row)
+        return complete
+
     def record_entry(self, entry: SyncLedgerEntry) -> SyncLedgerEntry:
         existing = self.db.get(SyncLedgerEntry, (entry.sync_def_id, entry.source_identity_hash))
         if existing:
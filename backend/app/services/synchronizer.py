@@ -9,8 +9,9 @@ from sqlalchemy.dialects.postgresql import insert
 
 from app.models.core import SyncDefinition, SyncCursor, SharePointConnection, SyncTarget, SyncSource, SyncLedgerEntry
 from app.services.sharepoint_content import SharePointContentService
-from app.services.graph import GraphClient
+from app.services.graph import shared_graph_client
 from app.services.database import DatabaseClient
+from app.services.state import LedgerService
 import os
 
 class Synchronizer:
@@ -57,7 +58,7 @@ class Synchronizer:
         # Use target site_id or env fallback
         site_id = target.site_id or os.environ.get("SHAREPOINT_SITE_ID", "")
         
-        graph = GraphClient(
+        graph = shared_graph_client(
             tenant_id=conn.tenant_id,
             client_id=conn.client_id,
             client_secret=real_secret, 
@@ -148,6 +149,18 @@ class Synchronizer:
             if fm.is_key and fm.source_column_name:
                 pg_pk_col = fm.source_column_name
 
+        # The page is planned first, then applied to the source table with a few
+        # set-based statements in one transaction (see DatabaseClient.write_batch)
+        inserts = []  # (sp_item_id, pg_data, content_hash)
+        updates = []  # (ledger_entry, pg_data, content_hash)
+        deleted_entries = []
+
+        # Resolve the page's SharePoint items to ledger entries in one query
+        ledger = LedgerService(self.db)
+        ledger_entries = ledger.get_entries_by_sp_items(
+            sync_def.id, list_id, (change["id"] for change in changes if change.get("id"))
+        )
+
         for change in changes:
             sp_item_id = change.get("id") # String usually
             if not sp_item_id:
@@ -157,19 +170,13 @@ class Synchronizer:
             reason = change.get("reason")
             
             # Find in Ledger
-            ledger_entry = self.db.execute(select(SyncLedgerEntry).where(
-                SyncLedgerEntry.sync_def_id == sync_def.id,
-                SyncLedgerEntry.sp_list_id == list_id,
-                SyncLedgerEntry.sp_item_id == int(sp_item_id)
-            )).scalars().first()
+            ledger_entry = ledger_entries.get(int(sp_item_id))
 
             if reason == "deleted":
                 if ledger_entry:
                     # Delete from Source
                     # Verify we should propagate delete? Assuming yes for 2-way.
-                    db_client.delete_row(schema_name, table_name, pg_pk_col, ledger_entry.source_identity)
-                    # Remove from Ledger
-                    self.db.delete(ledger_entry)
+                    deleted_entries.append(ledger_entry)
                 count += 1
                 continue
             
@@ -189,13 +196,26 @@ class Synchronizer:
 
             if ledger_entry:
                 # Existing Item
-                # Check Conflict
-                conflict = False
-                
-                # Fetch current state from Source to detect concurrent changes
-                current_row = db_client.fetch_row(schema_name, table_name, pg_pk_col, ledger_entry.source_identity)
+                updates.append((ledger_entry, pg_data, content_hash))
+            else:
+                # New Item (Insert)
+                # We need to generate a source identity (if not auto-inc) or let DB handle it.
+                # If DB handles ID (Auto-inc), we insert and get ID back.
                 
-                if current_row and sync_def.conflict_policy == "SOURCE_WINS":
+                # Filter pg_data to remove PK if it's auto-inc (usually 'id' is, unless we map it)
+                # If we have a value for PK in pg_data, we try to insert it (maybe it was migrated).
+                # But usually new SP item doesn't have Source ID.
+                # So we insert.
+                inserts.append((sp_item_id, pg_data, content_hash))
+                count += 1
+
+        if updates and sync_def.conflict_policy == "SOURCE_WINS":
+            # Fetch current state from Source to detect concurrent changes (one query for the page)
+            current_rows = db_client.fetch_rows(schema_name, table_name, pg_pk_col, [entry.source_identity for entry, _, _ in updates])
+            accepted = []
+            for ledger_entry, pg_data, content_hash in updates:
+                current_row = current_rows.get(str(ledger_entry.source_identity))
+                if current_row:
                      # Filter current row to mapped cols to compare hash
                      current_mapped = {k: v for k, v in current_row.items() if k in pg_data}
                      current_source_hash = self._compute_content_hash(current_mapped)
@@ -207,50 +227,62 @@ class Synchronizer:
                          # TODO: Log conflict or raise alert
                          print(f"Conflict detected for {ledger_entry.source_identity}. Source changed. SOURCE_WINS -> Skip Ingress.")
                          continue
+                accepted.append((ledger_entry, pg_data, content_hash))
+            updates = accepted
+        count += len(updates)
 
-                # Apply Update (DESTINATION_WINS or Source didn't change)
-                updated_row = db_client.update_row(schema_name, table_name, pg_pk_col, ledger_entry.source_identity, pg_data)
-                
-                # Update Ledger
-                ledger_entry.content_hash = content_hash
-                ledger_entry.last_sync_ts = datetime.utcnow()
-                ledger_entry.provenance = "PULL"
+        # Apply Inserts, Updates (DESTINATION_WINS or Source didn't change) and Deletes
+        written = db_client.write_batch(
+            schema_name,
+            table_name,
+            pg_pk_col,
+            inserts=[pg_data for _, pg_data, _ in inserts],
+            updates=[(entry.source_identity, pg_data) for entry, pg_data, _ in updates],
+            deletes=[entry.source_identity for entry in deleted_entries]
+        )
+
+        # Ledger changes for the page are written in the same pass
+        ledger_rows = []
+        for ledger_entry, pg_data, content_hash in updates:
+            # Update Ledger
+            ledger_rows.append({
+                "sync_def_id": sync_def.id,
+                "source_identity_hash": ledger_entry.source_identity_hash,
+                "source_identity": ledger_entry.source_identity,
+                "source_key_strategy": ledger_entry.source_key_strategy,
+                "source_instance_id": ledger_entry.source_instance_id,
+                "sp_list_id": ledger_entry.sp_list_id,
+                "sp_item_id": ledger_entry.sp_item_id,
+                "content_hash": content_hash,
+                "last_sync_ts": datetime.utcnow(),
+                "provenance": "PULL",
+            })
+
+        for (sp_item_id, pg_data, content_hash), inserted_row in zip(inserts, written["inserted"]):
+            if inserted_row:
+                new_id = str(inserted_row.get(pg_pk_col))
                 
-            else:
-                # New Item (Insert)
-                # We need to generate a source identity (if not auto-inc) or let DB handle it.
-                # If DB handles ID (Auto-inc), we insert and get ID back.
+                # Create Ledger Entry
+                # Identity Hash is SHA256 of the ID
+                id_hash = hashlib.sha256(new_id.encode()).hexdigest()
                 
-                # Filter pg_data to remove PK if it's auto-inc (usually 'id' is, unless we map it)
-                # If we have a value for PK in pg_data, we try to insert it (maybe it was migrated).
-                # But usually new SP item doesn't have Source ID.
-                # So we insert.
-                inserted_row = db_client.insert_row(schema_name, table_name, pg_data)
-                
-                if inserted_row:
-                    new_id = str(inserted_row.get(pg_pk_col))
-                    
-                    # Create Ledger Entry
-                    # Identity Hash is SHA256 of the ID
-                    id_hash = hashlib.sha256(new_id.encode()).hexdigest()
-                    
-                    new_entry = SyncLedgerEntry(
-                        sync_def_id=sync_def.id,
-                        source_identity_hash=id_hash,
-                        source_identity=new_id,
-                        source_key_strategy="PRIMARY_KEY",
-                        source_instance_id=instance_id,
-                        sp_list_id=list_id,
-                        sp_item_id=int(sp_item_id),
-                        content_hash=content_hash,
-                        last_source_ts=datetime.utcnow(),
-                        last_sync_ts=datetime.utcnow(),
-                        provenance="PULL"
-                    )
-                    self.db.add(new_entry)
-            
-            count += 1
-        
+                ledger_rows.append({
+                    "sync_def_id": sync_def.id,
+                    "source_identity_hash": id_hash,
+                    "source_identity": new_id,
+                    "source_key_strategy": "PRIMARY_KEY",
+                    "source_instance_id": instance_id,
+                    "sp_list_id": list_id,
+                    "sp_item_id": int(sp_item_id),
+                    "content_hash": content_hash,
+                    "last_source_ts": datetime.utcnow(),
+                    "last_sync_ts": datetime.utcnow(),
+                    "provenance": "PULL",
+                })
+
+        ledger.upsert_entries(ledger_rows)
+        # Remove from Ledger
+        ledger.delete_entries(sync_def.id, [entry.source_identity_hash for entry in deleted_entries])
         self.db.commit()
         return count
 
@@ -0,0 +1,176 @@
+import os
+import time
+import random
+import logging
+import threading
+from typing import Dict, Optional
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+# Requests/second a tenant starts at, and the bounds the controller may move within
+THROTTLE_INITIAL_RATE = float(os.environ.get("GRAPH_THROTTLE_INITIAL_RATE", "10"))
+THROTTLE_MIN_RATE = float(os.environ.get("GRAPH_THROTTLE_MIN_RATE", "0.5"))
+THROTTLE_MAX_RATE = float(os.environ.get("GRAPH_THROTTLE_MAX_RATE", "100"))
+# Token bucket size: how many requests may go out back-to-back
+THROTTLE_BURST = float(os.environ.get("GRAPH_THROTTLE_BURST", "20"))
+# AIMD: rate grows by ~INCREASE req/s per second of clean traffic, and is multiplied by DECREASE on 429/503
+THROTTLE_INCREASE = float(os.environ.get("GRAPH_THROTTLE_INCREASE", "1"))
+THROTTLE_DECREASE = float(os.environ.get("GRAPH_THROTTLE_DECREASE", "0.5"))
+# Longest single wait after a throttled response
+THROTTLE_MAX_BACKOFF = float(os.environ.get("GRAPH_THROTTLE_MAX_BACKOFF", "60"))
+
+# After a Redis failure, run unshared for this long before trying Redis again
+REDIS_RETRY_INTERVAL = 30
+
+# Token bucket reservation. Uses Redis TIME so every worker shares one clock.
+# ARGV[3] is the number of tokens the request costs (a $batch call costs one per sub-request).
+# Returns "0" when the tokens were taken, otherwise the seconds to wait (nothing consumed).
+_RESERVE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local blocked = tonumber(redis.call('HGET', KEYS[1], 'blocked_until') or '0')
+if blocked > now then
+    return tostring(blocked - now)
+end
+local rate = tonumber(redis.call('HGET', KEYS[1], 'rate') or ARGV[1])
+local burst = tonumber(ARGV[2])
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens') or ARGV[2])
+local ts = tonumber(redis.call('HGET', KEYS[1], 'ts') or tostring(now))
+local cost = math.min(tonumber(ARGV[3]), burst)
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now), 'rate', tostring(rate))
+redis.call('EXPIRE', KEYS[1], 3600)
+return tostring(wait)
+"""
+
+# Additive increase, spread over requests so the rate grows ~INCREASE per second
+_SUCCESS_SCRIPT = """
+local rate = tonumber(redis.call('HGET', KEYS[1], 'rate') or ARGV[1])
+rate = math.min(tonumber(ARGV[3]), rate + tonumber(ARGV[2]) / rate)
+redis.call('HSET', KEYS[1], 'rate', tostring(rate))
+redis.call('EXPIRE', KEYS[1], 3600)
+return tostring(rate)
+"""
+
+# Multiplicative decrease plus a tenant-wide pause honouring Retry-After
+_THROTTLED_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local rate = tonumber(redis.call('HGET', KEYS[1], 'rate') or ARGV[1])
+rate = math.max(tonumber(ARGV[3]), rate * tonumber(ARGV[2]))
+local blocked = tonumber(redis.call('HGET', KEYS[1], 'blocked_until') or '0')
+blocked = math.max(blocked, now + tonumber(ARGV[4]))
+redis.call('HSET', KEYS[1], 'rate', tostring(rate), 'blocked_until', tostring(blocked), 'tokens', '0', 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], 3600)
+return tostring(rate)
+"""
+
+
+class TenantThrottle:
+    """
+    Adaptive (AIMD) token-bucket rate controller for one Graph tenant.
+    State lives in Redis so every thread, worker and node calling the same
+    tenant shares the learned rate and any Retry-After pause. If Redis is
+    unreachable the controller degrades to a per-process pause only.
+    """
+    def __init__(self, tenant_id: str, redis_client: redis.Redis):
+        self.tenant_id = tenant_id
+        self.redis = redis_client
+        self.key = f"arcore:graph:throttle:{tenant_id}"
+        self._reserve = redis_client.register_script(_RESERVE_SCRIPT)
+        self._success = redis_client.register_script(_SUCCESS_SCRIPT)
+        self._throttled = redis_client.register_script(_THROTTLED_SCRIPT)
+        self._local_blocked_until = 0.0
+        self._redis_down_until = 0.0
+
+    def _redis_available(self) -> bool:
+        return time.time() >= self._redis_down_until
+
+    def _redis_failed(self, e: Exception) -> None:
+        logger.warning(f"Graph throttle for tenant {self.tenant_id} running without Redis: {e}")
+        self._redis_down_until = time.time() + REDIS_RETRY_INTERVAL
+
+    def reserve(self, cost: int = 1) -> float:
+        """
+        Tries to take `cost` request slots. Returns 0 when the caller may send now,
+        otherwise the number of seconds to wait before calling reserve() again.
+        """
+        local_wait = self._local_blocked_until - time.time()
+        if local_wait > 0:
+            return local_wait
+        if not self._redis_available():
+            return 0.0
+        try:
+            return float(self._reserve(keys=[self.key], args=[THROTTLE_INITIAL_RATE, THROTTLE_BURST, cost]))
+        except redis.exceptions.RedisError as e:
+            self._redis_failed(e)
+            return 0.0
+
+    def acquire(self, cost: int = 1) -> None:
+        """Blocks until `cost` request slots are available."""
+        while True:
+            wait = self.reserve(cost)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def on_success(self) -> None:
+        if not self._redis_available():
+            return
+        try:
+            self._success(keys=[self.key], args=[THROTTLE_INITIAL_RATE, THROTTLE_INCREASE, THROTTLE_MAX_RATE])
+        except redis.exceptions.RedisError as e:
+            self._redis_failed(e)
+
+    def on_throttled(self, retry_after: Optional[float]) -> None:
+        """
+        Records a 429/503: halves the tenant rate and pauses every caller of
+        this tenant for Retry-After seconds.
+        """
+        pause = min(float(retry_after or 0), THROTTLE_MAX_BACKOFF)
+        self._local_blocked_until = max(self._local_blocked_until, time.time() + pause)
+        if not self._redis_available():
+            return
+        try:
+            self._throttled(keys=[self.key], args=[THROTTLE_INITIAL_RATE, THROTTLE_DECREASE, THROTTLE_MIN_RATE, pause])
+        except redis.exceptions.RedisError as e:
+            self._redis_failed(e)
+
+    @staticmethod
+    def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Seconds to wait before retry number `attempt` (0-based). Honours Retry-After
+        when given; otherwise exponential. Jitter keeps workers from retrying in lockstep.
+        """
+        if retry_after:
+            return min(float(retry_after), THROTTLE_MAX_BACKOFF) + random.uniform(0, 1)
+        return min(2 ** attempt, THROTTLE_MAX_BACKOFF) * random.uniform(0.5, 1.5)
+
+
+_throttle_lock = threading.Lock()
+_throttles: Dict[str, TenantThrottle] = {}
+_redis_client: Optional[redis.Redis] = None
+
+def get_tenant_throttle(tenant_id: str) -> TenantThrottle:
+    """Returns the process-wide TenantThrottle for a tenant."""
+    global _redis_client
+    with _throttle_lock:
+        throttle = _throttles.get(tenant_id)
+        if throttle is None:
+            if _redis_client is None:
+                _redis_client = redis.Redis.from_url(
+                    os.environ.get("REDIS_URL", "redis://localhost:6379/0"),
+                    socket_connect_timeout=1,
+                    socket_timeout=1,
+                )
+            throttle = TenantThrottle(tenant_id, _redis_client)
+            _throttles[tenant_id] = throttle
+        return throttle
@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.signals import worker_process_shutdown
 
 # Use env vars or defaults
 redis_url = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
@@ -24,3 +25,11 @@ celery_app.conf.update(
         # "app.worker.tasks.generate_drift_report": {"queue": "reports_queue"},
     }
 )
+
+@worker_process_shutdown.connect
+def close_source_pools_on_shutdown(**kwargs):
+    # Source pools are opened lazily inside each worker process; close them with it
+    from app.services.database import close_source_pools
+    from app.services.graph import clear_graph_clients
+    close_source_pools()
+    clear_graph_clients()
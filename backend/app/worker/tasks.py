@@ -1,3 +1,11 @@
+import asyncio
+from uuid import UUID
+from celery.utils.log import get_task_logger
+from app.worker.celery_app import celery_app
+from app.db.session import SessionLocal
+from app.models.core import SyncDefinition
+from app.services.pusher import Pusher, PUSH_ASYNC
+from app.services.synchronizer import Synchronizer
 from app.services.run_history import RunHistoryService
 
 logger = get_task_logger(__name__)
@@ -20,7 +28,10 @@ def run_push_sync(self, sync_def_id: str):
         run = history_service.start_run(sync_def.id, "PUSH")
         
         pusher = Pusher(db)
-        result = pusher.run_push(sync_def.id)
+        if PUSH_ASYNC == "on":
+            result = asyncio.run(pusher.run_push_async(sync_def.id))
+        else:
+            result = pusher.run_push(sync_def.id)
         
         logger.info(f"Push sync for {sync_def_id} completed successfully: {result}")
         history_service.end_run(run.id, "COMPLETED", items_processed=result.get("processed_count", 0))
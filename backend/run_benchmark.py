@@ -108,12 +108,13 @@ def run_benchmark():
         
         original_get_content = pusher._get_content_service
         
-        def mock_get_content(target):
+        def mock_get_content(connection_id, site_id):
             from app.services.sharepoint_content import SharePointContentService
             svc = SharePointContentService(mock_graph)
-            # Mock create_item to be fast
-            svc.create_item = MagicMock(return_value="100")
-            svc.update_item = MagicMock()
+            # Mock batched writes to be fast
+            svc.write_items = MagicMock(side_effect=lambda site, ops: [
+                {"success": True, "status": 201, "id": "100", "error": None} for _ in ops
+            ])
             return svc, "mock-site"
             
         pusher._get_content_service = mock_get_content
@@ -0,0 +1,304 @@
+"""
+Microbenchmark: PgOutputDecoder against the previous slice-based decoder.
+
+    python scripts/bench_pgoutput.py                       # synthetic wide-table stream
+    python scripts/bench_pgoutput.py --redis 50000 --save stream.bin
+    python scripts/bench_pgoutput.py stream.bin            # replay a recorded stream
+    python scripts/bench_pgoutput.py --formats             # text vs binary columns, typed 50-column table
+
+Recordings are a sequence of Int32 length + pgoutput payload. --redis records the
+newest entries of each CDC partition stream (oldest first, so RELATIONs precede rows).
+"""
+import argparse
+import os
+import random
+import struct
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+
+# Add backend to path (supports repo root or backend dir execution)
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(BACKEND_ROOT))
+
+from app.services.pgoutput import PgOutputDecoder
+
+
+class SliceDecoder:
+    """The decoder as it was before the memoryview rewrite, kept as the baseline."""
+    def __init__(self):
+        self.relations = {}
+
+    def decode(self, payload):
+        msg_type = chr(payload[0])
+        data = payload[1:]
+        if msg_type == 'R':
+            return self._decode_relation(data)
+        elif msg_type in ('I', 'D'):
+            rel_id, offset = self._read_int32(data, 0)
+            row, offset = self._decode_tuple(data, offset + 1, rel_id)
+            return {"type": "INSERT" if msg_type == 'I' else "DELETE", "relation_id": rel_id, "data": row}
+        elif msg_type == 'U':
+            rel_id, offset = self._read_int32(data, 0)
+            sub_type = chr(data[offset])
+            offset += 1
+            old_row = None
+            if sub_type in ('K', 'O'):
+                old_row, offset = self._decode_tuple(data, offset, rel_id)
+                offset += 1
+            row, offset = self._decode_tuple(data, offset, rel_id)
+            return {"type": "UPDATE", "relation_id": rel_id, "data": row, "old_data": old_row}
+        return {"type": "UNKNOWN", "code": msg_type}
+
+    def _read_int32(self, data, offset):
+        return struct.unpack('>i', data[offset:offset+4])[0], offset + 4
+
+    def _read_string(self, data, offset):
+        end = data.find(b'\0', offset)
+        return data[offset:end].decode('utf-8'), end + 1
+
+    def _decode_relation(self, data):
+        rel_id, offset = self._read_int32(data, 0)
+        namespace, offset = self._read_string(data, offset)
+        name, offset = self._read_string(data, offset)
+        offset += 1
+        num_cols = struct.unpack('>h', data[offset:offset+2])[0]
+        offset += 2
+        columns = []
+        for _ in range(num_cols):
+            flags = data[offset]
+            offset += 1
+            col_name, offset = self._read_string(data, offset)
+            col_type, offset = self._read_int32(data, offset)
+            type_mod, offset = self._read_int32(data, offset)
+            columns.append({"name": col_name, "type": col_type, "key": bool(flags & 1)})
+        self.relations[rel_id] = {"schema": namespace, "table": name, "columns": columns}
+        return {"type": "RELATION", "id": rel_id}
+
+    def _decode_tuple(self, data, offset, rel_id):
+        num_cols = struct.unpack('>h', data[offset:offset+2])[0]
+        offset += 2
+        row = {}
+        columns = self.relations.get(rel_id, {}).get("columns", [])
+        for i in range(num_cols):
+            col_type = chr(data[offset])
+            offset += 1
+            val = None
+            if col_type == 't':
+                length, offset = self._read_int32(data, offset)
+                val = data[offset:offset+length].decode('utf-8')
+                offset += length
+            row[columns[i]["name"] if i < len(columns) else f"col_{i}"] = val
+        return row, offset
+
+
+def synthetic_stream(rows: int, columns: int):
+    """One RELATION, then a mix of inserts and key+row updates on a wide table."""
+    rng = random.Random(42)
+    rel_id = 16384
+
+    def cstr(value):
+        return value.encode() + b'\0'
+
+    relation = struct.pack('>i', rel_id) + cstr("public") + cstr("wide_table") + b'd' + struct.pack('>h', columns)
+    for i in range(columns):
+        relation += struct.pack('>b', 1 if i == 0 else 0) + cstr(f"column_{i}") + struct.pack('>ii', 25, -1)
+    payloads = [b'R' + relation]
+
+    def tuple_data(values):
+        body = struct.pack('>h', len(values))
+        for value in values:
+            if value is None:
+                body += b'n'
+            else:
+                raw = value.encode()
+                body += b't' + struct.pack('>i', len(raw)) + raw
+        return body
+
+    for n in range(rows):
+        values = [str(n)] + [
+            None if rng.random() < 0.1 else "x" * rng.randint(1, 40)
+            for _ in range(columns - 1)
+        ]
+        if n % 3:
+            payloads.append(b'I' + struct.pack('>i', rel_id) + b'N' + tuple_data(values))
+        else:
+            payloads.append(b'U' + struct.pack('>i', rel_id) + b'N' + tuple_data(values))
+    return payloads
+
+
+# (type OID, value generator, text output, binary send output) for the --formats table
+_PG_EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+def _numeric_send(value: Decimal) -> bytes:
+    int_part, _, frac = format(abs(value), 'f').partition('.')
+    int_part = int_part.lstrip('0')
+    int_part = int_part.zfill(-(-len(int_part) // 4) * 4)
+    frac_digits = frac.ljust(-(-len(frac) // 4) * 4, '0')
+    groups = [int(int_part[i:i + 4]) for i in range(0, len(int_part), 4)]
+    weight = len(groups) - 1
+    groups += [int(frac_digits[i:i + 4]) for i in range(0, len(frac_digits), 4)]
+    while groups and groups[0] == 0:
+        groups.pop(0)
+        weight -= 1
+    while groups and groups[-1] == 0:
+        groups.pop()
+    sign = 0x4000 if value < 0 else 0
+    return struct.pack(f'>hhHh{len(groups)}h', len(groups), weight, sign, len(frac), *groups)
+
+_TYPED_COLUMNS = [
+    (23, lambda rng: rng.randint(-2 ** 31, 2 ** 31 - 1), str, lambda v: struct.pack('>i', v)),
+    (20, lambda rng: rng.randint(-2 ** 63, 2 ** 63 - 1), str, lambda v: struct.pack('>q', v)),
+    (701, lambda rng: rng.uniform(-1e6, 1e6), repr, lambda v: struct.pack('>d', v)),
+    (1700, lambda rng: Decimal(rng.randint(-10 ** 9, 10 ** 9)).scaleb(-2), str, _numeric_send),
+    (1700, lambda rng: Decimal(rng.randint(0, 10 ** 6)).scaleb(-4), str, _numeric_send),
+    (16, lambda rng: rng.random() < 0.5, lambda v: "t" if v else "f", lambda v: b'\x01' if v else b'\x00'),
+    (1184, lambda rng: _PG_EPOCH + timedelta(microseconds=rng.randint(0, 10 ** 15)),
+     lambda v: v.isoformat(sep=" "), lambda v: struct.pack('>q', (v - _PG_EPOCH) // timedelta(microseconds=1))),
+    (2950, lambda rng: uuid.UUID(int=rng.getrandbits(128)), str, lambda v: v.bytes),
+    (25, lambda rng: "x" * rng.randint(1, 20), str, str.encode),
+]
+
+
+def typed_stream(rows: int, columns: int, binary: bool, types=_TYPED_COLUMNS):
+    """A RELATION and inserts on a numeric-heavy table, values in text or binary format."""
+    rng = random.Random(42)
+    rel_id = 16385
+    types = [types[i % len(types)] for i in range(columns)]
+
+    relation = struct.pack('>i', rel_id) + b"public\0typed_table\0" + b'd' + struct.pack('>h', columns)
+    for i, (oid, *_) in enumerate(types):
+        relation += struct.pack('>b', 1 if i == 0 else 0) + f"column_{i}\0".encode() + struct.pack('>ii', oid, -1)
+    payloads = [b'R' + relation]
+
+    for _ in range(rows):
+        body = struct.pack('>h', columns)
+        for oid, generate, text, send in types:
+            value = generate(rng)
+            raw = send(value) if binary else text(value).encode()
+            body += (b'b' if binary else b't') + struct.pack('>i', len(raw)) + raw
+        payloads.append(b'I' + struct.pack('>i', rel_id) + b'N' + body)
+    return payloads
+
+
+def compare_formats(rows: int, columns: int, repeat: int) -> None:
+    streams = {label: typed_stream(rows, columns, label == "binary") for label in ("text", "binary")}
+
+    # Both formats must decode to the same values
+    text_decoder, binary_decoder = PgOutputDecoder(), PgOutputDecoder()
+    for text_payload, binary_payload in zip(streams["text"], streams["binary"]):
+        if text_decoder.decode(text_payload) != binary_decoder.decode(binary_payload):
+            raise SystemExit(f"Formats disagree on {text_payload[:16]!r}...")
+
+    print(f"{rows} inserts x {columns} columns, best of {repeat}")
+    baseline = None
+    for label, payloads in streams.items():
+        elapsed = bench(PgOutputDecoder, payloads, repeat)
+        baseline = baseline or elapsed
+        total_bytes = sum(len(p) for p in payloads)
+        print(f"  {label:<7} {total_bytes / 1e6:6.1f} MB  {elapsed:7.3f}s  {rows / elapsed:>10,.0f} msg/s  x{baseline / elapsed:.2f}")
+
+    # Per type: which columns gain from binary and which are faster parsed from text
+    print("  per value (us)   text  binary")
+    sample = max(rows // 10, 1)
+    for column_type in _TYPED_COLUMNS:
+        text_time, binary_time = (
+            bench(PgOutputDecoder, typed_stream(sample, columns, binary, [column_type]), repeat) / (sample * columns) * 1e6
+            for binary in (False, True)
+        )
+        print(f"    oid {column_type[0]:<7} {text_time:7.3f} {binary_time:7.3f}")
+
+
+def read_recording(path: str):
+    payloads = []
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = 0
+    while offset < len(data):
+        length = struct.unpack_from('>i', data, offset)[0]
+        payloads.append(data[offset + 4:offset + 4 + length])
+        offset += 4 + length
+    return payloads
+
+
+def write_recording(path: str, payloads) -> None:
+    with open(path, "wb") as f:
+        for payload in payloads:
+            f.write(struct.pack('>i', len(payload)) + payload)
+
+
+def record_from_redis(count: int):
+    import redis
+    from app.services.cdc_partitions import all_stream_keys, unpack_messages
+
+    client = redis.Redis.from_url(os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
+    payloads = []
+    for stream_key in all_stream_keys():
+        for _, fields in reversed(client.xrevrange(stream_key, count=count)):
+            if not fields.get(b'payload'):
+                continue
+            # Transaction entries hold several framed messages
+            payloads.extend(unpack_messages(fields[b'payload']) if b'count' in fields else [fields[b'payload']])
+    return payloads
+
+
+def bench(decoder_cls, payloads, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        decoder = decoder_cls()
+        decode = decoder.decode
+        start = time.perf_counter()
+        for payload in payloads:
+            decode(payload)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", nargs="?", help="Recorded pgoutput stream")
+    parser.add_argument("--redis", type=int, metavar="COUNT", help="Record the newest COUNT entries per partition stream")
+    parser.add_argument("--save", help="Write the stream being benchmarked to this file")
+    parser.add_argument("--formats", action="store_true", help="Compare text and binary column formats")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--columns", type=int, help="Default: 40, or 50 with --formats")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.formats:
+        compare_formats(args.rows, args.columns or 50, args.repeat)
+        return
+
+    if args.recording:
+        payloads = read_recording(args.recording)
+    elif args.redis:
+        payloads = record_from_redis(args.redis)
+    else:
+        payloads = synthetic_stream(args.rows, args.columns or 40)
+    if args.save:
+        write_recording(args.save, payloads)
+
+    # Both decoders must agree before timing means anything. PgOutputDecoder converts
+    # typed columns, so only the values it leaves as text are compared.
+    old, new = SliceDecoder(), PgOutputDecoder()
+    for payload in payloads:
+        expected, actual = old.decode(payload), new.decode(payload)
+        if expected["type"] not in ("INSERT", "UPDATE", "DELETE"):
+            continue
+        if expected["data"].keys() != actual["data"].keys() or any(
+            isinstance(value, str) and value != expected["data"][col] for col, value in actual["data"].items()
+        ):
+            raise SystemExit(f"Decoders disagree on {payload[:16]!r}...")
+
+    total_bytes = sum(len(p) for p in payloads)
+    print(f"{len(payloads)} messages, {total_bytes / 1e6:.1f} MB, best of {args.repeat}")
+    baseline = bench(SliceDecoder, payloads, args.repeat)
+    for label, elapsed in (("slice", baseline), ("memoryview", bench(PgOutputDecoder, payloads, args.repeat))):
+        print(f"  {label:<11} {elapsed:7.3f}s  {len(payloads) / elapsed:>10,.0f} msg/s  x{baseline / elapsed:.2f}")
+
+
+if __name__ == "__main__":
+    main()
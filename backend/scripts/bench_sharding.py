@@ -0,0 +1,160 @@
+"""
+Microbenchmark: compiled ShardingEvaluator, row by row and with evaluate_batch,
+against the previous per-row parser.
+
+    python scripts/bench_sharding.py                        # 1M rows, 50 rules
+    python scripts/bench_sharding.py --rows 200000 --rules 20 --batch-size 1000
+
+The policy is a status fan-out (equality rules on one field) with a few range and
+compound rules mixed in. The previous evaluator is slow enough that it only routes
+--baseline-rows rows; both rates are reported per second.
+"""
+import argparse
+import operator
+import random
+import sys
+import time
+from pathlib import Path
+from uuid import UUID, uuid4
+
+# Add backend to path (supports repo root or backend dir execution)
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(BACKEND_ROOT))
+
+from app.services.sharding import ShardingEvaluator
+
+
+class ParsingEvaluator:
+    """The evaluator as it was before rules were compiled, kept as the baseline."""
+    def __init__(self, policy):
+        self.rules = policy.get("rules", [])
+        self.default_target = policy.get("default_target_list_id")
+
+    def _basic_eval(self, condition, row):
+        for sub in condition.split(' and '):
+            if not self._eval_single(sub.strip(), row):
+                return False
+        return True
+
+    def _eval_single(self, condition, row):
+        ops = {"==": operator.eq, "!=": operator.ne, ">=": operator.ge, "<=": operator.le, ">": operator.gt, "<": operator.lt}
+        found_op = None
+        for op_str in ops.keys():
+            if f" {op_str} " in condition:
+                found_op = op_str
+                break
+        if not found_op:
+            return False
+        field, val_str = condition.split(f" {found_op} ", 1)
+        field = field.strip()
+        val_str = val_str.strip()
+        if field not in row:
+            return False
+        comp_val = val_str
+        if val_str.startswith("'") and val_str.endswith("'"):
+            comp_val = val_str[1:-1]
+        elif val_str.isdigit():
+            comp_val = int(val_str)
+        elif val_str.replace('.', '', 1).isdigit():
+            comp_val = float(val_str)
+        return ops[found_op](row[field], comp_val)
+
+    def evaluate(self, row):
+        for rule in self.rules:
+            condition = rule.get("if")
+            target_id = rule.get("target_list_id")
+            if not condition or not target_id:
+                continue
+            try:
+                if self._basic_eval(condition, row):
+                    return UUID(target_id)
+            except Exception:
+                continue
+        if self.default_target:
+            return UUID(self.default_target)
+        return None
+
+
+def make_policy(rules: int):
+    """Range and compound rules first, then an equality fan-out on status."""
+    special = [
+        "priority > 90 and region == 'EU'",
+        "amount >= 99000",
+        "region == 'APAC' and amount < 100",
+        "priority <= 1",
+    ]
+    conditions = special[:min(len(special), rules // 10)]
+    conditions += [f"status == 'S{i}'" for i in range(rules - len(conditions))]
+    return {
+        "rules": [{"if": condition, "target_list_id": str(uuid4())} for condition in conditions],
+        "default_target_list_id": str(uuid4()),
+    }
+
+
+def make_rows(count: int, statuses: int):
+    rng = random.Random(42)
+    regions = ["EU", "US", "APAC"]
+    # Some statuses have no rule and fall through to the default
+    return [
+        {
+            "id": i,
+            "status": f"S{rng.randrange(statuses + statuses // 5)}",
+            "region": rng.choice(regions),
+            "priority": rng.randint(0, 100),
+            "amount": rng.uniform(0, 100000),
+        }
+        for i in range(count)
+    ]
+
+
+def bench(evaluator, rows) -> float:
+    evaluate = evaluator.evaluate
+    start = time.perf_counter()
+    for row in rows:
+        evaluate(row)
+    return time.perf_counter() - start
+
+
+def bench_batches(evaluator, rows, batch_size: int) -> float:
+    start = time.perf_counter()
+    for offset in range(0, len(rows), batch_size):
+        evaluator.evaluate_batch(rows[offset:offset + batch_size])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--rules", type=int, default=50)
+    parser.add_argument("--baseline-rows", type=int, default=20_000)
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows per evaluate_batch call")
+    args = parser.parse_args()
+
+    policy = make_policy(args.rules)
+    rows = make_rows(args.rows, args.rules)
+    baseline_rows = rows[:args.baseline_rows]
+
+    # Both evaluators must route identically before timing means anything
+    old, new = ParsingEvaluator(policy), ShardingEvaluator(policy)
+    for row in baseline_rows:
+        if old.evaluate(row) != new.evaluate(row):
+            raise SystemExit(f"Evaluators disagree on {row}")
+    for target, indices in new.evaluate_batch(baseline_rows).items():
+        if any(new.evaluate(baseline_rows[i]) != target for i in indices):
+            raise SystemExit(f"evaluate_batch disagrees with evaluate for target {target}")
+
+    start = time.perf_counter()
+    ShardingEvaluator(policy)
+    cached = time.perf_counter() - start
+
+    print(f"{args.rules} rules ({len(new.compiled.steps)} compiled steps), cached construction {cached * 1e6:.0f}us")
+    baseline = bench(old, baseline_rows) / len(baseline_rows)
+    compiled = bench(new, rows) / len(rows)
+    batched = bench_batches(new, rows, args.batch_size) / len(rows)
+    print(f"  parsing   {len(baseline_rows):>9,} rows  {1 / baseline:>12,.0f} rows/s")
+    print(f"  compiled  {len(rows):>9,} rows  {1 / compiled:>12,.0f} rows/s  x{baseline / compiled:.1f}  ({compiled * len(rows):.2f}s total)")
+    print(f"  batched   {len(rows):>9,} rows  {1 / batched:>12,.0f} rows/s  x{baseline / batched:.1f}  ({batched * len(rows):.2f}s total)")
+
+
+if __name__ == "__main__":
+    main()
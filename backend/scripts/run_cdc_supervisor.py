@@ -0,0 +1,20 @@
+import sys
+import signal
+from pathlib import Path
+
+# Add backend to path (supports repo root or backend dir execution)
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(BACKEND_ROOT))
+
+from app.db.session import SessionLocal
+from app.services.cdc_supervisor import CDCSupervisor
+
+def run_supervisor():
+    supervisor = CDCSupervisor(SessionLocal)
+    # Stop workers cleanly (final flush + checkpoint) on docker stop / Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: supervisor.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: supervisor.stop())
+    supervisor.run()
+
+if __name__ == "__main__":
+    run_supervisor()
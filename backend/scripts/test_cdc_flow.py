@@ -14,6 +14,7 @@ from app.db.session import SessionLocal
 from app.models.core import DatabaseInstance, SyncDefinition, SyncTarget, SharePointConnection, FieldMapping
 from app.services.cdc import CDCService
 from app.services.cdc_consumer import CDCConsumer
+from app.services.cdc_partitions import all_stream_keys
 from sqlalchemy import text # Added for raw SQL execution
 from unittest.mock import MagicMock
 
@@ -175,6 +176,9 @@ def test_cdc_flow():
     def mock_content_service_factory(_conn, _site_id, _list_id):
         service = MagicMock()
         service.create_item.return_value = "1"
+        service.write_items.side_effect = lambda site_id, ops: [
+            {"success": True, "status": 201, "id": "1", "error": None} for _ in ops
+        ]
         return service
 
     consumer = CDCConsumer(SessionLocal(), content_service_factory=mock_content_service_factory)
@@ -186,10 +190,9 @@ def test_cdc_flow():
     events = []
     found_insert_event = False
     for _ in range(20):
-        # Read from stream. Look for the INSERT event.
-        resp = r.xreadgroup(consumer.group_name, consumer.consumer_name, {consumer.stream_key: ">"}, count=10, block=1000)
-        if resp:
-            stream, messages = resp[0]
+        # Read from every partition stream. Look for the INSERT event.
+        resp = r.xreadgroup(consumer.group_name, consumer.consumer_name, {key: ">" for key in all_stream_keys()}, count=10, block=1000)
+        for stream, messages in resp or []:
             for message_id, data in messages:
                 payload = data.get(b'payload')
                 if payload:
@@ -197,14 +200,16 @@ def test_cdc_flow():
                     if decoded_event and decoded_event.get("type") == "INSERT" and decoded_event.get("data", {}).get("name") == "CDC_TEST_ITEM":
                         print(f"Found INSERT message {message_id} in Redis!")
                         events.append((message_id, data))
-                        consumer.redis.xack(consumer.stream_key, consumer.group_name, message_id) # Acknowledge
+                        consumer.redis.xack(stream, consumer.group_name, message_id) # Acknowledge
                         found_insert_event = True
                         break
                     else:
-                        # Acknowledge other messages like BEGIN/COMMIT so they don't block
-                        consumer.redis.xack(consumer.stream_key, consumer.group_name, message_id)
+                        # Acknowledge other messages like RELATION so they don't block
+                        consumer.redis.xack(stream, consumer.group_name, message_id)
             if found_insert_event:
                 break
+        if found_insert_event:
+            break
         time.sleep(0.5)
         
     if not found_insert_event:
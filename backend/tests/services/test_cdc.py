@@ -0,0 +1,169 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from uuid import uuid4
+from app.models.core import DatabaseInstance
+from app.services.cdc import CDCService
+from app.services.cdc_partitions import partition_for, partition_stream_key, unpack_messages
+from tests.services.test_cdc_consumer import (
+    relation_msg, insert_msg, begin_msg, commit_msg,
+    streamed, stream_start_msg, stream_stop_msg, stream_commit_msg, stream_abort_msg,
+)
+
+class TestProducerBuffering(unittest.TestCase):
+    def setUp(self):
+        patcher = patch('app.services.cdc.redis.Redis.from_url')
+        self.redis = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.pipe = self.redis.pipeline.return_value
+
+        self.db = MagicMock()
+        self.instance = DatabaseInstance(id=uuid4(), host="localhost", port=5432)
+        self.db.get.return_value = self.instance
+        self.service = CDCService(self.db, self.instance.id)
+        self.service._stream_backlog = MagicMock(return_value=0)
+        self.cur = MagicMock()
+
+    def _msg(self, payload, lsn):
+        return MagicMock(payload=payload, data_start=lsn)
+
+    def test_loop_flushes_once_when_caught_up_and_checkpoints(self):
+        messages = [self._msg(relation_msg([("sku", True)]), 10)] + [self._msg(insert_msg([f"P-{i}"]), 11 + i) for i in range(5)]
+
+        def read_message():
+            if messages:
+                return messages.pop(0)
+            self.service.stop_event.set()
+            return None
+        self.cur.read_message.side_effect = read_message
+
+        with patch('app.services.cdc.select.select'), self.assertRaises(StopIteration):
+            self.service._stream_loop(self.cur)
+
+        # RELATION hset + broadcast, and five row entries: all in one round trip
+        self.redis.pipeline.assert_called()
+        self.assertEqual(self.pipe.xadd.call_count, self.service.partitions + 5)
+        self.redis.xadd.assert_not_called()
+        self.cur.send_feedback.assert_called_once_with(flush_lsn=15)
+        self.assertEqual(self.instance.last_wal_lsn, "0/F")
+        self.db.commit.assert_called_once()
+
+    @patch('app.services.cdc.CDC_CHECKPOINT_INTERVAL_MS', 60000)
+    def test_checkpoints_are_throttled(self):
+        for lsn in (20, 21, 22):
+            self.service._handle_message(self._msg(insert_msg(["P-1"]), lsn))
+            self.service._flush(self.cur)
+
+        self.cur.send_feedback.assert_called_once_with(flush_lsn=20)
+        self.assertEqual(self.pipe.execute.call_count, 3)
+
+        self.service._flush(self.cur, force_checkpoint=True)
+        self.cur.send_feedback.assert_called_with(flush_lsn=22)
+
+    def test_failed_flush_does_not_move_lsn(self):
+        self.service._handle_message(self._msg(insert_msg(["P-1"]), 30))
+        self.pipe.execute.side_effect = ConnectionError("redis down")
+
+        with self.assertRaises(ConnectionError):
+            self.service._flush(self.cur)
+
+        self.cur.send_feedback.assert_not_called()
+        self.db.commit.assert_not_called()
+
+    def test_backpressure_waits_and_records_stall(self):
+        self.service._stream_backlog = MagicMock(side_effect=[20000, 20000, 5])
+        self.service.stop_event = MagicMock()
+        self.service.stop_event.wait.return_value = False
+        self.service._handle_message(self._msg(insert_msg(["P-1"]), 40))
+
+        self.service._flush(self.cur)
+
+        self.assertEqual(self.service.stop_event.wait.call_count, 2)
+        self.assertEqual(self.cur.send_feedback.call_args_list[0][1], {}) # keepalive while stalled
+        self.pipe.execute.assert_called_once()
+        self.assertGreaterEqual(self.service.stall_seconds_total, 0)
+        stats = self.redis.hset.call_args[1]["mapping"]
+        self.assertEqual((stats["backlog"], stats["stalled_since"]), (5, 0))
+
+    @patch('app.services.cdc.CDC_BACKLOG_CHECK_INTERVAL_MS', 60000)
+    def test_backlog_check_is_throttled_until_over_limit(self):
+        self.service._stream_backlog = MagicMock(return_value=5)
+        for lsn in (41, 42):
+            self.service._handle_message(self._msg(insert_msg(["P-1"]), lsn))
+            self.service._flush(self.cur)
+        self.service._stream_backlog.assert_called_once()
+
+        # Once found over the limit it is re-checked on the next flush, despite the interval
+        self.service._backlog = 20000
+        self.service._handle_message(self._msg(insert_msg(["P-1"]), 43))
+        self.service._flush(self.cur)
+        self.assertEqual(self.service._stream_backlog.call_count, 2)
+        self.assertEqual(self.pipe.execute.call_count, 3)
+
+    def test_stop_while_stalled_does_not_flush(self):
+        self.service._stream_backlog = MagicMock(return_value=20000)
+        self.service.stop_event = MagicMock()
+        self.service.stop_event.wait.return_value = True
+        self.service._handle_message(self._msg(insert_msg(["P-1"]), 50))
+
+        self.service._flush(self.cur)
+
+        self.pipe.execute.assert_not_called()
+        self.db.commit.assert_not_called()
+
+    def test_transaction_grouped_per_partition_at_commit(self):
+        self.service._handle_message(self._msg(relation_msg([("sku", True), ("name", False)]), 60))
+        self.service._handle_message(self._msg(begin_msg(700, 80), 61))
+        rows = [insert_msg([f"P-{i}", "v"]) for i in range(6)]
+        for i, row in enumerate(rows):
+            self.service._handle_message(self._msg(row, 62 + i))
+
+        # Nothing from an open transaction is written, and the LSN does not move
+        self.service._flush(self.cur)
+        self.assertEqual(self.pipe.xadd.call_count, self.service.partitions) # RELATION broadcast only
+        self.cur.send_feedback.assert_not_called()
+
+        self.pipe.xadd.reset_mock()
+        self.service._handle_message(self._msg(commit_msg(80), 70))
+        self.service._flush(self.cur)
+
+        entries = {c[0][0]: c[0][1] for c in self.pipe.xadd.call_args_list}
+        expected = {}
+        for i, row in enumerate(rows):
+            expected.setdefault(partition_stream_key(partition_for("public", "products", [f"P-{i}"], self.service.partitions)), []).append(row)
+        self.assertEqual(set(entries), set(expected))
+        for stream_key, entry in entries.items():
+            self.assertEqual((entry["lsn"], entry["xid"], entry["count"]), (80, 700, len(expected[stream_key])))
+            self.assertEqual(unpack_messages(entry["payload"]), expected[stream_key])
+        self.cur.send_feedback.assert_called_once_with(flush_lsn=70)
+
+    def test_streamed_transaction_staged_until_commit(self):
+        staged = []
+        self.pipe.rpush.side_effect = lambda key, chunk: staged.append(chunk)
+        self.redis.lrange.side_effect = lambda key, start, end: staged[start:end + 1]
+
+        self.service._handle_message(self._msg(stream_start_msg(900), 60))
+        self.service._handle_message(self._msg(streamed(relation_msg([("sku", True), ("name", False)]), 900), 61))
+        self.service._handle_message(self._msg(streamed(insert_msg(["P-1", "v"]), 900), 62))
+        self.service._handle_message(self._msg(streamed(insert_msg(["P-2", "v"]), 901), 63))
+        self.service._handle_message(self._msg(stream_stop_msg(), 64))
+        # A subtransaction rolled back: its changes are never published
+        self.service._handle_message(self._msg(stream_abort_msg(900, 901), 65))
+        self.service._flush(self.cur)
+
+        self.assertEqual(len(staged), 2)
+        self.assertEqual(self.pipe.xadd.call_count, self.service.partitions) # RELATION broadcast only
+        self.cur.send_feedback.assert_not_called()
+
+        self.pipe.xadd.reset_mock()
+        self.service._handle_message(self._msg(stream_commit_msg(900, 90), 66))
+        self.service._flush(self.cur)
+
+        entries = [c[0] for c in self.pipe.xadd.call_args_list]
+        self.assertEqual(len(entries), 1)
+        stream_key, entry = entries[0]
+        self.assertEqual(stream_key, partition_stream_key(partition_for("public", "products", ["P-1"], self.service.partitions)))
+        self.assertEqual((entry["lsn"], entry["xid"], entry["count"]), (90, 900, 1))
+        # Stored in the non-streamed layout the consumers decode
+        self.assertEqual(unpack_messages(entry["payload"]), [insert_msg(["P-1", "v"])])
+        self.pipe.delete.assert_called_with("arcore:cdc:events:staging:%s:900" % self.instance.id)
+        self.cur.send_feedback.assert_called_once_with(flush_lsn=66)
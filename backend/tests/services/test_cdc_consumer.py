@@ -0,0 +1,400 @@
+import hashlib
+import struct
+import unittest
+from unittest.mock import MagicMock, patch
+from uuid import uuid4
+from app.models.core import SyncDefinition, SyncLedgerEntry, FieldMapping
+from app.services.cdc_consumer import CDCConsumer, CDCWriteError
+from app.services.cdc_partitions import pack_messages
+
+REL_ID = 16384
+
+def _cstr(value):
+    return value.encode() + b'\0'
+
+def relation_msg(columns):
+    # Byte1('R'), Int32(ID), String(Namespace), String(Name), Int8(ReplicaIdent), Int16(NumCols), columns
+    body = struct.pack('>i', REL_ID) + _cstr("public") + _cstr("products") + b'd' + struct.pack('>h', len(columns))
+    for name, is_key, *type_oid in columns:
+        # Optional third element: column type OID (default text)
+        body += struct.pack('>b', 1 if is_key else 0) + _cstr(name) + struct.pack('>ii', type_oid[0] if type_oid else 25, -1)
+    return b'R' + body
+
+# Marks an unchanged TOAST value ('u') in tuple_data
+UNCHANGED = object()
+
+def tuple_data(values):
+    body = struct.pack('>h', len(values))
+    for value in values:
+        if value is None:
+            body += b'n'
+        elif value is UNCHANGED:
+            body += b'u'
+        else:
+            raw = str(value).encode()
+            body += b't' + struct.pack('>i', len(raw)) + raw
+    return body
+
+def insert_msg(values):
+    return b'I' + struct.pack('>i', REL_ID) + b'N' + tuple_data(values)
+
+def update_msg(values):
+    return b'U' + struct.pack('>i', REL_ID) + b'N' + tuple_data(values)
+
+def delete_msg(values):
+    return b'D' + struct.pack('>i', REL_ID) + b'K' + tuple_data(values)
+
+def begin_msg(xid, final_lsn=0):
+    return b'B' + struct.pack('>qqi', final_lsn, 0, xid)
+
+def commit_msg(commit_lsn):
+    return b'C' + struct.pack('>bqqq', 0, commit_lsn, commit_lsn + 1, 0)
+
+# Protocol v2 streaming
+def streamed(payload, xid):
+    # Inside a stream block a change message carries its (sub)transaction xid after the type byte
+    return payload[:1] + struct.pack('>i', xid) + payload[1:]
+
+def stream_start_msg(xid, first_segment=True):
+    return b'S' + struct.pack('>ib', xid, 1 if first_segment else 0)
+
+def stream_stop_msg():
+    return b'E'
+
+def stream_commit_msg(xid, commit_lsn):
+    return b'c' + struct.pack('>ibqqq', xid, 0, commit_lsn, commit_lsn + 1, 0)
+
+def stream_abort_msg(xid, subxid):
+    return b'A' + struct.pack('>ii', xid, subxid)
+
+class TestCDCConsumerBatch(unittest.TestCase):
+    def setUp(self):
+        patcher = patch('app.services.cdc_consumer.redis.Redis.from_url')
+        self.mock_redis = patcher.start().return_value
+        self.mock_redis.xautoclaim.return_value = [b"0-0", [], []]
+        self.addCleanup(patcher.stop)
+
+        self.db = MagicMock()
+        self.instance_id = str(uuid4())
+        self.target_list_id = uuid4()
+        self.sync_def = SyncDefinition(
+            id=uuid4(),
+            source_schema="public",
+            source_table_name="products",
+            target_list_id=self.target_list_id,
+            is_paused=False,
+            field_mappings=[
+                FieldMapping(source_column_name="sku", target_column_name="SKU", is_key=True),
+                FieldMapping(source_column_name="name", target_column_name="Title", is_key=False),
+            ]
+        )
+
+        self.service = MagicMock()
+        self.service.write_items.side_effect = lambda site_id, ops: [
+            {"success": True, "status": 201 if op["action"] == "create" else 200, "id": "77" if op["action"] == "create" else op.get("item_id"), "error": None}
+            for op in ops
+        ]
+        self.consumer = CDCConsumer(self.db, content_service_factory=lambda conn, site, list_id: self.service, batch_size=200)
+        self.consumer._sync_def_cache = {(self.instance_id, "public", "products"): self.sync_def}
+        self.consumer._last_cache_update = float("inf")
+
+        self.consumer.ledger = MagicMock()
+        self.consumer.ledger.get_entries.return_value = {}
+        self.consumer.leases = MagicMock()
+        self.consumer.leases.owns.return_value = True
+
+    def _messages(self, payloads):
+        return [(f"1-{i}".encode(), {b'payload': p, b'instance_id': self.instance_id.encode()}) for i, p in enumerate(payloads)]
+
+    def test_hot_row_collapses_to_one_write(self):
+        messages = self._messages([
+            relation_msg([("sku", True), ("name", False)]),
+            begin_msg(700),
+            insert_msg(["P-1", "v1"]),
+            update_msg(["P-1", "v2"]),
+            update_msg(["P-1", "v3"]),
+            insert_msg(["P-2", "other"]),
+            commit_msg(4096),
+        ])
+
+        applied = self.consumer.process_batch(messages)
+
+        self.assertEqual(applied, 2)
+        self.service.write_items.assert_called_once()
+        site_id, operations = self.service.write_items.call_args[0]
+        self.assertEqual(operations, [
+            {"action": "create", "list_id": str(self.target_list_id), "fields": {"SKU": "P-1", "Title": "v3"}},
+            {"action": "create", "list_id": str(self.target_list_id), "fields": {"SKU": "P-2", "Title": "other"}},
+        ])
+        # One ledger lookup and one bulk ledger write for the batch
+        self.consumer.ledger.get_entries.assert_called_once()
+        rows = self.consumer.ledger.upsert_entries.call_args[0][0]
+        self.assertEqual([(r["source_identity"], r["sp_item_id"]) for r in rows], [("P-1", 77), ("P-2", 77)])
+        self.db.commit.assert_called_once()
+
+    def test_update_then_delete_applies_delete_only(self):
+        ledger_entry = SyncLedgerEntry(sync_def_id=self.sync_def.id, source_identity="P-1", sp_item_id=5, provenance="PUSH", content_hash="x")
+        self.consumer.ledger.get_entries.side_effect = lambda sync_def_id, hashes: {h: ledger_entry for h in hashes}
+
+        self.consumer.process_batch(self._messages([
+            relation_msg([("sku", True), ("name", False)]),
+            update_msg(["P-1", "v2"]),
+            delete_msg(["P-1", None]),
+        ]))
+
+        site_id, operations = self.service.write_items.call_args[0]
+        self.assertEqual(operations, [{"action": "delete", "list_id": str(self.target_list_id), "item_id": "5"}])
+        self.consumer.ledger.delete_entries.assert_called_once()
+        self.assertEqual(self.consumer.ledger.upsert_entries.call_args[0][0], [])
+
+    def test_run_acks_whole_batch_once(self):
+        messages = self._messages([relation_msg([("sku", True), ("name", False)]), insert_msg(["P-1", "v1"])])
+        self.consumer.leases = MagicMock()
+        self.consumer.leases.refresh.return_value = [1, 3]
+        self.mock_redis.xreadgroup.side_effect = [[(b"arcore:cdc:events:3", messages)], KeyboardInterrupt]
+
+        with self.assertRaises(KeyboardInterrupt):
+            self.consumer.run()
+
+        # Only partitions this consumer holds a lease on are read
+        streams = self.mock_redis.xreadgroup.call_args[0][2]
+        self.assertEqual(streams, {"arcore:cdc:events:1": ">", "arcore:cdc:events:3": ">"})
+        self.assertEqual(self.mock_redis.xreadgroup.call_args[1]["count"], 200)
+        self.mock_redis.xack.assert_called_once_with(b"arcore:cdc:events:3", "arcore_cdc_group", b"1-0", b"1-1")
+        self.consumer.leases.release_all.assert_called_once()
+
+    def test_unknown_relation_loaded_from_registry(self):
+        # Partition taken over mid-stream: the RELATION was consumed elsewhere
+        self.mock_redis.hget.return_value = relation_msg([("sku", True), ("name", False)])
+
+        self.consumer.process_batch(self._messages([insert_msg(["P-9", "late"])]))
+
+        self.mock_redis.hget.assert_called_once_with(f"arcore:cdc:relations:{self.instance_id}", REL_ID)
+        site_id, operations = self.service.write_items.call_args[0]
+        self.assertEqual(operations[0]["fields"], {"SKU": "P-9", "Title": "late"})
+
+    def test_poison_entry_left_pending_rest_acked(self):
+        relation = relation_msg([("sku", True), ("name", False)])
+        messages = self._messages([relation, insert_msg(["P-1", "ok"]), insert_msg(["BAD", "x"])])
+
+        def write_items(site_id, ops):
+            if any(op["fields"]["SKU"] == "BAD" for op in ops):
+                raise RuntimeError("boom")
+            return [{"success": True, "status": 201, "id": "77", "error": None} for op in ops]
+        self.service.write_items.side_effect = write_items
+
+        self.consumer._apply_and_ack(b"arcore:cdc:events:0", messages)
+
+        self.db.rollback.assert_called()
+        # The relation and the good row are acknowledged; the poison entry stays pending
+        self.mock_redis.xack.assert_called_once_with(b"arcore:cdc:events:0", "arcore_cdc_group", b"1-0", b"1-1")
+        self.mock_redis.hset.assert_called_once_with("arcore:cdc:errors", b"1-2", "boom")
+
+    def test_failed_write_left_pending_rest_acked(self):
+        relation = relation_msg([("sku", True), ("name", False)])
+        messages = self._messages([relation, insert_msg(["P-1", "ok"]), insert_msg(["P-2", "x"]), update_msg(["P-2", "y"])])
+        self.service.write_items.side_effect = lambda site_id, ops: [
+            {"success": op["fields"]["SKU"] != "P-2", "status": 201 if op["fields"]["SKU"] != "P-2" else 400, "id": "77", "error": None if op["fields"]["SKU"] != "P-2" else "Bad Request"}
+            for op in ops
+        ]
+
+        self.consumer._apply_and_ack(b"arcore:cdc:events:0", messages)
+
+        # The written row is committed and acknowledged; both entries behind P-2 stay pending
+        rows = self.consumer.ledger.upsert_entries.call_args[0][0]
+        self.assertEqual([r["source_identity"] for r in rows], ["P-1"])
+        self.db.commit.assert_called_once()
+        self.mock_redis.xack.assert_called_once_with(b"arcore:cdc:events:0", "arcore_cdc_group", b"1-0", b"1-1")
+        self.assertEqual([c[0][1] for c in self.mock_redis.hset.call_args_list], [b"1-2", b"1-3"])
+        self.assertIn("[400] Bad Request", self.mock_redis.hset.call_args[0][2])
+
+    def test_failed_key_guarded_against_older_retry(self):
+        relation = relation_msg([("sku", True), ("name", False)])
+        self.mock_redis.hmget.return_value = [None]
+        self.service.write_items.side_effect = lambda site_id, ops: [{"success": False, "status": 503, "id": None, "error": "Unavailable"}]
+
+        with self.assertRaises(CDCWriteError):
+            self.consumer.process_batch(self._messages([relation, update_msg(["P-1", "old"])]))
+        field = f"{self.sync_def.id}:{hashlib.sha256(b'P-1').hexdigest()}"
+        self.mock_redis.hsetnx.assert_called_once_with("arcore:cdc:retry_keys", field, "0:0-0")
+
+        # A newer change to the held key applies and records its position
+        self.service.write_items.side_effect = None
+        self.service.write_items.return_value = [{"success": True, "status": 201, "id": "77", "error": None}]
+        self.mock_redis.hmget.return_value = [b"0:0-0"]
+        self.consumer.process_batch([(b"5-0", {b'payload': update_msg(["P-1", "new"]), b'instance_id': self.instance_id.encode(), b'lsn': b"9000"})])
+        self.mock_redis.hset.assert_called_once_with("arcore:cdc:retry_keys", mapping={field: "9000:5-0"})
+
+        # The older entry, reclaimed later, is dropped instead of overwriting it
+        self.service.write_items.reset_mock()
+        self.mock_redis.hmget.return_value = [b"9000:5-0"]
+        self.consumer.process_batch([(b"1-1", {b'payload': update_msg(["P-1", "old"]), b'instance_id': self.instance_id.encode(), b'lsn': b"8000"})], retry=True)
+        self.service.write_items.assert_not_called()
+        self.mock_redis.hdel.assert_called_once_with("arcore:cdc:retry_keys", field)
+
+    def test_lease_lost_mid_batch_abandons_rest(self):
+        relation = relation_msg([("sku", True), ("name", False)])
+        other_def = SyncDefinition(id=uuid4(), source_schema="public", source_table_name="orders", target_list_id=uuid4(), is_paused=False, field_mappings=[
+            FieldMapping(source_column_name="sku", target_column_name="SKU", is_key=True),
+            FieldMapping(source_column_name="name", target_column_name="Title", is_key=False),
+        ])
+        self.consumer._sync_def_cache[(self.instance_id, "public", "orders")] = other_def
+        other_service = MagicMock()
+        factory = self.consumer.content_service_factory
+        self.consumer.content_service_factory = lambda conn, site, list_id: other_service if list_id == str(other_def.target_list_id) else factory(conn, site, list_id)
+        orders = relation_msg([("sku", True), ("name", False)]).replace(REL_ID.to_bytes(4, "big"), (REL_ID + 1).to_bytes(4, "big")).replace(b"products", b"orders")
+        orders_insert = insert_msg(["O-1", "x"]).replace(REL_ID.to_bytes(4, "big"), (REL_ID + 1).to_bytes(4, "big"))
+        # The lease is confirmed before the first group of writes, then lost
+        self.consumer.leases.owns.side_effect = [True, False]
+
+        self.consumer._apply_and_ack(b"arcore:cdc:events:2", self._messages([relation, orders, insert_msg(["P-1", "v1"]), orders_insert]))
+
+        self.consumer.leases.heartbeat.assert_called_once()
+        self.service.write_items.assert_called_once()
+        other_service.write_items.assert_not_called()
+        # What was written is committed to the ledger; nothing is acknowledged
+        self.assertEqual([r["source_identity"] for r in self.consumer.ledger.upsert_entries.call_args[0][0]], ["P-1"])
+        self.db.commit.assert_called_once()
+        self.mock_redis.xack.assert_not_called()
+        self.mock_redis.hset.assert_not_called()
+
+    def test_claimed_partition_drains_pending_first(self):
+        self.consumer._partitions = {1, 5}
+        self.consumer.toast_cache.remember((5, self.instance_id, "public", "products", "P-1"), {"name": "x"}, ["name"])
+        self.consumer.leases.refresh.return_value = [1, 3]
+        self.mock_redis.xreadgroup.side_effect = KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            self.consumer.run()
+
+        claims = [(c[0][0], c[1]["min_idle_time"]) for c in self.mock_redis.xautoclaim.call_args_list]
+        self.assertEqual(claims[0], ("arcore:cdc:events:3", 0))
+        # Partition 5 was lost: its cached TOAST values are dropped
+        self.assertEqual(len(self.consumer.toast_cache), 0)
+
+    def test_failed_row_guards_rest_of_its_transaction(self):
+        relation = relation_msg([("sku", True), ("name", False)])
+        entry = {
+            b'payload': pack_messages([insert_msg(["P-1", "v1"]), insert_msg(["P-2", "v1"])]),
+            b'instance_id': self.instance_id.encode(),
+            b'lsn': b"4096", b'xid': b"700", b'count': b"2",
+        }
+        fields = [f"{self.sync_def.id}:{hashlib.sha256(sku).hexdigest()}" for sku in (b"P-1", b"P-2")]
+        self.mock_redis.hmget.return_value = [None, None]
+        self.service.write_items.side_effect = lambda site_id, ops: [
+            {"success": op["fields"]["SKU"] == "P-1", "status": 201 if op["fields"]["SKU"] == "P-1" else 503, "id": "77", "error": None}
+            for op in ops
+        ]
+
+        with self.assertRaises(CDCWriteError) as raised:
+            self.consumer.process_batch(self._messages([relation]) + [(b"2-0", entry)])
+        self.assertEqual(list(raised.exception.errors), [b"2-0"])
+        # P-1 was written, but its entry stays pending: both keys are held
+        self.assertEqual([c[0][1] for c in self.mock_redis.hsetnx.call_args_list], fields)
+
+        # P-1 changes again and applies
+        self.service.write_items.side_effect = None
+        self.service.write_items.return_value = [{"success": True, "status": 200, "id": "77", "error": None}]
+        self.mock_redis.hmget.return_value = [b"0:0-0"]
+        self.consumer.process_batch([(b"5-0", {b'payload': update_msg(["P-1", "v2"]), b'instance_id': self.instance_id.encode(), b'lsn': b"9000"})])
+
+        # The retried transaction only re-applies P-2; P-1's older value is dropped
+        self.service.write_items.reset_mock()
+        self.service.write_items.return_value = [{"success": True, "status": 201, "id": "78", "error": None}]
+        self.mock_redis.hmget.return_value = [b"9000:5-0", b"0:0-0"]
+        self.consumer.process_batch([(b"2-0", entry)], retry=True)
+        operations = self.service.write_items.call_args[0][1]
+        self.assertEqual([op["fields"]["SKU"] for op in operations], ["P-2"])
+        self.mock_redis.hdel.assert_called_once_with("arcore:cdc:retry_keys", *fields)
+
+    def test_reclaim_retries_and_dead_letters(self):
+        messages = self._messages([relation_msg([("sku", True), ("name", False)]), insert_msg(["P-1", "v1"])])
+        self.mock_redis.xautoclaim.return_value = [b"0-0", messages, []]
+        self.mock_redis.xpending_range.return_value = [
+            {"message_id": b"1-0", "consumer": b"c", "time_since_delivered": 60000, "times_delivered": 2},
+            {"message_id": b"1-1", "consumer": b"c", "time_since_delivered": 60000, "times_delivered": 6},
+        ]
+        self.mock_redis.hget.return_value = b"boom"
+
+        reclaimed = self.consumer.reclaim_pending([4])
+
+        self.assertEqual(reclaimed, 2)
+        self.assertEqual(self.mock_redis.xautoclaim.call_args[0][:3], ("arcore:cdc:events:4", "arcore_cdc_group", self.consumer.consumer_name))
+        dead_stream, fields = self.mock_redis.xadd.call_args[0]
+        self.assertEqual(dead_stream, "arcore:cdc:dead")
+        self.assertEqual((fields["message_id"], fields["deliveries"], fields["error"]), ("1-1", 6, "boom"))
+        # Dead letter acknowledged, then the remaining entry retried and acknowledged
+        self.assertEqual([c[0] for c in self.mock_redis.xack.call_args_list], [
+            ("arcore:cdc:events:4", "arcore_cdc_group", b"1-1"),
+            ("arcore:cdc:events:4", "arcore_cdc_group", b"1-0"),
+        ])
+
+    def test_content_hash_matches_pusher(self):
+        from datetime import datetime, timezone
+        from decimal import Decimal
+        from app.services.pusher import compute_content_hash
+        self.sync_def.field_mappings.append(FieldMapping(source_column_name="price", target_column_name="Price", is_key=False))
+        self.sync_def.field_mappings.append(FieldMapping(source_column_name="updated", target_column_name="Updated", is_key=False))
+
+        self.consumer.process_batch(self._messages([
+            relation_msg([("sku", True), ("name", False), ("price", False, 1700), ("updated", False, 1184)]),
+            insert_msg(["P-1", "v1", "12.50", "2024-01-01 00:00:00+00"]),
+        ]))
+
+        # The same row as psycopg returns it to Pusher
+        pusher_hash = compute_content_hash({"sku": "P-1", "name": "v1", "price": Decimal("12.50"), "updated": datetime(2024, 1, 1, tzinfo=timezone.utc)})
+        self.assertEqual(self.consumer.ledger.upsert_entries.call_args[0][0][0]["content_hash"], pusher_hash)
+        fields = self.service.write_items.call_args[0][1][0]["fields"]
+        self.assertEqual(fields["Price"], 12.5)
+        self.assertEqual(fields["Updated"], "2024-01-01T00:00:00+00:00")
+
+    def _with_note_column(self):
+        self.sync_def.field_mappings.append(FieldMapping(source_column_name="note", target_column_name="Notes", is_key=False))
+        ledger_entry = SyncLedgerEntry(sync_def_id=self.sync_def.id, source_identity="P-1", sp_item_id=5, provenance="PUSH", content_hash="x")
+        self.consumer.ledger.get_entries.side_effect = lambda sync_def_id, hashes: {h: ledger_entry for h in hashes}
+        return relation_msg([("sku", True), ("name", False), ("note", False)])
+
+    def test_unchanged_toast_carried_forward(self):
+        relation = self._with_note_column()
+        self.consumer.process_batch(self._messages([relation, update_msg(["P-1", "v1", "long text"])]))
+
+        self.consumer.process_batch(self._messages([update_msg(["P-1", "v2", UNCHANGED])]))
+
+        fields = self.service.write_items.call_args[0][1][0]["fields"]
+        self.assertEqual(fields, {"SKU": "P-1", "Title": "v2", "Notes": "long text"})
+
+    def test_unchanged_toast_seeded_from_source(self):
+        relation = self._with_note_column()
+        source = MagicMock()
+        source.fetch_rows.return_value = {"P-1": {"sku": "P-1", "name": "v2", "note": "from source"}}
+        self.consumer._source_client = MagicMock(return_value=source)
+
+        self.consumer.process_batch(self._messages([relation, update_msg(["P-1", "v2", UNCHANGED])]))
+
+        source.fetch_rows.assert_called_once_with("public", "products", "sku", ["P-1"])
+        self.assertEqual(self.service.write_items.call_args[0][1][0]["fields"]["Notes"], "from source")
+
+    def test_unchanged_toast_omitted_when_unknown(self):
+        relation = self._with_note_column()
+        self.consumer._source_client = MagicMock(side_effect=RuntimeError("source down"))
+
+        self.consumer.process_batch(self._messages([relation, update_msg(["P-1", "v2", UNCHANGED])]))
+
+        # Left out of the PATCH rather than blanked
+        self.assertEqual(self.service.write_items.call_args[0][1][0]["fields"], {"SKU": "P-1", "Title": "v2"})
+
+    def test_transaction_entry_applied_as_one_unit(self):
+        relation = relation_msg([("sku", True), ("name", False)])
+        entry = {
+            b'payload': pack_messages([insert_msg(["P-1", "v1"]), insert_msg(["P-2", "v1"]), update_msg(["P-1", "v2"])]),
+            b'instance_id': self.instance_id.encode(),
+            b'lsn': b"4096", b'xid': b"700", b'count': b"3",
+        }
+
+        applied = self.consumer.process_batch(self._messages([relation]) + [(b"2-0", entry)])
+
+        self.assertEqual(applied, 2)
+        operations = self.service.write_items.call_args[0][1]
+        self.assertEqual([(op["fields"]["SKU"], op["fields"]["Title"]) for op in operations], [("P-2", "v1"), ("P-1", "v2")])
+        self.assertEqual(len(self.consumer.ledger.upsert_entries.call_args[0][0]), 2)
+        self.db.commit.assert_called_once()
@@ -0,0 +1,36 @@
+import unittest
+from unittest.mock import MagicMock
+from app.services.cdc_dead_letter import DeadLetterService, CDC_DEAD_LETTER_STREAM
+
+class TestDeadLetterService(unittest.TestCase):
+    def setUp(self):
+        self.redis = MagicMock()
+        self.service = DeadLetterService(self.redis)
+        self.fields = {
+            b'stream': b"arcore:cdc:events:2",
+            b'message_id': b"5-0",
+            b'payload': b"I\x00\x00@\x00",
+            b'instance_id': b"inst-1",
+            b'deliveries': b"6",
+            b'error': b"boom",
+            b'failed_at': b"1700000000",
+        }
+
+    def test_list_entries_pages_after_id(self):
+        self.redis.xrange.return_value = [(b"9-0", self.fields)]
+
+        entries = self.service.list_entries(10, after="8-0")
+
+        self.redis.xrange.assert_called_once_with(CDC_DEAD_LETTER_STREAM, min="(8-0", max="+", count=10)
+        self.assertEqual(entries[0]["id"], "9-0")
+        self.assertEqual(entries[0]["message_type"], "INSERT")
+        self.assertEqual(entries[0]["deliveries"], 6)
+
+    def test_replay_requeues_on_original_stream(self):
+        self.redis.xrange.side_effect = [[(b"9-0", self.fields)], []]
+
+        replayed = self.service.replay(["9-0", "10-0"])
+
+        self.assertEqual(replayed, 1)
+        self.redis.xadd.assert_called_once_with(b"arcore:cdc:events:2", {b"payload": b"I\x00\x00@\x00", b"instance_id": b"inst-1"})
+        self.redis.xdel.assert_called_once_with(CDC_DEAD_LETTER_STREAM, "9-0")
@@ -0,0 +1,143 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+from uuid import uuid4
+from app.models.core import DatabaseInstance
+from app.services.cdc import CDCService
+from app.services.cdc_partitions import PartitionLeases, group_backlog, partition_for, partition_stream_key, stream_partition, trim_acknowledged
+from tests.services.test_cdc_consumer import relation_msg, insert_msg, update_msg
+
+class TestPartitioning(unittest.TestCase):
+    def test_partition_is_stable_and_in_range(self):
+        first = partition_for("public", "products", ["P-1"], 8)
+        self.assertEqual(first, partition_for("public", "products", ["P-1"], 8))
+        self.assertTrue(all(0 <= partition_for("public", "products", [i], 8) < 8 for i in range(100)))
+        # Rows spread over partitions
+        self.assertGreater(len({partition_for("public", "products", [i], 8) for i in range(100)}), 4)
+
+class TestGroupBacklog(unittest.TestCase):
+    def test_backlog_from_group_lag_and_trim_to_oldest_pending(self):
+        r = MagicMock()
+        pipe = r.pipeline.return_value
+        group = {"name": b"arcore_cdc_group", "pending": 3, "lag": 7, "last-delivered-id": b"9-0"}
+        idle_group = {"name": b"arcore_cdc_group", "pending": 0, "lag": None, "last-delivered-id": b"5-0"}
+        pipe.execute.side_effect = [
+            [50000, [group], 12, [idle_group], 4, []],
+            [{"pending": 3, "min": b"6-0", "max": b"9-0", "consumers": []}],
+            [1, 1],
+        ]
+
+        backlog = group_backlog(r, ["s0", "s1", "s2"])
+
+        # Acknowledged entries (most of s0's 50000) are not backlog
+        self.assertEqual([(b["lag"], b["pending"]) for b in backlog], [(7, 3), (12, 0), (4, 0)])
+
+        trim_acknowledged(r, backlog)
+
+        pipe.xtrim.assert_any_call("s0", minid="6-0", approximate=True)
+        pipe.xtrim.assert_any_call("s1", minid="5-0", approximate=True)
+        # No consumer group yet on s2: nothing is trimmed
+        self.assertEqual(pipe.xtrim.call_count, 2)
+
+class TestPartitionLeases(unittest.TestCase):
+    def setUp(self):
+        self.redis = MagicMock()
+        self.redis.register_script.side_effect = lambda script: MagicMock(return_value=1)
+        self.redis.zcard.return_value = 2
+
+    def test_claims_fair_share(self):
+        self.redis.set.return_value = True
+        leases = PartitionLeases(self.redis, "consumer_a", partitions=8, lease_ms=1000)
+
+        owned = leases.refresh()
+
+        self.assertEqual(len(owned), 4)
+        for call in self.redis.set.call_args_list:
+            self.assertEqual(call[0][1], "consumer_a")
+            self.assertEqual(call[1], {"nx": True, "px": 1000})
+
+    def test_skips_partitions_leased_elsewhere(self):
+        self.redis.set.side_effect = lambda key, value, nx, px: key.endswith((":1", ":6"))
+        leases = PartitionLeases(self.redis, "consumer_a", partitions=8, lease_ms=1000)
+
+        self.assertEqual(leases.refresh(), [1, 6])
+
+    def test_releases_above_share_and_drops_lost_leases(self):
+        self.redis.set.return_value = True
+        self.redis.zcard.return_value = 1
+        leases = PartitionLeases(self.redis, "consumer_a", partitions=4, lease_ms=1000)
+        self.assertEqual(leases.refresh(), [0, 1, 2, 3])
+
+        # A second consumer joins; partition 0's lease was taken over meanwhile
+        self.redis.zcard.return_value = 2
+        self.redis.set.return_value = False
+        leases._renew = MagicMock(side_effect=lambda keys, args: 0 if keys[0].endswith(":0") else 1)
+        leases._release = MagicMock()
+
+        self.assertEqual(leases.refresh(), [1, 2])
+        leases._release.assert_called_once()
+        self.assertTrue(leases._release.call_args[1]["keys"][0].endswith(":3"))
+
+    def test_owns_checks_lease_and_heartbeat_renews(self):
+        self.redis.set.return_value = True
+        self.redis.zcard.return_value = 1
+        leases = PartitionLeases(self.redis, "consumer_a", partitions=2, lease_ms=30)
+        leases.refresh()
+        leases._renew = MagicMock(return_value=1)
+
+        self.redis.get.return_value = b"consumer_a"
+        self.assertTrue(leases.owns(0))
+        with leases.heartbeat():
+            time.sleep(0.1)
+        self.assertGreater(leases._renew.call_count, 1)
+
+        # Taken over elsewhere: the partition is dropped
+        self.redis.get.return_value = b"consumer_b"
+        self.assertFalse(leases.owns(0))
+        self.assertEqual(sorted(leases.owned), [1])
+        self.assertEqual(stream_partition(b"arcore:cdc:events:7"), 7)
+
+    def test_refresh_changes_owned_under_lock(self):
+        self.redis.set.return_value = True
+        self.redis.zcard.return_value = 1
+        leases = PartitionLeases(self.redis, "consumer_a", partitions=2, lease_ms=1000)
+        done = threading.Event()
+
+        with leases._lock:
+            threading.Thread(target=lambda: (leases.refresh(), done.set()), daemon=True).start()
+            # A heartbeat holding the lock keeps refresh from claiming meanwhile
+            self.assertFalse(done.wait(0.1))
+            self.assertEqual(leases.owned, set())
+        self.assertTrue(done.wait(1))
+        self.assertEqual(leases.owned, {0, 1})
+
+class TestProducerRouting(unittest.TestCase):
+    @patch('app.services.cdc.redis.Redis.from_url')
+    def test_rows_routed_by_key_relations_broadcast(self, mock_from_url):
+        db = MagicMock()
+        instance = DatabaseInstance(id=uuid4(), host="localhost", port=5432)
+        db.get.return_value = instance
+        service = CDCService(db, instance.id)
+        r = mock_from_url.return_value
+
+        service._stream_backlog = MagicMock(return_value=0)
+        pipe = r.pipeline.return_value
+        cur = MagicMock()
+
+        def msg(payload):
+            return MagicMock(payload=payload, data_start=1)
+
+        service._handle_message(msg(relation_msg([("sku", True), ("name", False)])))
+        service._flush(cur)
+        self.assertEqual(pipe.xadd.call_count, service.partitions)
+        pipe.hset.assert_called_once()
+
+        pipe.xadd.reset_mock()
+        service._handle_message(msg(insert_msg(["P-1", "v1"])))
+        service._handle_message(msg(update_msg(["P-1", "v2"])))
+        service._handle_message(msg(b'B' + b'\0' * 20))
+        service._flush(cur)
+
+        expected = partition_stream_key(partition_for("public", "products", ["P-1"], service.partitions))
+        self.assertEqual([c[0][0] for c in pipe.xadd.call_args_list], [expected, expected])
@@ -0,0 +1,54 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from uuid import uuid4
+from app.services.cdc_supervisor import CDCSupervisor, CDCWorker
+
+class TestCDCSupervisor(unittest.TestCase):
+    def setUp(self):
+        self.supervisor = CDCSupervisor(MagicMock(), redis_client=MagicMock())
+
+    @patch('app.services.cdc_supervisor.CDCWorker')
+    def test_reconcile_adds_removes_and_renames(self, mock_worker_cls):
+        a, b, c = uuid4(), uuid4(), uuid4()
+        mock_worker_cls.side_effect = lambda instance_id, slot_name, *args: MagicMock(instance_id=instance_id, slot_name=slot_name)
+
+        self.supervisor.discover = MagicMock(return_value={a: "slot_a", b: "slot_b"})
+        self.supervisor.reconcile()
+        self.assertEqual({i: w.slot_name for i, w in self.supervisor.workers.items()}, {a: "slot_a", b: "slot_b"})
+        worker_a, worker_b = self.supervisor.workers[a], self.supervisor.workers[b]
+        worker_a.start.assert_called_once()
+
+        # b removed, a's slot renamed, c added
+        self.supervisor.discover.return_value = {a: "slot_a2", c: "slot_c"}
+        self.supervisor.reconcile()
+
+        worker_b.stop.assert_called_once()
+        worker_a.stop.assert_called_once()
+        self.assertEqual({i: w.slot_name for i, w in self.supervisor.workers.items()}, {a: "slot_a2", c: "slot_c"})
+
+class TestCDCWorker(unittest.TestCase):
+    @patch('app.services.cdc_supervisor.CDCService')
+    def test_restarts_with_backoff_until_stopped(self, mock_service_cls):
+        sessions = MagicMock()
+        worker = CDCWorker(uuid4(), "slot_a", sessions, MagicMock())
+        runs = []
+
+        def run():
+            runs.append(1)
+            if len(runs) == 3:
+                worker.stop()
+                return
+            raise RuntimeError("connection lost")
+        mock_service_cls.return_value.run.side_effect = run
+        worker.stop_event.wait = MagicMock(side_effect=lambda delay=None: worker.stop_event.is_set())
+
+        with patch.object(CDCWorker, 'backoff_delay', side_effect=[0.1, 0.2]) as backoff:
+            worker._run()
+
+        self.assertEqual(len(runs), 3)
+        self.assertEqual(worker.failures, 2)
+        self.assertEqual([c[0][0] for c in backoff.call_args_list], [0, 1])
+        # One session per attempt, always closed; the Redis client is shared
+        self.assertEqual(sessions.return_value.close.call_count, 3)
+        self.assertIs(mock_service_cls.call_args[1]["redis_client"], worker.redis)
+        self.assertIs(mock_service_cls.call_args[1]["stop_event"], worker.stop_event)
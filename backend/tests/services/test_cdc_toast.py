@@ -0,0 +1,35 @@
+import unittest
+from app.services.cdc_toast import ToastCache, toastable_columns
+from app.services.pgoutput import UNCHANGED_TOAST
+
+class TestToastCache(unittest.TestCase):
+    def test_toastable_columns_skip_fixed_width(self):
+        relation = {"columns": [{"name": "id", "type": 23}, {"name": "body", "type": 25}, {"name": "meta", "type": 3802}]}
+        self.assertEqual(toastable_columns(relation), ["body", "meta"])
+
+    def test_carry_forward_and_lru_eviction(self):
+        cache = ToastCache(maxsize=2)
+        cache.remember("a", {"id": 1, "body": "A"}, ["body"])
+        cache.remember("b", {"id": 2, "body": "B"}, ["body"])
+
+        row = {"id": 1, "body": UNCHANGED_TOAST}
+        self.assertEqual(cache.carry_forward("a", row), [])
+        self.assertEqual(row["body"], "A")
+
+        # "a" was used last, so "b" is evicted
+        cache.remember("c", {"id": 3, "body": "C"}, ["body"])
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.carry_forward("b", {"id": 2, "body": UNCHANGED_TOAST}), ["body"])
+
+        cache.evict("a")
+        self.assertEqual(cache.carry_forward("a", {"body": UNCHANGED_TOAST}), ["body"])
+
+    def test_drop_partition(self):
+        cache = ToastCache()
+        cache.remember((1, "i", "public", "docs", "1"), {"body": "A"}, ["body"])
+        cache.remember((2, "i", "public", "docs", "2"), {"body": "B"}, ["body"])
+
+        cache.drop_partition(1)
+
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.carry_forward((2, "i", "public", "docs", "2"), {"body": UNCHANGED_TOAST}), [])
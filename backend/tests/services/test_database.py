@@ -0,0 +1,180 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from app.models.core import DatabaseInstance
+from app.services import database
+from app.services.database import DatabaseClient
+
+class TestIterChangedRows(unittest.TestCase):
+    def setUp(self):
+        self.client = DatabaseClient(DatabaseInstance(host="localhost", port=5432))
+
+    def _mock_cursor(self, mock_connect, pages):
+        cur = MagicMock()
+        cur.description = [("id",), ("updated_at",)]
+        cur.fetchmany.side_effect = pages
+        conn = mock_connect.return_value.connection.return_value.__enter__.return_value
+        conn.cursor.return_value.__enter__.return_value = cur
+        return conn, cur
+
+    @patch('app.services.database.get_source_pool')
+    def test_pages_on_composite_keyset_with_named_cursor(self, mock_connect):
+        conn, cur = self._mock_cursor(mock_connect, [[(1, "t1"), (2, "t1")], [(3, "t2")], []])
+
+        chunks = list(self.client.iter_changed_rows("public", "items", "updated_at", "id", after=("t0", 9), chunk_size=2))
+
+        self.assertEqual(chunks, [
+            [{"id": 1, "updated_at": "t1"}, {"id": 2, "updated_at": "t1"}],
+            [{"id": 3, "updated_at": "t2"}],
+        ])
+        # Server-side cursor
+        self.assertIn("name", conn.cursor.call_args[1])
+        query, params = cur.execute.call_args[0]
+        self.assertIn("WHERE (updated_at, id) > (%s, %s)", query)
+        self.assertIn("ORDER BY updated_at ASC, id ASC", query)
+        self.assertNotIn("LIMIT", query)
+        self.assertEqual(params, ["t0", 9])
+        cur.fetchmany.assert_called_with(2)
+
+    @patch('app.services.database.get_source_pool')
+    def test_timestamp_only_watermark_resumes_inclusively(self, mock_connect):
+        conn, cur = self._mock_cursor(mock_connect, [[]])
+
+        self.assertEqual(list(self.client.iter_changed_rows("public", "items", "updated_at", "id", after=("t0", None))), [])
+
+        query, params = cur.execute.call_args[0]
+        self.assertIn("WHERE updated_at >= %s", query)
+        self.assertEqual(params, ["t0"])
+
+    @patch('app.services.database.get_source_pool')
+    def test_no_cursor_reads_whole_table(self, mock_connect):
+        conn, cur = self._mock_cursor(mock_connect, [[]])
+
+        list(self.client.iter_changed_rows("public", "items", "updated_at", "id"))
+
+        query, params = cur.execute.call_args[0]
+        self.assertNotIn("WHERE", query)
+        self.assertEqual(params, [])
+
+
+class TestSourcePool(unittest.TestCase):
+    def tearDown(self):
+        database._pools.clear()
+
+    @patch('app.services.database.ConnectionPool')
+    def test_one_pool_per_dsn(self, MockPool):
+        MockPool.side_effect = lambda *args, **kwargs: MagicMock()
+        a = DatabaseClient(DatabaseInstance(host="h1", port=5432, db_name="src"))
+        b = DatabaseClient(DatabaseInstance(host="h1", port=5432, db_name="src"))
+        c = DatabaseClient(DatabaseInstance(host="h2", port=5432, db_name="src"))
+
+        self.assertIs(database.get_source_pool(a.dsn), database.get_source_pool(b.dsn))
+        self.assertIsNot(database.get_source_pool(a.dsn), database.get_source_pool(c.dsn))
+        self.assertEqual(MockPool.call_count, 2)
+        kwargs = MockPool.call_args[1]
+        self.assertEqual(kwargs["check"], database.ConnectionPool.check_connection)
+        self.assertEqual(kwargs["max_size"], database.SOURCE_POOL_MAX_SIZE)
+        self.assertEqual(kwargs["max_idle"], database.SOURCE_POOL_MAX_IDLE)
+        # Credentials stay out of the pool name used in logs
+        self.assertEqual(kwargs["name"], "source:h2:5432/src")
+
+    @patch('app.services.database.get_source_pool')
+    def test_row_methods_borrow_from_pool(self, mock_pool):
+        client = DatabaseClient(DatabaseInstance(host="h1", port=5432))
+        conn = mock_pool.return_value.connection.return_value.__enter__.return_value
+        cur = conn.cursor.return_value.__enter__.return_value
+        cur.description = [("id",)]
+        cur.fetchone.return_value = (7,)
+        cur.rowcount = 1
+
+        self.assertEqual(client.fetch_row("public", "items", "id", 7), {"id": 7})
+        self.assertTrue(client.delete_row("public", "items", "id", 7))
+
+        mock_pool.assert_called_with(client.dsn)
+        self.assertEqual(mock_pool.return_value.connection.call_count, 2)
+
+    @patch('app.services.database.get_source_pool')
+    def test_execute_raw_autocommit_is_restored(self, mock_pool):
+        client = DatabaseClient(DatabaseInstance(host="h1", port=5432))
+        conn = mock_pool.return_value.connection.return_value.__enter__.return_value
+        conn.cursor.return_value.__enter__.return_value.description = None
+
+        client.execute_raw("SELECT pg_drop_replication_slot(%s)", ("s",), autocommit=True)
+
+        self.assertFalse(conn.autocommit)
+
+
+class TestWriteBatch(unittest.TestCase):
+    def setUp(self):
+        self.client = DatabaseClient(DatabaseInstance(host="localhost", port=5432))
+        self.client._column_type_cache[("public", "items")] = {"id": "integer", "name": "text", "qty": "numeric(10,2)"}
+        self.client._key_default_cache[("public", "items", "id")] = ("nextval('items_id_seq'::regclass)", False)
+
+    @patch('app.services.database.get_source_pool')
+    def test_page_applied_with_set_based_statements(self, mock_pool):
+        conn = mock_pool.return_value.connection.return_value.__enter__.return_value
+        cur = conn.cursor.return_value.__enter__.return_value
+        def execute(query, params):
+            cur.description = [("_arcore_pk",), ("id",), ("name",)] if query.startswith("UPDATE") else [("_arcore_ord",), ("id",), ("name",)]
+        cur.execute.side_effect = execute
+        cur.fetchall.side_effect = [
+            [(10,), (11,)],                # keys from the sequence
+            [(1, 11, "b"), (0, 10, "a")],  # inserted rows joined to their ordinals, in any order
+            [(1, 1, "x")],                 # UPDATE ... RETURNING v._arcore_pk, t.*
+        ]
+        cur.rowcount = 2
+
+        result = self.client.write_batch(
+            "public", "items", "id",
+            inserts=[{"name": "a"}, {"name": "b"}],
+            updates=[("1", {"name": "stale"}), ("1", {"name": "x"})],
+            deletes=["5", "6"]
+        )
+
+        self.assertEqual(cur.execute.call_count, 4)
+        mock_pool.return_value.connection.assert_called_once()
+        (key_sql, key_params), (insert_sql, insert_params), (update_sql, update_params), (delete_sql, delete_params) = [c[0] for c in cur.execute.call_args_list]
+
+        self.assertEqual(key_sql, "SELECT nextval('items_id_seq'::regclass) FROM generate_series(1, %s)")
+        self.assertEqual(key_params, (2,))
+        self.assertEqual(
+            insert_sql,
+            "WITH v(_arcore_ord, name, id) AS (VALUES (%s::integer, %s::text, %s::integer), (%s::integer, %s::text, %s::integer)), "
+            "ins AS (INSERT INTO public.items (name, id) SELECT name, id FROM v RETURNING *) "
+            "SELECT v._arcore_ord, ins.* FROM ins JOIN v ON ins.id = v.id"
+        )
+        self.assertEqual(insert_params, [0, "a", 10, 1, "b", 11])
+
+        self.assertIn("UPDATE public.items AS t SET name = v.name", update_sql)
+        self.assertIn("FROM (VALUES (%s::integer, %s::text)) AS v(_arcore_pk, name)", update_sql)
+        self.assertIn("WHERE t.id = v._arcore_pk", update_sql)
+        # Duplicate keys collapse to the last change
+        self.assertEqual(update_params, ["1", "x"])
+
+        self.assertEqual(delete_sql, "DELETE FROM public.items WHERE id = ANY(%s::integer[])")
+        self.assertEqual(delete_params, (["5", "6"],))
+
+        self.assertEqual(result["inserted"], [{"id": 10, "name": "a"}, {"id": 11, "name": "b"}])
+        self.assertEqual(result["updated"], {"1": {"id": 1, "name": "x"}})
+        self.assertEqual(result["deleted"], 2)
+
+    @patch('app.services.database.get_source_pool')
+    def test_partial_updates_of_one_row_merged(self, mock_pool):
+        cur = mock_pool.return_value.connection.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value
+        cur.description = [("_arcore_pk",), ("id",), ("name",), ("qty",)]
+        cur.fetchall.return_value = [(1, 1, "y", 2)]
+
+        self.client.write_batch("public", "items", "id", updates=[("1", {"name": "x", "qty": 1}), ("1", {"name": "y"}), ("1", {"qty": 2})])
+
+        update_sql, update_params = cur.execute.call_args[0]
+        self.assertIn("SET name = v.name, qty = v.qty", update_sql)
+        self.assertEqual(update_params, ["1", "y", 2])
+
+    @patch('app.services.database.get_source_pool')
+    def test_unknown_column_rejected(self, mock_pool):
+        with self.assertRaises(ValueError):
+            self.client.write_batch("public", "items", "id", updates=[("1", {"missing": 1})])
+
+    @patch('app.services.database.get_source_pool')
+    def test_empty_page_skips_connection(self, mock_pool):
+        self.assertEqual(self.client.write_batch("public", "items", "id"), {"inserted": [], "updated": {}, "deleted": 0})
+        mock_pool.assert_not_called()
@@ -0,0 +1,142 @@
+import threading
+import time
+import unittest
+import httpx
+from unittest.mock import MagicMock, patch
+from app.services.graph import GraphClient, AsyncGraphClient, build_session, get_shared_session, shared_graph_client, clear_graph_clients
+
+class TestGraphSession(unittest.TestCase):
+    @patch("app.services.graph.msal.ConfidentialClientApplication")
+    def test_clients_share_process_session(self, MockMsal):
+        a = GraphClient("tenant-a", "client-a", "secret")
+        b = GraphClient("tenant-b", "client-b", "secret")
+
+        self.assertIs(a.session, b.session)
+        self.assertIs(a.session, get_shared_session())
+        # Token acquisition goes through the same pooled session
+        self.assertIs(MockMsal.call_args[1]["http_client"], a.session)
+
+    def test_pool_limits_applied(self):
+        session = build_session(pool_connections=4, pool_maxsize=16)
+        adapter = session.get_adapter("https://graph.microsoft.com")
+
+        self.assertEqual(adapter._pool_connections, 4)
+        self.assertEqual(adapter._pool_maxsize, 16)
+        self.assertIn("gzip", session.headers["Accept-Encoding"])
+
+    @patch("app.services.graph.msal.ConfidentialClientApplication")
+    def test_request_uses_session(self, MockMsal):
+        session = MagicMock()
+        session.request.return_value.status_code = 200
+        session.request.return_value.content = b'{"id": "1"}'
+        session.request.return_value.json.return_value = {"id": "1"}
+
+        throttle = MagicMock()
+        client = GraphClient("tenant", "client", "secret", session=session, throttle=throttle)
+        client._token_cache = ("token", float("inf"))
+
+        self.assertEqual(client.request("GET", "/sites/root"), {"id": "1"})
+        throttle.acquire.assert_called_once_with(1)
+        throttle.on_success.assert_called_once()
+        session.request.assert_called_once()
+        self.assertEqual(session.request.call_args[1]["url"], "https://graph.microsoft.com/v1.0/sites/root")
+
+class TestGraphClientRegistry(unittest.TestCase):
+    def setUp(self):
+        clear_graph_clients()
+
+    def tearDown(self):
+        clear_graph_clients()
+
+    @patch("app.services.graph.msal.ConfidentialClientApplication")
+    def test_one_client_per_tenant_app_authority(self, MockMsal):
+        a = shared_graph_client("tenant", "client", "secret")
+        b = shared_graph_client("tenant", "client", "secret")
+        other = shared_graph_client("tenant", "other-client", "secret")
+
+        self.assertIs(a, b)
+        self.assertIsNot(a, other)
+        self.assertEqual(MockMsal.call_count, 2)
+
+    @patch("app.services.graph.msal.ConfidentialClientApplication")
+    def test_rotated_secret_replaces_client(self, MockMsal):
+        a = shared_graph_client("tenant", "client", "old-secret")
+        b = shared_graph_client("tenant", "client", "new-secret")
+
+        self.assertIsNot(a, b)
+        self.assertIs(shared_graph_client("tenant", "client", "new-secret"), b)
+
+    @patch("app.services.graph.msal.ConfidentialClientApplication")
+    def test_clear_drops_only_matching_clients(self, MockMsal):
+        a = shared_graph_client("tenant", "client", "secret")
+        other = shared_graph_client("tenant", "other-client", "secret")
+
+        clear_graph_clients("tenant", "client")
+
+        self.assertIsNot(shared_graph_client("tenant", "client", "secret"), a)
+        self.assertIs(shared_graph_client("tenant", "other-client", "secret"), other)
+
+    @patch("app.services.graph.msal.ConfidentialClientApplication")
+    def test_token_acquired_once_until_refresh_margin(self, MockMsal):
+        app = MockMsal.return_value
+        app.acquire_token_for_client.return_value = {"access_token": "tok", "expires_in": 3600}
+        client = shared_graph_client("tenant", "client", "secret")
+
+        self.assertEqual(client._get_access_token(), "tok")
+        self.assertEqual(shared_graph_client("tenant", "client", "secret")._get_access_token(), "tok")
+        app.acquire_token_for_client.assert_called_once()
+
+        # Inside the refresh margin a new token is fetched
+        client._token_cache = ("tok", time.time() + 60)
+        app.acquire_token_for_client.return_value = {"access_token": "tok2", "expires_in": 3600}
+        self.assertEqual(client._get_access_token(), "tok2")
+
+class TestAsyncGraphClient(unittest.IsolatedAsyncioTestCase):
+    @patch("app.services.graph.msal.ConfidentialClientApplication")
+    def _client(self, handler, MockMsal):
+        self.throttle = MagicMock()
+        self.throttle.reserve.return_value = 0
+        self.throttle.backoff_delay.return_value = 3
+        graph = GraphClient("tenant", "client", "secret", throttle=self.throttle)
+        graph._token_cache = ("token", float("inf"))
+        http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return AsyncGraphClient(graph, http)
+
+    @patch("app.services.graph.asyncio.sleep")
+    async def test_retries_throttled_then_succeeds(self, mock_sleep):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            if len(calls) == 1:
+                return httpx.Response(429, headers={"Retry-After": "3"})
+            return httpx.Response(201, json={"id": "5"})
+
+        client = self._client(handler)
+        result = await client.request("POST", "/sites/s/lists/l/items", json_body={"fields": {}})
+
+        self.assertEqual(result, {"id": "5"})
+        mock_sleep.assert_awaited_once_with(3)
+        self.throttle.on_throttled.assert_called_once_with(3.0)
+        self.throttle.on_success.assert_called_once()
+        self.assertEqual(calls[0].headers["Authorization"], "Bearer token")
+
+    async def test_throttle_runs_off_loop_and_charges_cost(self):
+        loop_thread = threading.get_ident()
+        threads = []
+        client = self._client(lambda request: httpx.Response(200, json={}))
+        self.throttle.reserve.side_effect = lambda cost: threads.append(threading.get_ident()) or 0
+
+        await client.request("POST", "/$batch", json_body={"requests": []}, cost=7)
+
+        self.throttle.reserve.assert_called_once_with(7)
+        self.assertNotEqual(threads, [loop_thread])
+
+    async def test_access_denied(self):
+        client = self._client(lambda request: httpx.Response(403))
+
+        with self.assertRaisesRegex(RuntimeError, "Access Denied"):
+            await client.request("GET", "/sites/root")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,17 @@
+import asyncio
 import unittest
-from unittest.mock import MagicMock, patch, ANY
+from unittest.mock import MagicMock, AsyncMock, patch, ANY
 from uuid import uuid4
 from datetime import datetime
 from app.services.synchronizer import Synchronizer
 from app.services.pusher import Pusher
-from app.models.core import SyncDefinition, SyncLedgerEntry, SyncSource, SyncTarget, DatabaseInstance, SharePointConnection, FieldMapping
+from app.models.core import SyncDefinition, SyncLedgerEntry, SyncCursor, SyncSource, SyncTarget, DatabaseInstance, SharePointConnection, FieldMapping
+from app.models.inventory import SharePointList
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql.dml import Insert
 import hashlib
 import json
+import re
 
 class TestTwoWayIntegration(unittest.TestCase):
     def setUp(self):
@@ -54,6 +59,14 @@ class TestTwoWayIntegration(unittest.TestCase):
             client_id="c1",
             status="ACTIVE"
         )
+
+        # Inventory record resolving the target to its SharePoint GUID
+        self.sp_list = SharePointList(
+            id=self.target_list_id,
+            list_id="sp-list-guid",
+            display_name="Products",
+            status="ACTIVE"
+        )
         
         # Mock DB Queries
         self.mock_db.get.side_effect = lambda model, id: self.sync_def if model == SyncDefinition else None
@@ -62,7 +75,24 @@ class TestTwoWayIntegration(unittest.TestCase):
         # This is tricky with SQLAlchemy mocks, so we mock the result scalars().first()
         # We'll use side_effect on execute()
         
-    @patch('app.services.synchronizer.GraphClient')
+    def ledger_upserts(self):
+        """Rows written through LedgerService.upsert_entries, read back from the compiled INSERTs."""
+        rows = []
+        for call in self.mock_db.execute.call_args_list:
+            stmt = call[0][0]
+            if not (isinstance(stmt, Insert) and stmt.table.name == "sync_ledger"):
+                continue
+            compiled = stmt.compile(dialect=postgresql.dialect())
+            self.assertIn("ON CONFLICT", str(compiled))
+            by_row = {}
+            for key, value in compiled.params.items():
+                match = re.match(r"(.+)_m(\d+)$", key)
+                if match:
+                    by_row.setdefault(int(match.group(2)), {})[match.group(1)] = value
+            rows.extend(by_row[i] for i in sorted(by_row))
+        return rows
+
+    @patch('app.services.synchronizer.shared_graph_client')
     @patch('app.services.synchronizer.SharePointContentService')
     @patch('app.services.synchronizer.DatabaseClient')
     def test_ingress_destination_wins(self, MockDBClient, MockContentService, MockGraph):
@@ -76,7 +106,13 @@ class TestTwoWayIntegration(unittest.TestCase):
         sp_changes = [
             {"id": "100", "reason": "changed", "fields": {"Title": "New Product", "SKU": "P-100"}}
         ]
-        mock_content.get_list_changes.return_value = (sp_changes, "new_delta_token")
+        def get_list_changes_side_effect(site_id, list_id, token, callback=None):
+            # Changes are streamed to the callback page by page
+            if callback:
+                callback(sp_changes)
+                return [], "new_delta_token"
+            return sp_changes, "new_delta_token"
+        mock_content.get_list_changes.side_effect = get_list_changes_side_effect
         
         # Mock DB Lookups
         def db_execute_side_effect(stmt):
@@ -97,12 +133,13 @@ class TestTwoWayIntegration(unittest.TestCase):
             
         self.mock_db.execute.side_effect = db_execute_side_effect
         self.mock_db.query.return_value.filter.return_value.first.return_value = self.conn # Handle query().filter().first() pattern
+        self.mock_db.get.side_effect = lambda model, ident: self.sync_def if model == SyncDefinition else None
 
         # Init Synchronizer
         syncer = Synchronizer(self.mock_db)
         
-        # Mock DB Client Insert Return
-        mock_db_client.insert_row.return_value = {"sku": "P-100", "name": "New Product"}
+        # Mock DB Client Batch Write Return
+        mock_db_client.write_batch.return_value = {"inserted": [{"sku": "P-100", "name": "New Product"}], "updated": {}, "deleted": 0}
         
         # Run
         result = syncer.run_ingress(self.sync_def_id)
@@ -110,27 +147,73 @@ class TestTwoWayIntegration(unittest.TestCase):
         # Verify
         self.assertEqual(result["processed_count"], 1)
         
-        # Check DB Insert
-        mock_db_client.insert_row.assert_called_with(
-            "public", "products", {"name": "New Product", "sku": "P-100"}
+        # Check DB Insert (the whole page in one batch)
+        mock_db_client.write_batch.assert_called_once_with(
+            "public", "products", "sku",
+            inserts=[{"name": "New Product", "sku": "P-100"}], updates=[], deletes=[]
         )
+        mock_db_client.insert_row.assert_not_called()
         
-        # Check Ledger Creation
-        self.mock_db.add.assert_called()
-        
-        # Find SyncLedgerEntry in calls
-        found_ledger_entry = None
-        for call in self.mock_db.add.call_args_list:
-            obj = call[0][0]
-            if isinstance(obj, SyncLedgerEntry):
-                found_ledger_entry = obj
-                break
-        
-        self.assertIsNotNone(found_ledger_entry, "SyncLedgerEntry was not added to DB")
-        self.assertEqual(found_ledger_entry.provenance, "PULL")
-        self.assertEqual(found_ledger_entry.source_identity, "P-100")
+        # Check Ledger Creation (one upsert for the page)
+        ledger_rows = self.ledger_upserts()
+        self.assertEqual(len(ledger_rows), 1)
+        self.assertEqual(ledger_rows[0]["provenance"], "PULL")
+        self.assertEqual(ledger_rows[0]["source_identity"], "P-100")
+
+    @patch('app.services.synchronizer.DatabaseClient')
+    def test_ingress_page_batched_with_source_wins(self, MockDBClient):
+        # Scenario: one delta page with an update, a conflicting update and a delete.
+        db_client = MockDBClient.return_value
+        self.sync_def.conflict_policy = "SOURCE_WINS"
 
-    @patch('app.services.pusher.GraphClient')
+        def ledger(sp_item_id, source_identity, content_hash):
+            return SyncLedgerEntry(
+                sync_def_id=self.sync_def_id, source_identity_hash=hashlib.sha256(source_identity.encode()).hexdigest(),
+                source_identity=source_identity, source_key_strategy="PRIMARY_KEY", source_instance_id=self.instance_id,
+                sp_list_id="list-1", sp_item_id=sp_item_id, content_hash=content_hash, provenance="PUSH"
+            )
+
+        synced_hash = Synchronizer(self.mock_db)._compute_content_hash({"name": "Old", "sku": "P-1"})
+        entries = {1: ledger(1, "P-1", synced_hash), 2: ledger(2, "P-2", "stale-hash"), 3: ledger(3, "P-3", "h")}
+        ledger_lookups = []
+
+        def db_execute_side_effect(stmt):
+            mock_result = MagicMock()
+            if isinstance(stmt, Insert) or "DELETE" in str(stmt):
+                return mock_result
+            # One IN query resolves the page's items
+            sp_item_ids = stmt.compile().params["sp_item_id_1"]
+            mock_result.scalars.return_value.all.return_value = [entries[i] for i in sp_item_ids if i in entries]
+            ledger_lookups.append(sp_item_ids)
+            return mock_result
+
+        self.mock_db.execute.side_effect = db_execute_side_effect
+        db_client.fetch_rows.return_value = {
+            "P-1": {"sku": "P-1", "name": "Old"},      # unchanged since last sync
+            "P-2": {"sku": "P-2", "name": "Edited"},   # changed in source -> conflict
+        }
+        db_client.write_batch.return_value = {"inserted": [], "updated": {}, "deleted": 1}
+
+        changes = [
+            {"id": "1", "fields": {"Title": "New 1", "SKU": "P-1"}},
+            {"id": "2", "fields": {"Title": "New 2", "SKU": "P-2"}},
+            {"id": "3", "reason": "deleted"},
+        ]
+        count = Synchronizer(self.mock_db)._process_changes(self.sync_def, db_client, changes, "list-1", self.instance_id)
+
+        self.assertEqual(count, 2)
+        self.assertEqual(ledger_lookups, [[1, 2, 3]])
+        db_client.fetch_rows.assert_called_once_with("public", "products", "sku", ["P-1", "P-2"])
+        db_client.write_batch.assert_called_once_with(
+            "public", "products", "sku",
+            inserts=[], updates=[("P-1", {"name": "New 1", "sku": "P-1"})], deletes=["P-3"]
+        )
+        db_client.update_row.assert_not_called()
+        db_client.delete_row.assert_not_called()
+        self.assertEqual([row["source_identity"] for row in self.ledger_upserts()], ["P-1"])
+        self.mock_db.commit.assert_called_once()
+
+    @patch('app.services.pusher.shared_graph_client')
     @patch('app.services.pusher.SharePointContentService')
     @patch('app.services.pusher.DatabaseClient')
     def test_push_success(self, MockDBClient, MockContentService, MockGraph):
@@ -142,7 +225,7 @@ class TestTwoWayIntegration(unittest.TestCase):
         # Mock Data
         row_ts = datetime(2025, 1, 1, 12, 0, 0)
         row_data = {"sku": "P-200", "name": "Fresh Product", "updated_at": row_ts}
-        mock_db_client.fetch_changed_rows.return_value = [row_data]
+        mock_db_client.iter_changed_rows.return_value = iter([[row_data]])
         
         # Mock DB Lookups
         def db_execute_side_effect(stmt):
@@ -151,7 +234,7 @@ class TestTwoWayIntegration(unittest.TestCase):
             if "sharepoint_connections" in s_str:
                 mock_result.scalars.return_value.first.return_value = self.conn
             elif "sync_targets" in s_str:
-                mock_result.scalars.return_value.first.return_value = self.target
+                mock_result.scalars.return_value.all.return_value = [self.target]
             elif "sync_sources" in s_str:
                 mock_result.scalars.return_value.first.return_value = self.source
             elif "sync_cursors" in s_str:
@@ -159,31 +242,40 @@ class TestTwoWayIntegration(unittest.TestCase):
             return mock_result
             
         self.mock_db.execute.side_effect = db_execute_side_effect
-        self.mock_db.get.side_effect = lambda model, id: self.sync_def if model == SyncDefinition else None # No ledger entry
+
+        def get_side_effect(model, ident):
+            if model == SyncDefinition:
+                return self.sync_def
+            if model == SharePointList:
+                return self.sp_list
+            return None # No ledger entry
+
+        self.mock_db.get.side_effect = get_side_effect
         self.mock_db.query.return_value.filter.return_value.first.return_value = self.conn
 
         # Init Pusher
         pusher = Pusher(self.mock_db)
         
-        # Mock SP Create Return
-        mock_content.create_item.return_value = "200"
+        # Mock SP Batch Create Return
+        mock_content.write_items.return_value = [{"success": True, "status": 201, "id": "200", "error": None}]
         
         # Run
         result = pusher.run_push(self.sync_def_id)
         
         # Verify
         self.assertEqual(result["processed_count"], 1)
-        mock_content.create_item.assert_called()
-        
-        # Verify Ledger Creation
-        found_ledger = False
-        for call in self.mock_db.add.call_args_list:
-            obj = call[0][0]
-            if isinstance(obj, SyncLedgerEntry):
-                self.assertEqual(obj.provenance, "PUSH")
-                self.assertEqual(obj.sp_item_id, 200)
-                found_ledger = True
-        self.assertTrue(found_ledger)
+        mock_content.write_items.assert_called_once()
+        site_id, operations = mock_content.write_items.call_args[0]
+        self.assertEqual(operations, [
+            {"action": "create", "list_id": "sp-list-guid", "fields": {"Title": "Fresh Product", "SKU": "P-200"}}
+        ])
+        
+        # Verify Ledger Creation (one upsert at the end of the batch)
+        ledger_rows = self.ledger_upserts()
+        self.assertEqual(len(ledger_rows), 1)
+        self.assertEqual(ledger_rows[0]["provenance"], "PUSH")
+        self.assertEqual(ledger_rows[0]["sp_item_id"], 200)
+        self.mock_db.add_all.assert_not_called()
         
         # Verify Cursor Update
         found_cursor = False
@@ -191,11 +283,13 @@ class TestTwoWayIntegration(unittest.TestCase):
             obj = call[0][0]
             # Since SyncCursor and SyncLedgerEntry are both added, check type or attr
             if hasattr(obj, 'cursor_scope') and obj.cursor_scope == "SOURCE":
-                 self.assertEqual(obj.cursor_value, str(row_ts))
+                 # Keyset cursor: (updated_at, pk) of the last handled row
+                 self.assertEqual(obj.cursor_type, "KEYSET")
+                 self.assertEqual(json.loads(obj.cursor_value), [str(row_ts), "P-200"])
                  found_cursor = True
         self.assertTrue(found_cursor)
 
-    @patch('app.services.pusher.GraphClient')
+    @patch('app.services.pusher.shared_graph_client')
     @patch('app.services.pusher.SharePointContentService')
     @patch('app.services.pusher.DatabaseClient')
     def test_push_loop_prevention(self, MockDBClient, MockContentService, MockGraph):
@@ -207,7 +301,7 @@ class TestTwoWayIntegration(unittest.TestCase):
         # Mock Data
         # DB Row
         row_data = {"sku": "P-100", "name": "New Product", "updated_at": datetime.utcnow()}
-        mock_db_client.fetch_changed_rows.return_value = [row_data]
+        mock_db_client.iter_changed_rows.return_value = iter([[row_data]])
         
         # Ledger Entry (Matches Content)
         content_hash = hashlib.sha256(json.dumps({"name": "New Product", "sku": "P-100"}, sort_keys=True, default=str).encode()).hexdigest()
@@ -225,6 +319,8 @@ class TestTwoWayIntegration(unittest.TestCase):
         def get_side_effect(model, ident):
             if model == SyncDefinition:
                 return self.sync_def
+            if model == SharePointList:
+                return self.sp_list
             if model == SyncLedgerEntry:
                 # Handle composite key lookup
                 if isinstance(ident, tuple):
@@ -243,11 +339,14 @@ class TestTwoWayIntegration(unittest.TestCase):
             if "sharepoint_connections" in s_str:
                 mock_result.scalars.return_value.first.return_value = self.conn
             elif "sync_targets" in s_str:
-                mock_result.scalars.return_value.first.return_value = self.target
+                mock_result.scalars.return_value.all.return_value = [self.target]
             elif "sync_sources" in s_str:
                 mock_result.scalars.return_value.first.return_value = self.source
             elif "sync_cursors" in s_str:
                 mock_result.scalars.return_value.first.return_value = None # No watermark
+            elif "sync_ledger" in s_str:
+                # Ledger is prefetched for the whole batch with one IN query
+                mock_result.scalars.return_value.all.return_value = [ledger_entry]
             return mock_result
             
         self.mock_db.execute.side_effect = db_execute_side_effect
@@ -262,8 +361,147 @@ class TestTwoWayIntegration(unittest.TestCase):
         # Verify
         # Should detect loop and SKIP update
         mock_content.update_item.assert_not_called()
+        mock_content.write_items.assert_not_called()
+        # No per-row ledger lookups
+        self.assertFalse(any(c[0][0] is SyncLedgerEntry for c in self.mock_db.get.call_args_list))
         self.assertEqual(result["processed_count"], 1) # Processed but skipped
 
+    @patch('app.services.pusher.shared_graph_client')
+    @patch('app.services.pusher.SharePointContentService')
+    @patch('app.services.pusher.DatabaseClient')
+    def test_push_streams_chunks_from_keyset_cursor(self, MockDBClient, MockContentService, MockGraph):
+        # Scenario: two chunks share a timestamp; the run resumes from the stored keyset and checkpoints per chunk.
+        mock_content = MockContentService.return_value
+        mock_db_client = MockDBClient.return_value
+        row_ts = datetime(2025, 1, 1, 12, 0, 0)
+        chunks = [
+            [{"sku": "P-1", "name": "One", "updated_at": row_ts}],
+            [{"sku": "P-2", "name": "Two", "updated_at": row_ts}],
+        ]
+        mock_db_client.iter_changed_rows.return_value = iter(chunks)
+
+        stored_cursor = SyncCursor(cursor_scope="SOURCE", cursor_type="KEYSET", cursor_value=json.dumps([str(row_ts), "P-0"]))
+
+        def db_execute_side_effect(stmt):
+            mock_result = MagicMock()
+            s_str = str(stmt)
+            if "sync_targets" in s_str:
+                mock_result.scalars.return_value.all.return_value = [self.target]
+            elif "sync_sources" in s_str:
+                mock_result.scalars.return_value.first.return_value = self.source
+            elif "sync_cursors" in s_str:
+                mock_result.scalars.return_value.first.return_value = stored_cursor
+            return mock_result
+
+        self.mock_db.execute.side_effect = db_execute_side_effect
+        self.mock_db.get.side_effect = lambda model, ident: {SyncDefinition: self.sync_def, SharePointList: self.sp_list}.get(model)
+        self.mock_db.query.return_value.filter.return_value.first.return_value = self.conn
+        mock_content.write_items.side_effect = [
+            [{"success": True, "status": 201, "id": "1", "error": None}],
+            [{"success": True, "status": 201, "id": "2", "error": None}],
+        ]
+
+        result = Pusher(self.mock_db).run_push(self.sync_def_id)
+
+        self.assertEqual(result["success_count"], 2)
+        args, kwargs = mock_db_client.iter_changed_rows.call_args
+        self.assertEqual(args, ("public", "products", "updated_at", "sku"))
+        self.assertEqual(kwargs["after"], (str(row_ts), "P-0"))
+        self.assertEqual(mock_content.write_items.call_count, 2)
+        self.assertEqual(self.mock_db.commit.call_count, 2)
+        self.assertEqual(json.loads(stored_cursor.cursor_value), [str(row_ts), "P-2"])
+
+    @patch('app.services.pusher.shared_graph_client')
+    @patch('app.services.pusher.SharePointContentService')
+    @patch('app.services.pusher.DatabaseClient')
+    def test_push_routes_sharded_chunk_per_target(self, MockDBClient, MockContentService, MockGraph):
+        # Scenario: a CONDITIONAL definition; the chunk is routed in one pass and each target is resolved once.
+        mock_content = MockContentService.return_value
+        archive_list_id = uuid4()
+        archive_target = SyncTarget(sync_def_id=self.sync_def_id, target_list_id=archive_list_id, status="ACTIVE")
+        archive_list = SharePointList(id=archive_list_id, list_id="sp-archive-guid", display_name="Archive", status="ACTIVE")
+        self.sync_def.target_strategy = "CONDITIONAL"
+        self.sync_def.sharding_policy = {
+            "rules": [{"if": "name == 'Old'", "target_list_id": str(archive_list_id)}],
+            "default_target_list_id": str(self.target_list_id),
+        }
+
+        row_ts = datetime(2025, 1, 1, 12, 0, 0)
+        rows = [
+            {"sku": "P-1", "name": "Old", "updated_at": row_ts},
+            {"sku": "P-2", "name": "New", "updated_at": row_ts},
+            {"sku": "P-3", "name": "Old", "updated_at": row_ts},
+        ]
+        MockDBClient.return_value.iter_changed_rows.return_value = iter([rows])
+
+        def db_execute_side_effect(stmt):
+            mock_result = MagicMock()
+            s_str = str(stmt)
+            if "sync_targets" in s_str:
+                mock_result.scalars.return_value.all.return_value = [self.target, archive_target]
+            elif "sync_sources" in s_str:
+                mock_result.scalars.return_value.first.return_value = self.source
+            elif "sync_cursors" in s_str:
+                mock_result.scalars.return_value.first.return_value = None
+            return mock_result
+
+        self.mock_db.execute.side_effect = db_execute_side_effect
+        lists = {self.target_list_id: self.sp_list, archive_list_id: archive_list}
+        self.mock_db.get.side_effect = lambda model, ident: self.sync_def if model == SyncDefinition else (
+            lists.get(ident) if model == SharePointList else None
+        )
+        self.mock_db.query.return_value.filter.return_value.first.return_value = self.conn
+        mock_content.write_items.side_effect = lambda site_id, operations: [
+            {"success": True, "status": 201, "id": str(i + 1), "error": None} for i in range(len(operations))
+        ]
+
+        result = Pusher(self.mock_db).run_push(self.sync_def_id)
+
+        self.assertEqual(result["success_count"], 3)
+        # One $batch writer for the shared connection, holding each target's sub-batch
+        mock_content.write_items.assert_called_once()
+        _, operations = mock_content.write_items.call_args[0]
+        self.assertEqual(sorted((op["list_id"], op["fields"]["SKU"]) for op in operations), [
+            ("sp-archive-guid", "P-1"), ("sp-archive-guid", "P-3"), ("sp-list-guid", "P-2"),
+        ])
+        list_lookups = [c for c in self.mock_db.get.call_args_list if c[0][0] is SharePointList]
+        self.assertEqual(len(list_lookups), 2)
+
+    @patch('app.services.pusher.AsyncSharePointContentService')
+    @patch('app.services.pusher.shared_graph_client')
+    @patch('app.services.pusher.SharePointContentService')
+    @patch('app.services.pusher.DatabaseClient')
+    def test_push_async_success(self, MockDBClient, MockContentService, MockGraph, MockAsyncContent):
+        # Scenario: same as test_push_success, but writes go through the async pipeline.
+        mock_db_client = MockDBClient.return_value
+        row_ts = datetime(2025, 1, 1, 12, 0, 0)
+        mock_db_client.iter_changed_rows.return_value = iter([[{"sku": "P-200", "name": "Fresh Product", "updated_at": row_ts}]])
+
+        def db_execute_side_effect(stmt):
+            mock_result = MagicMock()
+            s_str = str(stmt)
+            if "sync_targets" in s_str:
+                mock_result.scalars.return_value.all.return_value = [self.target]
+            elif "sync_sources" in s_str:
+                mock_result.scalars.return_value.first.return_value = self.source
+            elif "sync_cursors" in s_str:
+                mock_result.scalars.return_value.first.return_value = None
+            return mock_result
+
+        self.mock_db.execute.side_effect = db_execute_side_effect
+        self.mock_db.get.side_effect = lambda model, ident: {SyncDefinition: self.sync_def, SharePointList: self.sp_list}.get(model)
+        self.mock_db.query.return_value.filter.return_value.first.return_value = self.conn
+
+        async_service = MockAsyncContent.return_value
+        async_service.write_items = AsyncMock(return_value=[{"success": True, "status": 201, "id": "200", "error": None}])
+
+        result = asyncio.run(Pusher(self.mock_db).run_push_async(self.sync_def_id, max_in_flight=4))
+
+        self.assertEqual(result["success_count"], 1)
+        self.assertEqual(MockAsyncContent.call_args[1]["max_in_flight_per_list"], 4)
+        MockContentService.return_value.write_items.assert_not_called()
+        self.assertEqual(self.ledger_upserts()[0]["sp_item_id"], 200)
+
     def IsInstance(self, obj, cls):
         self.assertTrue(isinstance(obj, cls))
 
@@ -65,4 +65,27 @@ class TestMoveManager(unittest.TestCase):
         # Should still return True because the move (create + track) happened
         self.assertTrue(result)
         self.mock_ledger.record_entry.assert_called()
-        self.mock_content.delete_item.assert_called()
\ No newline at end of file
+        self.mock_content.delete_item.assert_called()
+
+    def test_move_items_batched(self):
+        other = SyncLedgerEntry(
+            source_identity_hash="hash-2",
+            sp_list_id="list-old",
+            sp_item_id=101,
+            last_sync_ts=datetime.utcnow()
+        )
+        self.mock_content.create_items.return_value = [
+            {"success": True, "status": 201, "id": "200", "error": None},
+            {"success": False, "status": 400, "id": None, "error": "Bad Request"},
+        ]
+        self.mock_content.delete_items.return_value = [
+            {"success": True, "status": 204, "id": "100", "error": None},
+        ]
+
+        result = self.manager.move_items(self.site_id, [(self.entry, self.item_data), (other, {"Title": "Other"})], "list-new")
+
+        self.assertEqual(result, [True, False])
+        self.assertEqual(self.entry.sp_item_id, 200)
+        self.assertEqual(other.sp_list_id, "list-old")
+        self.mock_ledger.record_entry.assert_called_once_with(self.entry)
+        self.mock_content.delete_items.assert_called_once_with(self.site_id, "list-old", ["100"])
@@ -0,0 +1,128 @@
+import json
+import struct
+import unittest
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from uuid import UUID
+from app.services.pgoutput import PgOutputDecoder, strip_stream_xid
+from tests.services.test_cdc_consumer import (
+    REL_ID, relation_msg, tuple_data, insert_msg, update_msg, delete_msg,
+    streamed, stream_start_msg, stream_stop_msg, stream_commit_msg, stream_abort_msg,
+)
+
+class TestPgOutputDecoder(unittest.TestCase):
+    def setUp(self):
+        self.decoder = PgOutputDecoder()
+        self.decoder.decode(relation_msg([("sku", True), ("name", False), ("note", False)]))
+
+    def test_relation_registered(self):
+        relation = self.decoder.relations[REL_ID]
+        self.assertEqual((relation["schema"], relation["table"]), ("public", "products"))
+        self.assertEqual([(c["name"], c["type"], c["key"]) for c in relation["columns"]], [
+            ("sku", 25, True), ("name", 25, False), ("note", 25, False),
+        ])
+
+    def test_insert_decodes_text_and_nulls(self):
+        decoded = self.decoder.decode(insert_msg(["P-1", "Crème brûlée", None]))
+        self.assertEqual(decoded["type"], "INSERT")
+        self.assertEqual(decoded["relation_id"], REL_ID)
+        self.assertEqual(decoded["data"], {"sku": "P-1", "name": "Crème brûlée", "note": None})
+
+    def test_update_with_old_key(self):
+        payload = b'U' + struct.pack('>i', REL_ID) + b'K' + tuple_data(["P-0", None, None]) + b'N' + tuple_data(["P-1", "v2", "n"])
+        decoded = self.decoder.decode(payload)
+        self.assertEqual(decoded["old_data"], {"sku": "P-0", "name": None, "note": None})
+        self.assertEqual(decoded["data"], {"sku": "P-1", "name": "v2", "note": "n"})
+        self.assertIsNone(self.decoder.decode(update_msg(["P-1", "v3", "n"]))["old_data"])
+
+    def test_delete_and_unknown_relation(self):
+        self.assertEqual(self.decoder.decode(delete_msg(["P-1", None, None]))["data"]["sku"], "P-1")
+        unknown = b'I' + struct.pack('>i', 99) + b'N' + tuple_data(["x"])
+        self.assertEqual(self.decoder.decode(unknown)["data"], {"col_0": "x"})
+
+    def test_stream_block_messages_carry_xid(self):
+        self.assertEqual(self.decoder.decode(stream_start_msg(900)), {"type": "STREAM_START", "xid": 900, "first_segment": True})
+        relation = self.decoder.decode(streamed(relation_msg([("sku", True), ("name", False)]), 900))
+        self.assertEqual((relation["id"], relation["xid"]), (REL_ID, 900))
+        update = streamed(update_msg(["P-1", "v"]), 901)
+        decoded = self.decoder.decode(update)
+        self.assertEqual((decoded["type"], decoded["xid"], decoded["data"]), ("UPDATE", 901, {"sku": "P-1", "name": "v"}))
+        self.assertEqual(strip_stream_xid(update), update_msg(["P-1", "v"]))
+        self.assertEqual(self.decoder.decode(stream_stop_msg()), {"type": "STREAM_STOP"})
+
+        # Outside the block messages have no xid again
+        self.assertNotIn("xid", self.decoder.decode(insert_msg(["P-2", "v"])))
+        self.assertEqual(self.decoder.decode(stream_abort_msg(900, 901)), {"type": "STREAM_ABORT", "xid": 900, "subxid": 901})
+        committed = self.decoder.decode(stream_commit_msg(900, 5000))
+        self.assertEqual((committed["type"], committed["xid"], committed["commit_lsn"]), ("STREAM_COMMIT", 900, 5000))
+
+    def test_binary_columns(self):
+        self.decoder.decode(relation_msg([
+            ("id", True, 23), ("big", False, 20), ("price", False, 1700), ("active", False, 16), ("updated", False, 1184),
+            ("born", False, 1082), ("ref", False, 2950), ("ratio", False, 701), ("name", False, 25),
+            ("raw", False, 17), ("scores", False, 1007), ("span", False, 1186),
+        ]))
+        ref = UUID("a8098c1a-f86e-11da-bd1a-00112444be1e")
+        scores = struct.pack('>iii', 1, 1, 23) + struct.pack('>ii', 2, 1) + struct.pack('>ii', 4, 5) + struct.pack('>i', -1)
+        values = [
+            struct.pack('>i', 7), struct.pack('>q', -2 ** 40),
+            struct.pack('>hhHh', 2, 0, 0x4000, 2) + struct.pack('>hh', 12, 5000),      # -12.50
+            b'\x01',
+            struct.pack('>q', 757382400 * 1_000_000),                                    # 2024-01-01 00:00 UTC
+            struct.pack('>i', 8825),                                                     # 2024-02-29
+            ref.bytes, struct.pack('>d', 0.25), "Crème".encode(), b'\x00\xff', scores,
+            b'\x00' * 16,
+        ]
+        payload = b'I' + struct.pack('>i', REL_ID) + b'N' + struct.pack('>h', len(values))
+        for value in values:
+            payload += b'b' + struct.pack('>i', len(value)) + value
+
+        row = self.decoder.decode(payload)["data"]
+        self.assertEqual(row, {
+            "id": 7, "big": -2 ** 40, "price": Decimal("-12.50"), "active": True,
+            "updated": datetime(2024, 1, 1, tzinfo=timezone.utc), "born": date(2024, 2, 29), "ref": ref,
+            "ratio": 0.25, "name": "Crème", "raw": b'\x00\xff', "scores": [5, None],
+            # interval has no binary decoder
+            "span": "\\x" + "00" * 16,
+        })
+        self.assertEqual(str(row["price"]), "-12.50")
+
+    def test_binary_unknown_type_is_json_safe(self):
+        # inet (869) and an extension type OID have no binary decoder
+        self.decoder.decode(relation_msg([("id", True, 23), ("addr", False, 869), ("ext", False, 91234)]))
+        values = [struct.pack('>i', 1), bytes([2, 32, 0, 4, 10, 0, 0, 1]), b'\xff\x01']
+        payload = b'I' + struct.pack('>i', REL_ID) + b'N' + struct.pack('>h', len(values))
+        for value in values:
+            payload += b'b' + struct.pack('>i', len(value)) + value
+
+        row = self.decoder.decode(payload)["data"]
+
+        self.assertEqual(row, {"id": 1, "addr": "\\x022000040a000001", "ext": "\\xff01"})
+        json.dumps(row)
+
+    def test_typed_columns(self):
+        self.decoder.decode(relation_msg([
+            ("id", True, 23), ("price", False, 1700), ("active", False, 16), ("updated", False, 1184),
+            ("born", False, 1082), ("ref", False, 2950), ("meta", False, 3802), ("tags", False, 1009),
+            ("scores", False, 1007), ("ratio", False, 701),
+        ]))
+
+        row = self.decoder.decode(insert_msg([
+            "7", "12.50", "t", "2024-01-01 00:00:00+00", "2024-02-29", "a8098c1a-f86e-11da-bd1a-00112444be1e",
+            '{"a": [1, 2]}', '{plain,"with space","quo\\"te",NULL}', "{{1,2},{3,NULL}}", "Infinity",
+        ]))["data"]
+
+        self.assertEqual(row["id"], 7)
+        self.assertEqual(row["price"], Decimal("12.50"))
+        self.assertIs(row["active"], True)
+        self.assertEqual(row["updated"], datetime(2024, 1, 1, tzinfo=timezone.utc))
+        self.assertEqual(row["born"], date(2024, 2, 29))
+        self.assertEqual(row["ref"], UUID("a8098c1a-f86e-11da-bd1a-00112444be1e"))
+        self.assertEqual(row["meta"], {"a": [1, 2]})
+        self.assertEqual(row["tags"], ["plain", "with space", 'quo"te', None])
+        self.assertEqual(row["scores"], [[1, 2], [3, None]])
+        self.assertEqual(row["ratio"], float("inf"))
+
+    def test_unrepresentable_value_stays_text(self):
+        self.decoder.decode(relation_msg([("id", True, 23), ("born", False, 1082)]))
+        self.assertEqual(self.decoder.decode(insert_msg(["1", "infinity"]))["data"]["born"], "infinity")
@@ -1,6 +1,6 @@
 import unittest
 from uuid import uuid4
-from app.services.sharding import ShardingEvaluator
+from app.services.sharding import ShardingEvaluator, compile_policy
 
 class TestShardingEvaluator(unittest.TestCase):
     def setUp(self):
@@ -49,3 +49,64 @@ class TestShardingEvaluator(unittest.TestCase):
         
         self.assertEqual(str(evaluator.evaluate({"count": 101, "type": "VIP"})), self.target_active)
         self.assertEqual(str(evaluator.evaluate({"count": 50, "type": "VIP"})), self.target_default)
+
+    def test_equality_rules_indexed_in_rule_order(self):
+        targets = [str(uuid4()) for _ in range(4)]
+        policy = {
+            "rules": [
+                {"if": "status == 'A'", "target_list_id": targets[0]},
+                {"if": "status == 'B'", "target_list_id": targets[1]},
+                {"if": "status == 'A'", "target_list_id": targets[2]}, # shadowed by the first rule
+                {"if": "age > 10", "target_list_id": targets[3]},
+                {"if": "status == 'C'", "target_list_id": targets[0]},
+                {"if": "status", "target_list_id": targets[1]}, # invalid syntax never matches
+            ],
+            "default_target_list_id": self.target_default,
+        }
+        evaluator = ShardingEvaluator(policy)
+        # Runs of equality rules on one field are a single dict lookup
+        self.assertEqual(len(evaluator.compiled.steps), 3)
+
+        self.assertEqual(str(evaluator.evaluate({"status": "A", "age": 50})), targets[0])
+        self.assertEqual(str(evaluator.evaluate({"status": "B"})), targets[1])
+        # The range rule still comes before the later equality rule
+        self.assertEqual(str(evaluator.evaluate({"status": "C", "age": 50})), targets[3])
+        self.assertEqual(str(evaluator.evaluate({"status": "C", "age": 5})), targets[0])
+        # Unhashable values and failing comparisons match nothing
+        self.assertEqual(str(evaluator.evaluate({"status": ["A"], "age": "old"})), self.target_default)
+
+    def test_identical_policies_compiled_once(self):
+        same = {"default_target_list_id": self.target_default, "rules": list(self.policy["rules"])}
+        self.assertIs(ShardingEvaluator(same).compiled, self.evaluator.compiled)
+        self.assertIs(compile_policy(self.policy), self.evaluator.compiled)
+
+    def test_evaluate_batch_matches_row_by_row(self):
+        policy = {
+            "rules": [
+                {"if": "count > 100 and type == 'VIP'", "target_list_id": self.target_active},
+                {"if": "status == 'Archived'", "target_list_id": self.target_archived},
+                {"if": "age > 10", "target_list_id": self.target_archived},
+            ],
+            "default_target_list_id": self.target_default,
+        }
+        evaluator = ShardingEvaluator(policy)
+        rows = [
+            {"count": 101, "type": "VIP", "status": "Archived"},
+            {"status": "Archived", "age": 1},
+            {"count": "many", "type": "VIP", "age": 11}, # str > int fails for this row only
+            {"status": "Open", "age": 5},
+            {"status": ["Archived"], "age": 20},
+        ]
+
+        groups = evaluator.evaluate_batch(rows)
+        self.assertEqual({str(target): indices for target, indices in groups.items()}, {
+            self.target_active: [0],
+            self.target_archived: [1, 2, 4],
+            self.target_default: [3],
+        })
+        for target, indices in groups.items():
+            for i in indices:
+                self.assertEqual(evaluator.evaluate(rows[i]), target)
+
+        # Rows no rule routes and no default: grouped under None
+        self.assertEqual(ShardingEvaluator({"rules": policy["rules"]}).evaluate_batch([{"age": 1}]), {None: [0]})
@@ -0,0 +1,139 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, patch
+from app.services.graph import GraphClient
+from app.services.sharepoint_content import SharePointContentService, AsyncSharePointContentService
+
+class TestBatchWrites(unittest.TestCase):
+    def setUp(self):
+        self.mock_graph = MagicMock()
+        self.service = SharePointContentService(self.mock_graph)
+
+    def _echo_batch(self, status=201):
+        # Answer every sub-request with the given status, creates get id = 100 + sub id
+        def batch(sub_requests):
+            return {
+                r["id"]: {"id": r["id"], "status": status, "body": {"id": str(100 + int(r["id"]))}}
+                for r in sub_requests
+            }
+        return batch
+
+    def test_create_items_chunks_by_20(self):
+        self.mock_graph.batch.side_effect = self._echo_batch()
+        items = [{"Title": f"Item {i}"} for i in range(45)]
+
+        results = self.service.create_items("site-1", "list-1", items)
+
+        self.assertEqual(self.mock_graph.batch.call_count, 3)
+        sizes = [len(call[0][0]) for call in self.mock_graph.batch.call_args_list]
+        self.assertEqual(sizes, [20, 20, 5])
+        self.assertEqual(len(results), 45)
+        self.assertTrue(all(r["success"] for r in results))
+        # Ids map back to the position inside each chunk
+        self.assertEqual(results[0]["id"], "100")
+        self.assertEqual(results[21]["id"], "101")
+
+    def test_sub_request_shapes(self):
+        self.mock_graph.batch.side_effect = self._echo_batch(status=200)
+        self.service.write_items("site-1", [
+            {"action": "create", "list_id": "L", "fields": {"Title": "A"}},
+            {"action": "update", "list_id": "L", "item_id": "7", "fields": {"Title": "B"}},
+            {"action": "delete", "list_id": "L", "item_id": "8"},
+        ])
+
+        sub_requests = self.mock_graph.batch.call_args[0][0]
+        self.assertEqual(sub_requests[0], {"id": "0", "method": "POST", "url": "/sites/site-1/lists/L/items", "body": {"fields": {"Title": "A"}}})
+        self.assertEqual(sub_requests[1], {"id": "1", "method": "PATCH", "url": "/sites/site-1/lists/L/items/7/fields", "body": {"Title": "B"}})
+        self.assertEqual(sub_requests[2], {"id": "2", "method": "DELETE", "url": "/sites/site-1/lists/L/items/8"})
+
+    def test_per_item_failure(self):
+        self.mock_graph.batch.return_value = {
+            "0": {"id": "0", "status": 200, "body": {}},
+            "1": {"id": "1", "status": 404, "body": {"error": {"code": "itemNotFound", "message": "Item not found"}}},
+        }
+
+        results = self.service.update_items("site-1", "L", [("1", {"Title": "A"}), ("2", {"Title": "B"})])
+
+        self.assertTrue(results[0]["success"])
+        self.assertEqual(results[0]["id"], "1")
+        self.assertFalse(results[1]["success"])
+        self.assertEqual(results[1]["status"], 404)
+        self.assertEqual(results[1]["error"], "Item not found")
+
+    def test_whole_batch_failure(self):
+        self.mock_graph.batch.side_effect = RuntimeError("Graph down")
+
+        results = self.service.delete_items("site-1", "L", ["1", "2"])
+
+        self.assertEqual(len(results), 2)
+        self.assertFalse(any(r["success"] for r in results))
+        self.assertIn("Graph down", results[0]["error"])
+
+
+class TestGraphBatch(unittest.TestCase):
+    @patch("app.services.graph.msal.ConfidentialClientApplication")
+    def setUp(self, MockMsal):
+        self.throttle = MagicMock()
+        self.throttle.backoff_delay.return_value = 2
+        self.client = GraphClient("tenant", "client", "secret", throttle=self.throttle)
+        self.client.request = MagicMock()
+
+    @patch("app.services.graph.time.sleep")
+    def test_retries_throttled_sub_requests_only(self, mock_sleep):
+        self.client.request.side_effect = [
+            {"responses": [
+                {"id": "0", "status": 201, "body": {"id": "10"}},
+                {"id": "1", "status": 429, "headers": {"Retry-After": "2"}},
+            ]},
+            {"responses": [
+                {"id": "1", "status": 201, "body": {"id": "11"}},
+            ]},
+        ]
+
+        results = self.client.batch([
+            {"id": "0", "method": "POST", "url": "/x", "body": {}},
+            {"id": "1", "method": "POST", "url": "/x", "body": {}},
+        ])
+
+        self.assertEqual(results["0"]["status"], 201)
+        self.assertEqual(results["1"]["body"]["id"], "11")
+        mock_sleep.assert_called_once_with(2)
+        self.throttle.on_throttled.assert_called_once_with(2.0)
+        retried = self.client.request.call_args_list[1][1]["json_body"]["requests"]
+        self.assertEqual([r["id"] for r in retried], ["1"])
+        # Each attempt is metered per sub-request
+        self.assertEqual([c[1]["cost"] for c in self.client.request.call_args_list], [2, 1])
+
+    def test_rejects_oversized_batch(self):
+        with self.assertRaises(ValueError):
+            self.client.batch([{"id": str(i), "method": "GET", "url": "/x"} for i in range(21)])
+
+class TestAsyncWrites(unittest.IsolatedAsyncioTestCase):
+    async def test_bounded_in_flight_per_list(self):
+        in_flight = {"L1": 0, "L2": 0}
+        peak = {"L1": 0, "L2": 0}
+
+        class FakeGraph:
+            async def request(self, method, path, json_body=None):
+                list_id = path.split("/lists/")[1].split("/")[0]
+                in_flight[list_id] += 1
+                peak[list_id] = max(peak[list_id], in_flight[list_id])
+                await asyncio.sleep(0.001)
+                in_flight[list_id] -= 1
+                if json_body == {"fields": {"Title": "bad"}}:
+                    raise RuntimeError("Graph POST failed [400]")
+                return {"id": "9"}
+
+        service = AsyncSharePointContentService(FakeGraph(), max_in_flight_per_list=3)
+        operations = [{"action": "create", "list_id": lid, "fields": {"Title": "x"}} for lid in ("L1", "L2") for _ in range(10)]
+        operations.append({"action": "create", "list_id": "L1", "fields": {"Title": "bad"}})
+
+        results = await service.write_items("site-1", operations)
+
+        self.assertEqual(len(results), 21)
+        self.assertTrue(all(r["success"] and r["id"] == "9" for r in results[:20]))
+        self.assertFalse(results[20]["success"])
+        self.assertEqual(peak, {"L1": 3, "L2": 3})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+from unittest.mock import MagicMock
+from uuid import uuid4
+from sqlalchemy.dialects import postgresql
+from app.services.state import LedgerService
+
+class TestLedgerUpsert(unittest.TestCase):
+    def setUp(self):
+        self.db = MagicMock()
+        self.ledger = LedgerService(self.db)
+        self.sync_def_id = uuid4()
+
+    def _row(self, id_hash, sp_item_id, provenance="PUSH"):
+        return {
+            "sync_def_id": self.sync_def_id,
+            "source_identity_hash": id_hash,
+            "source_identity": id_hash,
+            "source_instance_id": uuid4(),
+            "sp_list_id": "list-1",
+            "sp_item_id": sp_item_id,
+            "content_hash": "c",
+            "provenance": provenance,
+        }
+
+    def test_upsert_single_statement_on_conflict(self):
+        written = self.ledger.upsert_entries([self._row("a", 1), self._row("b", 2)])
+
+        self.assertEqual(written, 2)
+        self.db.execute.assert_called_once()
+        self.db.commit.assert_not_called()
+        sql = str(self.db.execute.call_args[0][0].compile(dialect=postgresql.dialect()))
+        self.assertIn("ON CONFLICT (sync_def_id, source_identity_hash) DO UPDATE", sql)
+        self.assertIn("coalesce(excluded.last_source_ts, sync_ledger.last_source_ts)", sql)
+
+    def test_upsert_dedupes_and_chunks(self):
+        rows = [self._row("a", 1), self._row("b", 2), self._row("a", 3, provenance="PULL"), self._row("c", 4)]
+
+        written = self.ledger.upsert_entries(rows, chunk_size=2, commit=True)
+
+        self.assertEqual(written, 3)
+        self.assertEqual(self.db.execute.call_count, 2)
+        self.db.commit.assert_called_once()
+        params = self.db.execute.call_args_list[0][0][0].compile(dialect=postgresql.dialect()).params
+        # Last duplicate wins
+        self.assertEqual(params["sp_item_id_m0"], 3)
+        self.assertEqual(params["provenance_m0"], "PULL")
+
+    def test_upsert_nothing(self):
+        self.assertEqual(self.ledger.upsert_entries([]), 0)
+        self.db.execute.assert_not_called()
@@ -0,0 +1,62 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import redis
+from app.services.throttle import TenantThrottle, THROTTLE_BURST, THROTTLE_MAX_BACKOFF
+
+class TestTenantThrottle(unittest.TestCase):
+    def setUp(self):
+        self.redis = MagicMock()
+        self.scripts = {}
+
+        def register_script(source):
+            script = MagicMock(name=f"script_{len(self.scripts)}")
+            self.scripts[len(self.scripts)] = script
+            return script
+
+        self.redis.register_script.side_effect = register_script
+        self.throttle = TenantThrottle("tenant-1", self.redis)
+        self.reserve_script, self.success_script, self.throttled_script = (self.scripts[i] for i in range(3))
+
+    def test_reserve_uses_shared_bucket(self):
+        self.reserve_script.return_value = b"0.25"
+
+        self.assertEqual(self.throttle.reserve(cost=5), 0.25)
+        kwargs = self.reserve_script.call_args[1]
+        self.assertEqual(kwargs["keys"], ["arcore:graph:throttle:tenant-1"])
+        self.assertEqual(kwargs["args"][1:], [THROTTLE_BURST, 5])
+
+    @patch("app.services.throttle.time.sleep")
+    def test_acquire_waits_until_slot(self, mock_sleep):
+        self.reserve_script.side_effect = [b"0.5", b"0.1", b"0"]
+
+        self.throttle.acquire()
+
+        self.assertEqual([c[0][0] for c in mock_sleep.call_args_list], [0.5, 0.1])
+
+    def test_throttled_pauses_tenant(self):
+        self.throttle.on_throttled(7)
+
+        args = self.throttled_script.call_args[1]["args"]
+        self.assertEqual(args[-1], 7.0)
+        # The local pause applies even before Redis is consulted again
+        self.assertGreater(self.throttle.reserve(), 6)
+        self.reserve_script.assert_not_called()
+
+    def test_redis_outage_degrades_to_unthrottled(self):
+        self.reserve_script.side_effect = redis.exceptions.ConnectionError("down")
+
+        self.assertEqual(self.throttle.reserve(), 0.0)
+        self.assertEqual(self.throttle.reserve(), 0.0)
+        # Redis is not retried on every call while it is down
+        self.assertEqual(self.reserve_script.call_count, 1)
+        self.throttle.on_success()
+        self.success_script.assert_not_called()
+
+    def test_backoff_delay(self):
+        for _ in range(50):
+            self.assertTrue(5 <= TenantThrottle.backoff_delay(0, 5) <= 6)
+            self.assertTrue(4 <= TenantThrottle.backoff_delay(3) <= 12)
+            self.assertLessEqual(TenantThrottle.backoff_delay(0, 10_000), THROTTLE_MAX_BACKOFF + 1)
+
+if __name__ == '__main__':
+    unittest.main()